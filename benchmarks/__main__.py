@@ -0,0 +1,93 @@
+import os
+import json
+import argparse
+import tempfile
+
+from benchmarks import fakes
+from benchmarks import scenarios
+
+
+SCENARIOS = ["cold_start", "prepare_dataset", "graph_build", "single_query", "concurrent_sessions", "embedding_storage"]
+
+# Scenario specific measurements reported below the table: key, label and format
+DETAILS = [
+    ("recall", "recall@k", "{:.3f}"),
+    ("recall_at_10", "recall@10", "{:.3f}"),
+    ("index_mb", "index MB", "{:.2f}"),
+]
+
+
+def format_report(
+    results: list[dict]
+) -> str:
+    lines = [f"{'scenario':<22}{'count':>7}{'p50 ms':>12}{'p95 ms':>12}{'ops/s':>10}{'peak RSS MB':>14}"]
+    for result in results:
+        lines.append(
+            f"{result['scenario']:<22}{result['count']:>7}{result['p50_ms']:>12.1f}"
+            f"{result['p95_ms']:>12.1f}{result['throughput_per_s']:>10.2f}{result['peak_rss_mb']:>14.1f}"
+        )
+    for result in results:
+        details = [f"{label} {format.format(result[key])}" for key, label, format in DETAILS if key in result]
+        if details:
+            lines.append(f"{result['scenario']}: {', '.join(details)}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks with a scripted LLM and a local graph stand-in.")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--raw", default=os.path.join("data", "raw", "raw.json"), help="Raw regulation JSON")
+    parser.add_argument("--data-dir", default=None, help="Prepared dataset directory (prepared into a temporary directory if missing)")
+    parser.add_argument("--iterations", type=int, default=20, help="Iterations of the single query scenario")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per concurrent session")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated latency per LLM call in seconds")
+    parser.add_argument("--no-router", action="store_true", help="Send every question through the ReAct agent")
+    parser.add_argument("--answer-cache", action="store_true", help="Reuse answers of repeated questions")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    embedding_service = fakes.HashEmbeddingService()
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+
+        if "cold_start" in args.scenarios:
+            results.append(scenarios.run_cold_start())
+
+        # The remaining scenarios need the prepared articles and definitions
+        if "prepare_dataset" in args.scenarios or not scenarios.has_prepared_dataset(data_dir):
+            prepare_result = scenarios.run_prepare(
+                raw_path=args.raw, output_dir=data_dir, embedding_service=embedding_service
+            )
+            if "prepare_dataset" in args.scenarios:
+                results.append(prepare_result)
+
+        if "graph_build" in args.scenarios:
+            results.append(scenarios.run_graph_build(data_dir=data_dir))
+
+        if "single_query" in args.scenarios or "concurrent_sessions" in args.scenarios:
+            ask_agent = scenarios.create_offline_agent(
+                data_dir=data_dir, embedding_service=embedding_service,
+                llm_latency=args.llm_latency, use_router=not args.no_router, answer_cache=args.answer_cache
+            )
+            if "single_query" in args.scenarios:
+                results.append(scenarios.run_single_query(ask_agent, iterations=args.iterations))
+            if "concurrent_sessions" in args.scenarios:
+                results.append(scenarios.run_concurrent_sessions(ask_agent, sessions=args.sessions, turns=args.turns))
+
+        if "embedding_storage" in args.scenarios:
+            results.extend(scenarios.run_embedding_storage(
+                data_dir=data_dir, embedding_service=embedding_service, iterations=args.iterations
+            ))
+
+    print(format_report(results))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
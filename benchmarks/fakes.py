@@ -0,0 +1,104 @@
+import time
+import typing
+import hashlib
+import numpy as np
+
+from src import embedding
+from src.graph_rag import retriever
+from langchain_core import messages
+from langchain_core import outputs
+from langchain_core.language_models import chat_models
+
+
+class ScriptedChatModel(chat_models.BaseChatModel):
+    """Deterministic chat model that plays the ReAct loop without any provider.
+
+    With tools bound, a human message is answered with a call to `tool_name`
+    and a tool result with `answer`. Without tools (the direct `llm.invoke`
+    calls inside the tools) it always returns `answer`.
+    """
+
+    tool_name: str = "semantic_search"
+    answer: str = "Scripted answer."
+    latency: float = 0.0
+    tools_bound: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat-model"
+
+
+    def bind_tools(
+        self, tools: typing.Sequence, **kwargs: typing.Any
+    ) -> "ScriptedChatModel":
+        return self.model_copy(update={"tools_bound": True})
+
+
+    def _generate(
+        self,
+        messages_: list[messages.BaseMessage],
+        stop: list[str]|None = None,
+        run_manager: typing.Any = None,
+        **kwargs: typing.Any
+    ) -> outputs.ChatResult:
+        # Simulated provider latency
+        if self.latency:
+            time.sleep(self.latency)
+
+        last_message = messages_[-1]
+        if self.tools_bound and self.tool_name and isinstance(last_message, messages.HumanMessage):
+            call_id = hashlib.sha1(str(last_message.content).encode("utf-8")).hexdigest()[:12]
+            message = messages.AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": self.tool_name,
+                    "args": {"query": last_message.content, "lang": "id"},
+                    "id": f"call_{call_id}"
+                }]
+            )
+        else:
+            message = messages.AIMessage(content=self.answer)
+
+        return outputs.ChatResult(generations=[outputs.ChatGeneration(message=message)])
+
+
+class HashEmbeddingService(embedding.EmbeddingService):
+    """Embedding service that hashes tokens into a normalized bag-of-words vector."""
+
+    def __init__(
+        self, dimension: int = 384, latency: float = 0.0
+    ) -> None:
+        super().__init__(model_name=f"hash-{dimension}")
+        self.dimension = dimension
+        self.latency = latency
+
+
+    def encode(
+        self,
+        texts: str|list[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        if self.latency:
+            time.sleep(self.latency)
+
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.stack([self._encode_one(text) for text in texts]) if texts else np.empty((0, self.dimension), dtype=np.float32)
+
+
+    def warm_up(
+        self, background: bool = False
+    ) -> None:
+        return None
+
+
+    def _encode_one(
+        self, text: str
+    ) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in retriever.tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
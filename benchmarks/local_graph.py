@@ -0,0 +1,70 @@
+import re
+import typing
+import itertools
+import networkx as nx
+
+from src import dataset
+from src import database
+
+
+FOR_COLLECTION_PATTERN = re.compile(r"^\s*FOR\s+(\w+)\s+IN\s+(\w+)\s+RETURN\s*\{(.*)\}\s*$", re.DOTALL)
+PROJECTION_PATTERN = re.compile(r"(\w+)\s*:\s*(\w+)\.(\w+)")
+REFER_TO_PATTERN = re.compile(r"FOR\s+edge\s+IN\s+refer_to", re.IGNORECASE)
+
+
+class LocalGraph(nx.MultiDiGraph):
+    """In-memory stand-in for `nxadb.MultiDiGraph` loaded from `data/*.json`.
+
+    It is a plain NetworkX graph (so generated NetworkX code runs against it)
+    and answers the AQL shapes issued by the retrieval tools through `query`.
+    Any other AQL raises `NotImplementedError`.
+    """
+
+    @classmethod
+    def from_dataset(
+        cls, dir_path: str
+    ) -> "LocalGraph":
+        data = dataset.Dataset(dir_path).load_dataset()
+        G = database.Database("", "", "", "", "")._create_networkx_graph(dataset=data)
+        return cls(G)
+
+
+    def query(
+        self, query: str, bind_vars: dict|None = None, **kwargs: typing.Any
+    ) -> list:
+        bind_vars = bind_vars or {}
+
+        # Neighbours of an article over `refer_to`, in both directions
+        if REFER_TO_PATTERN.search(query) and "initial_node_id" in bind_vars:
+            node_id = bind_vars["initial_node_id"]
+            neighbours = set()
+            for other, edges in itertools.chain(self.succ[node_id].items(), self.pred[node_id].items()):
+                if any(attributes.get("label") == "refer_to" for attributes in edges.values()):
+                    neighbours.add(other)
+            return [{"id": other, "text": self.nodes[other].get("text")} for other in sorted(neighbours - {node_id})]
+
+        # Projection over a whole collection
+        match = FOR_COLLECTION_PATTERN.match(query)
+        if match:
+            variable, collection, projection = match.groups()
+            fields = [
+                (key, attribute) for key, var, attribute in PROJECTION_PATTERN.findall(projection) if var == variable
+            ]
+            rows = [
+                {key: node_id if attribute == "_id" else attributes.get(attribute) for key, attribute in fields}
+                for node_id, attributes in self.nodes(data=True) if attributes.get("label") == collection
+            ]
+            if rows:
+                return rows
+
+            # Edge collections, with `_from` and `_to` as the endpoints
+            endpoints = {"_from": 0, "_to": 1}
+            return [
+                {
+                    key: (source, target)[endpoints[attribute]] if attribute in endpoints else attributes.get(attribute)
+                    for key, attribute in fields
+                }
+                for source, target, attributes in self.edges(data=True) if attributes.get("label") == collection
+            ]
+
+        raise NotImplementedError(f"AQL not supported by the local graph stand-in:\n{query}")
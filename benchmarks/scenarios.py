@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import statistics
+import concurrent.futures
+import numpy as np
+
+from src import dataset
+from src import database
+from src import resilience
+from src.graph_rag import agent
+from src.graph_rag import retriever
+from src.graph_rag import quantization
+from benchmarks import fakes
+from benchmarks import local_graph
+
+
+# Questions in the style of the examples shown in the Gradio app
+QUESTIONS = [
+    "Apa definisi data pribadi?",
+    "Apa saja kewajiban penyelenggara sistem elektronik?",
+    "Apa isi pasal 33 Undang-Undang Nomor 11 Tahun 2008?",
+    "Bagaimana perlindungan konsumen dalam transaksi elektronik?",
+    "Apa sanksi bagi penyebaran konten ilegal?",
+]
+
+
+def percentile(
+    values: list[float], q: float
+) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * q
+    lower = int(index)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (index - lower)
+
+
+def peak_rss_mb(
+    children: bool = False
+) -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def summarize(
+    name: str, latencies: list[float], wall_time: float, children: bool = False
+) -> dict:
+    return {
+        "scenario": name,
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "mean_ms": statistics.fmean(latencies) * 1e3 if latencies else 0.0,
+        "throughput_per_s": len(latencies) / wall_time if wall_time else 0.0,
+        "peak_rss_mb": peak_rss_mb(children=children),
+    }
+
+
+def run_cold_start(
+    iterations: int = 5
+) -> dict:
+    # Fresh interpreters importing the agent stack, like the app and worker processes do
+    latencies = []
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import src; src.create_ask_agent"], check=True, capture_output=True)
+        latencies.append(time.perf_counter() - start)
+    return summarize("cold_start", latencies, time.perf_counter() - wall_start, children=True)
+
+
+def run_prepare(
+    raw_path: str, output_dir: str, embedding_service: fakes.HashEmbeddingService, iterations: int = 1
+) -> dict:
+    with open(raw_path, "r", encoding="utf-8") as file:
+        raw_data = json.load(file)
+
+    latencies = []
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        dataset.Dataset(output_dir).prepare_dataset(
+            data=raw_data, embedding_model=embedding_service, device=None, verbose=False
+        )
+        latencies.append(time.perf_counter() - start)
+    return summarize("prepare_dataset", latencies, time.perf_counter() - wall_start)
+
+
+def run_graph_build(
+    data_dir: str, iterations: int = 3
+) -> dict:
+    # The in-process part of `load_dataset_to_arangodb`; the ArangoDB write itself needs a server
+    data = dataset.Dataset(data_dir).load_dataset()
+    database_obj = database.Database("", "", "", "", "")
+
+    latencies = []
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        database_obj._create_networkx_graph(dataset=data)
+        latencies.append(time.perf_counter() - start)
+    return summarize("graph_build", latencies, time.perf_counter() - wall_start)
+
+
+def create_offline_agent(
+    data_dir: str,
+    embedding_service: fakes.HashEmbeddingService,
+    llm_latency: float = 0.0,
+    tool_name: str = "semantic_search",
+    use_router: bool = True,
+    answer_cache: bool = False
+):
+    # Wrapped like the provider models, so the client overhead is part of the measurement
+    llm = resilience.ResilientChatModel(model=fakes.ScriptedChatModel(tool_name=tool_name, latency=llm_latency))
+    graph = local_graph.LocalGraph.from_dataset(data_dir)
+    return agent.create_ask_agent(
+        llm=llm,
+        nxadb_graph=graph,
+        arango_graph=None,
+        embedding_model=embedding_service,
+        device=None,
+        use_router=use_router,
+        # The scenarios repeat the same questions, a warm answer cache would skip the pipeline being measured
+        answer_cache_size=None if answer_cache else 0
+    )
+
+
+def run_single_query(
+    ask_agent, iterations: int = 20
+) -> dict:
+    latencies = []
+    wall_start = time.perf_counter()
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        ask_agent(QUESTIONS[iteration % len(QUESTIONS)], [], thread_id="single")
+        latencies.append(time.perf_counter() - start)
+    return summarize("single_query", latencies, time.perf_counter() - wall_start)
+
+
+def run_concurrent_sessions(
+    ask_agent, sessions: int = 4, turns: int = 5
+) -> dict:
+    def run_session(session: int) -> list[float]:
+        latencies = []
+        for turn in range(turns):
+            start = time.perf_counter()
+            ask_agent(QUESTIONS[(session + turn) % len(QUESTIONS)], [], thread_id=f"session-{session}")
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    wall_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=sessions) as executor:
+        latencies = [latency for result in executor.map(run_session, range(sessions)) for latency in result]
+    return summarize("concurrent_sessions", latencies, time.perf_counter() - wall_start)
+
+
+def run_embedding_storage(
+    data_dir: str, embedding_service: fakes.HashEmbeddingService, iterations: int = 20, k: int = 100
+) -> list[dict]:
+    # Exhaustive dense search over the article embeddings in every storage format, against float32
+    article_retriever = retriever.HybridRetriever(
+        nxadb_graph=local_graph.LocalGraph.from_dataset(data_dir),
+        collection="article",
+        embedding_service=embedding_service,
+        precision="float32"
+    )
+    article_retriever.ensure_built()
+    embeddings = np.asarray(article_retriever.embeddings.codes)
+    reduced = embeddings.shape[1] // 3
+
+    queries = QUESTIONS + [text[:200] for text in article_retriever.texts[::25]]
+    embedding_service.encode_queries(queries)
+    query_embeddings = [embedding_service.encode_query(query) for query in queries]
+    exact = [retriever.top_k_indices(embeddings @ query_embedding, k=k) for query_embedding in query_embeddings]
+
+    results = []
+    for precision, dimensions in (
+        ("float32", None), ("int8", None), ("float32", reduced), ("int8", reduced)
+    ):
+        store = quantization.QuantizedEmbeddings.fit(embeddings, precision=precision, dimensions=dimensions)
+        latencies, recalls, recalls_at_10 = [], [], []
+        wall_start = time.perf_counter()
+        for _ in range(iterations):
+            for query_embedding, expected in zip(query_embeddings, exact):
+                start = time.perf_counter()
+                ranking = retriever.top_k_indices(store.scores(query_embedding), k=k)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len(set(ranking.tolist()) & set(expected.tolist())) / len(expected))
+                recalls_at_10.append(len(set(ranking[:10].tolist()) & set(expected[:10].tolist())) / 10)
+
+        name = precision + (f"_pca{dimensions}" if dimensions else "")
+        result = summarize(f"storage_{name}", latencies, time.perf_counter() - wall_start)
+        result.update(
+            recall=statistics.fmean(recalls), recall_at_10=statistics.fmean(recalls_at_10), index_mb=store.nbytes / 2 ** 20
+        )
+        results.append(result)
+    return results
+
+
+def has_prepared_dataset(
+    data_dir: str
+) -> bool:
+    return os.path.exists(os.path.join(data_dir, "node_Article.json"))
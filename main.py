@@ -5,18 +5,15 @@ import functools
 import gradio as gr
 
 from src import helper
-from torch import cuda
 from langchain_community import graphs
-from langchain_openai import chat_models as openai_chat_models
-from langchain_google_genai import chat_models as google_chat_models
 
 
 if __name__=="__main__":
 
     dotenv.load_dotenv(".env")
 
-    # Determine device
-    device = "cuda" if cuda.is_available() else "cpu"
+    # Determine device (None lets sentence-transformers pick cuda/cpu when the model loads)
+    device = os.environ.get("DEVICE") or None
 
     # Instantiate the dataset object
     dataset_obj = src.Dataset("data")
@@ -36,27 +33,26 @@ if __name__=="__main__":
     # Instantiate the ArangoGraph LangChain wrapper
     arango_graph = graphs.ArangoGraph(database_obj.db_obj)
 
-    # Instatiate the LLM object
-    if os.environ.get("OPENAI_API_KEY"):
-        llm = openai_chat_models.ChatOpenAI(
-            model="gpt-4o",
-            temperature=0.0,
-            api_key=os.environ["OPENAI_API_KEY"]
-        )
-    elif os.environ.get("GOOGLE_API_KEY"):
-        llm = google_chat_models.ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0.0,
-            api_key=os.environ["GOOGLE_API_KEY"]
-        )
+    # Instantiate the schema cache (one compact schema per graph version)
+    schema_cache = src.SchemaCache(os.environ.get("CACHE_DIR", ".cache"))
+
+    # Instatiate the LLM object (only the configured provider is imported)
+    llm = helper.create_llm()
 
-    # Create agent
+    # Load and warm up the shared embedding model without blocking the UI startup
+    src.get_embedding_service(
+        model_name=os.environ["EMBEDDING_MODEL"], device=device
+    ).warm_up(background=True)
+
+    # Create agent (streaming answers and tool progress to the chat unless disabled)
     ask_agent = src.create_ask_agent(
         llm=llm,
-        nxadb_graph=database_obj.get_nxadb_graph(),
+        nxadb_graph=G_adb,
         arango_graph=arango_graph,
         embedding_model=os.environ["EMBEDDING_MODEL"],
-        device=device
+        device=device,
+        stream=os.environ.get("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes"),
+        index_dir=os.path.join(os.environ.get("CACHE_DIR", ".cache"), "indexes")
     )
 
     # Running ask_agent on Gradio Chat Interface
@@ -70,7 +66,9 @@ if __name__=="__main__":
         page2 = gr.Column(visible=(not is_dataset_empty and not is_graph_empty))
 
         if not is_dataset_empty and not is_graph_empty:
-            helper.refresh_database_schema(arango_graph=arango_graph)
+            helper.refresh_database_schema(arango_graph=arango_graph, schema_cache=schema_cache)
+            # Databases loaded by an older version have no secondary indexes yet
+            database_obj.create_indexes()
 
         # Preparation Page
         with page1:
@@ -89,6 +87,7 @@ if __name__=="__main__":
                     status_text = gr.Markdown("<center><h2>Database is empty</h2></center>")
                     prepare_button = gr.Button("Prepare and Load Database", variant="primary")
                     refresh_button = gr.Button("Refresh Database Status")
+                    profile_prepare = gr.Checkbox(label="Profile preparation (pstats + memory snapshot)", value=False)
 
                     prepare_button.click(
                         fn=functools.partial(
@@ -96,8 +95,10 @@ if __name__=="__main__":
                             dataset_obj,
                             database_obj,
                             arango_graph,
+                            schema_cache,
                             device
                         ),
+                        inputs=[profile_prepare],
                         outputs=[status_text, page1, page2]
                     )
 
@@ -111,19 +112,23 @@ if __name__=="__main__":
 
         # Chat page
         with page2:
-            image = gr.Image(helper.load_image("assets/ITS-logo.png"), label="Image Output", render=False)
+            image = gr.Image(helper.load_image("assets/ITS-logo.png"), label="Image Output", format="png", render=False)
             with gr.Row():
                 with gr.Column(scale=7):
                     gr.Markdown("<center><h1>Chatbot Interface</h1></center>")
                     gr.ChatInterface(
                         ask_agent,
+                        # Examples also carry the value of the profiling checkbox
                         examples=[
-                            "What is the definition of private data?", 
-                            "Explain, what are the obligations of electronic system organizers?",
-                            "What is the content of article 33 of UU Number 11 of 2008?",
-                            "Which regulation article has the most influence?",
-                            "What is the shortest path between article/200801011600100 to article/202401001604000? Visualize it",
-                            "Which regulation node id is the center of a particular legal community based on the number of references it has? What it's title? Then check whether the regulation has ever been amended?"
+                            ["What is the definition of private data?", False],
+                            ["Explain, what are the obligations of electronic system organizers?", False],
+                            ["What is the content of article 33 of UU Number 11 of 2008?", False],
+                            ["Which regulation article has the most influence?", False],
+                            ["What is the shortest path between article/200801011600100 to article/202401001604000? Visualize it", False],
+                            ["Which regulation node id is the center of a particular legal community based on the number of references it has? What it's title? Then check whether the regulation has ever been amended?", False]
+                        ],
+                        additional_inputs=[
+                            gr.Checkbox(label="Profile this turn (pstats + memory snapshot)", value=False)
                         ],
                         additional_outputs=[image],
                         type="messages"
@@ -133,4 +138,24 @@ if __name__=="__main__":
                     gr.Markdown("<center><h1>Image Output</h1></center>")
                     image.render()
 
+                    # Per-stage timings of the traced chat turns
+                    with gr.Accordion("Performance", open=False):
+                        trace_summary = gr.Markdown()
+                        summary_button = gr.Button("Refresh Trace Summary")
+                        summary_button.click(
+                            fn=helper.get_trace_summary, outputs=[trace_summary], api_name="trace_summary"
+                        )
+                        index_report = gr.Markdown()
+                        index_button = gr.Button("Explain Index Usage")
+                        index_button.click(
+                            fn=functools.partial(helper.get_index_report, database_obj),
+                            outputs=[index_report],
+                            api_name="index_report"
+                        )
+
+    # Bounded queue, requests beyond it are rejected instead of waiting indefinitely
+    demo.queue(
+        default_concurrency_limit=int(os.environ.get("GRADIO_CONCURRENCY") or 4),
+        max_size=int(os.environ.get("GRADIO_QUEUE_SIZE") or 32)
+    )
     demo.launch()
@@ -1,6 +1,29 @@
-from src import helper
+import importlib
 
-from src.dataset import Dataset
-from src.database import Database
 
-from src.graph_rag.agent import create_ask_agent
\ No newline at end of file
+# Public names are resolved on first access so that importing `src` stays cheap
+_LAZY_ATTRIBUTES = {
+    "helper": ("src.helper", None),
+    "Dataset": ("src.dataset", "Dataset"),
+    "Database": ("src.database", "Database"),
+    "SchemaCache": ("src.schema", "SchemaCache"),
+    "get_embedding_service": ("src.embedding", "get_embedding_service"),
+    "create_ask_agent": ("src.graph_rag.agent", "create_ask_agent"),
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module 'src' has no attribute '{name}'")
+
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
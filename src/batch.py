@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import typing
+import argparse
+import collections
+import concurrent.futures
+import dotenv
+
+from src import tracing
+from src import embedding
+
+if typing.TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+
+def load_questions(
+    path: str
+) -> list[dict[str, typing.Any]]:
+    # Plain text with one question per line, or JSON lines with a `question` (or `query`) field
+    questions = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                item = json.loads(line)
+                item["question"] = item.get("question") or item["query"]
+            else:
+                item = {"question": line}
+            item.setdefault("id", len(questions))
+            questions.append(item)
+    return questions
+
+
+def stage_timings(
+    spans: list[tracing.Span], root_span_id: str
+) -> dict[str, float]:
+    # Total time per traced stage of one question, nested stages are counted in their parents as well
+    stages = collections.defaultdict(float)
+    for span in spans:
+        if span.span_id != root_span_id:
+            stages[span.name] += span.duration_ms
+    return {name: round(duration, 2) for name, duration in sorted(stages.items())}
+
+
+def run_batch(
+    questions: list[dict[str, typing.Any]],
+    run_turn: typing.Callable,
+    tools: dict[str, "BaseTool"],
+    output_path: str,
+    embedding_service: embedding.EmbeddingService|None = None,
+    tool: str|None = None,
+    lang: str = "id",
+    concurrency: int = 4,
+    batch_size: int = 32
+) -> dict[str, typing.Any]:
+    if tool is not None and tool not in tools:
+        raise ValueError(f"Unknown tool `{tool}`, available: {', '.join(tools)}")
+
+    # Embed every question in batches up front, the router and the retrievers then hit the query cache
+    if embedding_service is not None:
+        embedding_service.encode_queries([item["question"] for item in questions], batch_size=batch_size)
+
+    def answer(item: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        start = time.perf_counter()
+        result = {"id": item["id"], "question": item["question"], "answer": None, "error": None}
+        with tracing.span("batch.question", question_id=str(item["id"]), tool=tool or "agent") as span:
+            try:
+                if tool is None:
+                    # A separate conversation per question, earlier answers must not leak into later ones
+                    result["answer"], _ = run_turn(item["question"], [], False, f"batch-{item['id']}")
+                else:
+                    result["answer"] = tools[tool].invoke({"query": item["question"], "lang": item.get("lang") or lang})
+            except Exception as error:
+                result["error"] = f"{type(error).__name__}: {error}"
+
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        spans = tracing.tracer.get_spans(trace_id=span.trace_id)
+        result["stages"] = stage_timings(spans, root_span_id=span.span_id)
+        routes = [child.attributes["route"] for child in spans if "route" in child.attributes]
+        if routes:
+            result["route"] = routes[0]
+        return result
+
+    latencies, errors = [], 0
+    wall_start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as file, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        # Results are written in input order as soon as they (and all before them) are done
+        for result in executor.map(answer, questions):
+            file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            file.flush()
+            latencies.append(result["latency_ms"])
+            errors += result["error"] is not None
+
+    latencies.sort()
+    wall_time = time.perf_counter() - wall_start
+    return {
+        "questions": len(questions),
+        "errors": errors,
+        "wall_s": round(wall_time, 2),
+        "throughput_per_s": round(len(questions) / wall_time, 2) if wall_time else 0.0,
+        "p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0
+    }
+
+
+def main() -> None:
+    from src import helper
+    from src.graph_rag import agent
+
+    dotenv.load_dotenv(".env")
+    parser = argparse.ArgumentParser(description="Answer a file of questions and write answers with per-stage timings as JSON lines.")
+    parser.add_argument("questions", help="Text file with one question per line, or JSON lines with a `question` field")
+    parser.add_argument("--output", default="answers.jsonl", help="Output JSON lines file")
+    parser.add_argument("--tool", default=None, help="Call this tool directly (e.g. semantic_search) instead of the agent")
+    parser.add_argument("--lang", default="id", help="Question language passed to --tool when a line has none")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at once")
+    parser.add_argument("--batch-size", type=int, default=32, help="Questions per embedding batch")
+    args = parser.parse_args()
+
+    components = helper.create_agent_components()
+    run_turn, tools = agent.create_agent_runner(**components, index_dir=helper.get_index_dir())
+    summary = run_batch(
+        questions=load_questions(args.questions),
+        run_turn=run_turn,
+        tools=tools,
+        output_path=args.output,
+        embedding_service=embedding.resolve_embedding_service(
+            embedding_model=components["embedding_model"], device=components["device"]
+        ),
+        tool=args.tool,
+        lang=args.lang,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size
+    )
+    print(json.dumps(summary, indent=4))
+    print(tracing.format_summary(tracing.tracer.summary()))
+
+
+if __name__ == "__main__":
+    main()
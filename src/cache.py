@@ -0,0 +1,74 @@
+import typing
+import threading
+import collections
+
+
+class LRUCache:
+
+    def __init__(
+        self, maxsize: int = 1024
+    ) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(
+        self, key: typing.Hashable, default: typing.Any = None
+    ) -> typing.Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+
+    def put(
+        self, key: typing.Hashable, value: typing.Any
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            # Evict the least recently used entries
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+    def pop(
+        self, key: typing.Hashable, default: typing.Any = None
+    ) -> typing.Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+    def stats(self) -> dict[str, int|float]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0
+            }
+
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+    def __contains__(self, key: typing.Hashable) -> bool:
+        return key in self._data
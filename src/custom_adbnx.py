@@ -40,6 +40,11 @@ edge_definitions = [
         "edge_collection": "refer_to",
         "from_vertex_collections": ["article"],
         "to_vertex_collections": ["article"],
+    },
+    {
+        "edge_collection": "has_passage",
+        "from_vertex_collections": ["article"],
+        "to_vertex_collections": ["passage"],
     }
 ]
 
@@ -1,12 +1,24 @@
 import re
+import typing
 import itertools
-import networkx as nx
-import nx_arangodb as nxadb
 
 from arango import client
 from arango import database
-from src import custom_adbnx
-from adbnx_adapter import adapter
+from src import tracing
+
+if typing.TYPE_CHECKING:
+    import networkx as nx
+    import nx_arangodb as nxadb
+
+
+# Secondary indexes on the fields the AQL tools filter and join on (edge collections already index _from/_to)
+INDEXES = [
+    {"collection": "regulation", "type": "persistent", "fields": ["type", "number", "year"]},
+    {"collection": "article", "type": "persistent", "fields": ["number"]},
+    {"collection": "article", "type": "persistent", "fields": ["chapter"], "sparse": True},
+    {"collection": "article", "type": "persistent", "fields": ["effective"]},
+    {"collection": "definition", "type": "persistent", "fields": ["name"]},
+]
 
 
 class Database:
@@ -62,6 +74,7 @@ class Database:
         self._password = value
     
 
+    @tracing.traced("database.is_empty")
     def is_empty(
         self, dataset: dict[str, list[dict]]
     ) -> bool:
@@ -96,9 +109,12 @@ class Database:
         return False
     
 
+    @tracing.traced("database.get_nxadb_graph")
     def get_nxadb_graph(
         self
-    ) -> nxadb.MultiDiGraph:
+    ) -> "nxadb.MultiDiGraph":
+        import nx_arangodb as nxadb
+
         # Re-connect to the same Graph using nxadb (required)
         self.db_obj = self._connect_to_arangodb()
 
@@ -106,9 +122,13 @@ class Database:
         return nxadb.MultiDiGraph(name=self._graph_name, db=self.db_obj)
     
 
+    @tracing.traced("database.load_dataset_to_arangodb")
     def load_dataset_to_arangodb(
         self, dataset: dict[str, list[dict]]
     ) -> None:
+        from src import custom_adbnx
+        from adbnx_adapter import adapter
+
         # Connect to the ArangoDB database
         self.db_obj = self._connect_to_arangodb() 
 
@@ -116,19 +136,73 @@ class Database:
         custom_adbnx_adapter = adapter.ADBNX_Adapter(self.db_obj, custom_adbnx.CustomADBNXController())
 
         # Create NetworkX graph from dataset
-        G = self._create_networkx_graph(dataset=dataset)
+        with tracing.span("database.create_networkx_graph") as span:
+            G = self._create_networkx_graph(dataset=dataset)
+            span.set_attribute("nodes", G.number_of_nodes())
+            span.set_attribute("edges", G.number_of_edges())
 
         # Load the NetworkX Graph into new ArangoDB graph
-        self.db_obj.delete_graph(self._graph_name, drop_collections=True, ignore_missing=True)
-        custom_adbnx_adapter.networkx_to_arangodb(
-            self._graph_name, G, custom_adbnx.edge_definitions, batch_size=128
-        )
+        with tracing.span("database.networkx_to_arangodb"):
+            self.db_obj.delete_graph(self._graph_name, drop_collections=True, ignore_missing=True)
+            custom_adbnx_adapter.networkx_to_arangodb(
+                self._graph_name, G, custom_adbnx.edge_definitions, batch_size=128
+            )
 
         # Get NetworkX graph representation from ArangoDB
         G_adb = self.get_nxadb_graph()
         
         # Modify some attribute in graph
         self._modify_graph(nxadb_graph=G_adb)
+
+        # Index the lookup fields once the documents are in place
+        self.create_indexes()
+
+
+    @tracing.traced("database.create_indexes")
+    def create_indexes(
+        self
+    ) -> list[dict]:
+        self.db_obj = self.db_obj or self._connect_to_arangodb()
+
+        # Creating an index that already exists returns the existing one, so this is safe to repeat
+        created = []
+        for index in INDEXES:
+            collection = self.db_obj.collection(index["collection"])
+            result = collection.add_persistent_index(
+                fields=index["fields"],
+                sparse=index.get("sparse", False),
+                name=f"idx_{index['collection']}_{'_'.join(index['fields'])}"
+            )
+            created.append({"collection": index["collection"], "name": result["name"], "type": result["type"]})
+        return created
+
+
+    def explain_index_usage(
+        self, queries: list[tuple[str, str, dict]]
+    ) -> list[dict]:
+        self.db_obj = self.db_obj or self._connect_to_arangodb()
+
+        # Summarize each execution plan by the indexes it uses and the collections it still scans
+        report = []
+        for name, query, bind_vars in queries:
+            plan = self.db_obj.aql.explain(query, bind_vars=bind_vars)
+            indexes, full_scans = [], []
+            for node in plan["nodes"]:
+                if node["type"] == "IndexNode":
+                    for index in node.get("indexes", []):
+                        indexes.append(f"{node.get('collection', '')}.{index['name']} ({index['type']})")
+                elif node["type"] == "TraversalNode":
+                    indexes.append("traversal (edge)")
+                elif node["type"] == "EnumerateCollectionNode":
+                    full_scans.append(node["collection"])
+            report.append({
+                "name": name,
+                "estimated_cost": plan.get("estimatedCost", 0.0),
+                "estimated_items": plan.get("estimatedNrItems", 0),
+                "indexes": sorted(set(indexes)),
+                "full_scans": sorted(set(full_scans))
+            })
+        return report
     
 
     def _connect_to_arangodb(self) -> database.StandardDatabase:
@@ -142,7 +216,9 @@ class Database:
 
     def _create_networkx_graph(
         self, dataset: dict[str, list[dict]]
-    ) -> nx.MultiDiGraph:
+    ) -> "nx.MultiDiGraph":
+        import networkx as nx
+
         # Crate empty multi directed graph
         G = nx.MultiDiGraph()
 
@@ -169,8 +245,9 @@ class Database:
         return G
     
 
+    @tracing.traced("database.modify_graph")
     def _modify_graph(
-        self, nxadb_graph: nxadb.MultiDiGraph
+        self, nxadb_graph: "nxadb.MultiDiGraph"
     ) -> None:
         # Set the "effective" attribute to True for all articles
         nxadb_graph.query("""
@@ -1,8 +1,228 @@
 import os
 import re
 import json
+import functools
+import contextlib
+import concurrent.futures
 import tqdm
-import sentence_transformers
+
+from src import embedding
+
+
+# Amendments published only on the BPK website are linked by URL instead of a regulation id
+BPK_URL_PATTERN = re.compile(r"peraturan\.bpk\.go\.id", re.IGNORECASE)
+
+RECORD_KEYS = [
+# Node
+    "node_Regulation",
+    "node_Consideration",
+    "node_Observation",
+    "node_Article",
+    "node_Definition",
+    "node_Passage",
+# Relationship
+    "edge_reg_AMENDED_BY",
+    "edge_HAS_CONSIDERATION",
+    "edge_HAS_OBSERVATION",
+    "edge_HAS_DEFINITION",
+    "edge_HAS_ARTICLE",
+    "edge_NEXT_ARTICLE",
+    "edge_REFER_TO",
+    "edge_art_AMENDED_BY",
+    "edge_HAS_PASSAGE",
+]
+
+# Node records embedded from their `text` once every regulation is transformed
+EMBEDDED_KEYS = ["node_Consideration", "node_Observation", "node_Article", "node_Definition", "node_Passage"]
+
+
+def split_passages(
+    text: str, max_words: int = 120, overlap: int = 20
+) -> list[str]:
+    # Whole lines (paragraphs and list items) are packed up to `max_words` words,
+    # longer lines are cut into overlapping windows first
+    passages, lines, count = [], [], 0
+    for line in text.splitlines():
+        words = line.split()
+        if len(words) > max_words:
+            pieces = [
+                " ".join(words[start:start + max_words])
+                for start in range(0, len(words) - overlap, max_words - overlap)
+            ]
+        else:
+            pieces = [" ".join(words)] if words else []
+
+        for piece in pieces:
+            size = len(piece.split())
+            if lines and count + size > max_words:
+                passages.append("\n".join(lines))
+                lines, count = [], 0
+            lines.append(piece)
+            count += size
+
+    if lines:
+        passages.append("\n".join(lines))
+    return passages or [text.strip()]
+
+
+def transform_regulation(
+    regulation: dict, passage_words: int = 120
+) -> dict[str, list]:
+    # Records of one raw regulation without embeddings, a pure function so regulations map across processes
+    records = {key: [] for key in RECORD_KEYS}
+    records["next_article"] = []
+
+    records["node_Regulation"].append({
+        "id": int(regulation["id"]),
+        "title": regulation["title"],
+        "type": regulation["short_type"],
+        "number": int(regulation["number"]),
+        "year": int(regulation["year"]),
+        "is_amendment": bool(int(regulation["amendment"])),
+        "institution": regulation["institution"],
+        "issue_place": regulation["issue_place"],
+        "issue_date": regulation["issue_date"] if regulation["issue_date"] else None,
+        "effective_date": regulation["effective_date"] if regulation["effective_date"] else None,
+        "subjects": regulation["subjects"],
+        "reference_url": regulation["url"],
+        "download_url": regulation["download_link"],
+        "download_name": regulation["download_name"]
+    })
+
+    for amended_regulation in regulation["status"]["amend"]:
+        if BPK_URL_PATTERN.search(amended_regulation) is None:
+            records["edge_reg_AMENDED_BY"].append({
+                "from_type": "Regulation",
+                "from": int(amended_regulation),
+                "to_type": "Regulation",
+                "to": int(regulation["id"]),
+                "amendment_number": int(regulation["amendment"])
+            })
+
+    for key, content in regulation["content"].items():
+        if key == "considering":
+            records["node_Consideration"].append({
+                "id": int(content["id"]),
+                "text": content["text"]
+            })
+
+            records["edge_HAS_CONSIDERATION"].append({
+                "from_type": "Regulation",
+                "from": int(regulation["id"]),
+                "to_type": "Consideration",
+                "to": int(content["id"])
+            })
+
+        elif key == "observing":
+            records["node_Observation"].append({
+                "id": int(content["id"]),
+                "text": content["text"]
+            })
+
+            records["edge_HAS_OBSERVATION"].append({
+                "from_type": "Regulation",
+                "from": int(regulation["id"]),
+                "to_type": "Observation",
+                "to": int(content["id"])
+            })
+
+        elif key == "articles":
+            for article in content.values():
+                header = (
+                    f"{regulation['title']}, "
+                    f"{(article['chapter_about'] or '') + ', ' if article['chapter_about'] else ''}"
+                    f"{(article['part_about'] or '') + ', ' if article['part_about'] else ''}"
+                    f"{(article['paragraph_about'] or '') + ', ' if article['paragraph_about'] else ''}"
+                    f"Pasal {article['article_number']}:"
+                )
+                text = f"{header}\n{article['text']}".strip()
+
+                records["node_Article"].append({
+                    "id": int(article["id"]),
+                    "number": article["article_number"],
+                    "chapter": article["chapter_number"] if article["chapter_number"] else None,
+                    "part": article["part_number"] if article["part_number"] else None,
+                    "paragraph": article["paragraph_number"] if article["paragraph_number"] else None,
+                    "text": text
+                })
+
+                records["edge_HAS_ARTICLE"].append({
+                    "from_type": "Regulation",
+                    "from": int(regulation["id"]),
+                    "to_type": "Article",
+                    "to": int(article["id"])
+                })
+
+                # Passages of the article text, each under the article header
+                for position, passage in enumerate(split_passages(article["text"], max_words=passage_words)):
+                    passage_id = int(article["id"]) * 1000 + position
+                    records["node_Passage"].append({
+                        "id": passage_id,
+                        "position": position,
+                        "text": f"{header}\n{passage}".strip()
+                    })
+
+                    records["edge_HAS_PASSAGE"].append({
+                        "from_type": "Article",
+                        "from": int(article["id"]),
+                        "to_type": "Passage",
+                        "to": passage_id
+                    })
+
+                if article["previous_article"]:
+                    records["next_article"].append((
+                        int(article["previous_article"]),
+                        int(article["id"]),
+                        int(regulation["amendment"])
+                    ))
+
+                if article["next_article"]:
+                    records["next_article"].append((
+                        int(article["id"]),
+                        int(article["next_article"]),
+                        int(regulation["amendment"])
+                    ))
+
+                if article["references"]:
+                    for reference_article_id in article["references"]:
+                        records["edge_REFER_TO"].append({
+                            "from_type": "Article",
+                            "from": int(article["id"]),
+                            "to_type": "Article",
+                            "to": int(reference_article_id)
+                        })
+
+                if article["amend"]:
+                    for amended_article_id in article["amend"]:
+                        records["edge_art_AMENDED_BY"].append({
+                            "from_type": "Article",
+                            "from": int(amended_article_id),
+                            "to_type": "Article",
+                            "to": int(article["id"])
+                        })
+
+        else:
+            for definition in content:
+                text = (
+                    f"{regulation['title']}, "
+                    f"Definisi {definition['name']}:\n"
+                    f"{definition['definition']}".strip()
+                )
+
+                records["node_Definition"].append({
+                    "id": int(definition["id"]),
+                    "name": definition["name"],
+                    "text": text
+                })
+
+                records["edge_HAS_DEFINITION"].append({
+                    "from_type": "Regulation",
+                    "from": int(regulation["id"]),
+                    "to_type": "Definition",
+                    "to": int(definition["id"])
+                })
+
+    return records
 
 
 class Dataset:
@@ -39,176 +259,45 @@ class Dataset:
     def prepare_dataset(
         self,
         data: list[dict],
-        embedding_model: str,
-        device: str,
-        verbose: bool = True
+        embedding_model: "str|embedding.EmbeddingService",
+        device: str|None,
+        verbose: bool = True,
+        passage_words: int = 120,
+        batch_size: int = 64,
+        workers: int|None = None
     ) -> None:
-        embedding_model = sentence_transformers.SentenceTransformer(
-            model_name_or_path=embedding_model, device=device
-        )
-        
-        result = {
-        # Node
-            "node_Regulation": [],
-            "node_Consideration": [],
-            "node_Observation": [],
-            "node_Article": [],
-            "node_Definition": [],
-        # Relationship
-            "edge_reg_AMENDED_BY": [],
-            "edge_HAS_CONSIDERATION": [],
-            "edge_HAS_OBSERVATION": [],
-            "edge_HAS_DEFINITION": [],
-            "edge_HAS_ARTICLE": [],
-            "edge_NEXT_ARTICLE": [],
-            "edge_REFER_TO": [],
-            "edge_art_AMENDED_BY": [],
-        }
-
-        edge_next_article_1 = []
-        edge_nest_article_2 = []
-
-        for regulation in tqdm.tqdm(iterable=data, desc="Transform regulation data", disable=not verbose):
-            result["node_Regulation"].append({
-                "id": int(regulation["id"]),
-                "title": regulation["title"],
-                "type": regulation["short_type"],
-                "number": int(regulation["number"]),
-                "year": int(regulation["year"]),
-                "is_amendment": bool(int(regulation["amendment"])),
-                "institution": regulation["institution"],
-                "issue_place": regulation["issue_place"],
-                "issue_date": regulation["issue_date"] if regulation["issue_date"] else None,
-                "effective_date": regulation["effective_date"] if regulation["effective_date"] else None,
-                "subjects": regulation["subjects"],
-                "reference_url": regulation["url"],
-                "download_url": regulation["download_link"],
-                "download_name": regulation["download_name"]
-            })
+        # Reuse the process-wide embedding model (also used by the query-time tools)
+        embedding_model = embedding.resolve_embedding_service(embedding_model=embedding_model, device=device)
+        workers = workers or int(os.environ.get("DATASET_WORKERS") or os.cpu_count() or 1)
 
-            for amended_regulation in regulation["status"]["amend"]:
-                if re.search(r"peraturan\.bpk\.go\.id", amended_regulation, re.IGNORECASE) is None:
-                    result["edge_reg_AMENDED_BY"].append({
-                        "from_type": "Regulation",
-                        "from": int(amended_regulation),
-                        "to_type": "Regulation",
-                        "to": int(regulation["id"]),
-                        "amendment_number": int(regulation["amendment"])
-                    })
+        result = {key: [] for key in RECORD_KEYS}
+        next_articles = []
 
-            for key, content in regulation["content"].items():
-                if key == "considering":
-                    result["node_Consideration"].append({
-                        "id": int(content["id"]),
-                        "text": content["text"],
-                        "embedding": embedding_model.encode(content["text"]).tolist()
-                    })
+        # Regulations are independent, the pool maps them in parallel and returns them in input order
+        transform = functools.partial(transform_regulation, passage_words=passage_words)
+        with contextlib.ExitStack() as stack:
+            records_stream = map(transform, data)
+            if workers > 1 and len(data) > 1:
+                executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=workers))
+                records_stream = executor.map(transform, data, chunksize=4)
+            for records in tqdm.tqdm(
+                iterable=records_stream, total=len(data), desc="Transform regulation data", disable=not verbose
+            ):
+                next_articles.extend(records.pop("next_article"))
+                for key, value in records.items():
+                    result[key].extend(value)
 
-                    result["edge_HAS_CONSIDERATION"].append({
-                        "from_type": "Regulation",
-                        "from": int(regulation["id"]),
-                        "to_type": "Consideration",
-                        "to": int(content["id"])
-                    })
-
-                elif key == "observing":
-                    result["node_Observation"].append({
-                        "id": int(content["id"]),
-                        "text": content["text"],
-                        "embedding": embedding_model.encode(content["text"]).tolist()
-
-                    })
-
-                    result["edge_HAS_OBSERVATION"].append({
-                        "from_type": "Regulation",
-                        "from": int(regulation["id"]),
-                        "to_type": "Observation",
-                        "to": int(content["id"])
-                    })
-
-                elif key == "articles":
-                    for article in content.values():
-                        text = (
-                            f"{regulation['title']}, "
-                            f"{(article['chapter_about'] or '') + ', ' if article['chapter_about'] else ''}"
-                            f"{(article['part_about'] or '') + ', ' if article['part_about'] else ''}"
-                            f"{(article['paragraph_about'] or '') + ', ' if article['paragraph_about'] else ''}"
-                            f"Pasal {article['article_number']}:\n"
-                            f"{article['text']}".strip()
-                        )
-
-                        result["node_Article"].append({
-                            "id": int(article["id"]),
-                            "number": article["article_number"],
-                            "chapter": article["chapter_number"] if article["chapter_number"] else None,
-                            "part": article["part_number"] if article["part_number"] else None,
-                            "paragraph": article["paragraph_number"] if article["paragraph_number"] else None,
-                            "text": text,
-                            "embedding": embedding_model.encode(text).tolist()
-                        })
-
-                        result["edge_HAS_ARTICLE"].append({
-                            "from_type": "Regulation",
-                            "from": int(regulation["id"]),
-                            "to_type": "Article",
-                            "to": int(article["id"])
-                        })
-
-                        if article["previous_article"]:
-                            edge_next_article_1.append((
-                                int(article["previous_article"]),
-                                int(article["id"]),
-                                int(regulation["amendment"])
-                            ))
-
-                        if article["next_article"]:
-                            edge_nest_article_2.append((
-                                int(article["id"]),
-                                int(article["next_article"]),
-                                int(regulation["amendment"])
-                            ))
-
-                        if article["references"]:
-                            for reference_article_id in article["references"]:
-                                result["edge_REFER_TO"].append({
-                                    "from_type": "Article",
-                                    "from": int(article["id"]),
-                                    "to_type": "Article",
-                                    "to": int(reference_article_id)
-                                })
-
-                        if article["amend"]:
-                            for amended_article_id in article["amend"]:
-                                result["edge_art_AMENDED_BY"].append({
-                                    "from_type": "Article",
-                                    "from": int(amended_article_id),
-                                    "to_type": "Article",
-                                    "to": int(article["id"])
-                                })
-
-                else:
-                    for definition in content:
-                        text = (
-                            f"{regulation['title']}, "
-                            f"Definisi {definition['name']}:\n"
-                            f"{definition['definition']}".strip()
-                        )
-
-                        result["node_Definition"].append({
-                            "id": int(definition["id"]),
-                            "name": definition["name"],
-                            "text": text,
-                            "embedding": embedding_model.encode(text).tolist()
-                        })
-
-                        result["edge_HAS_DEFINITION"].append({
-                            "from_type": "Regulation",
-                            "from": int(regulation["id"]),
-                            "to_type": "Definition",
-                            "to": int(definition["id"])
-                        })
+        # Embedding runs separately, in large batches per collection instead of one inference per text
+        for key in EMBEDDED_KEYS:
+            if not result[key]:
+                continue
+            embeddings = embedding_model.encode(
+                [record["text"] for record in result[key]], batch_size=batch_size, show_progress_bar=verbose
+            )
+            for record, record_embedding in zip(result[key], embeddings):
+                record["embedding"] = record_embedding.tolist()
 
-        for edge in sorted(set(edge_next_article_1 + edge_nest_article_2)):
+        for edge in sorted(set(next_articles)):
             result["edge_NEXT_ARTICLE"].append({
                 "from_type": "Article",
                 "from": edge[0],
@@ -0,0 +1,217 @@
+import os
+import typing
+import threading
+
+from src import cache
+from src import tracing
+
+if typing.TYPE_CHECKING:
+    import numpy as np
+    import sentence_transformers
+
+
+# Short texts in the same language as the data, used to trigger lazy initialization
+WARM_UP_TEXTS = [
+    "Apa definisi data pribadi?",
+    "Pasal 1 Undang-Undang Nomor 11 Tahun 2008 tentang Informasi dan Transaksi Elektronik",
+]
+
+# Quantized ONNX export shipped by most sentence-transformers models on the Hub
+DEFAULT_ONNX_QUANTIZED_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+class EmbeddingService:
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str|None = None,
+        backend: str = "torch",
+        quantize: bool = False,
+        num_threads: int|None = None,
+        onnx_file_name: str|None = None
+    ) -> None:
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unsupported embedding backend: {backend}")
+
+        self.model_name = model_name
+        # Quantized inference is CPU only
+        self.device = "cpu" if quantize else device
+        self.backend = backend
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.onnx_file_name = onnx_file_name or (DEFAULT_ONNX_QUANTIZED_FILE if quantize else None)
+        self._model = None
+        self._lock = threading.Lock()
+
+
+    @property
+    def model(self) -> "sentence_transformers.SentenceTransformer":
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+
+    def encode(
+        self,
+        texts: str|list[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> "np.ndarray":
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar,
+            convert_to_numpy=True
+        )
+
+
+    def encode_query(
+        self, query: str
+    ) -> "np.ndarray":
+        # Repeated queries (e.g. the same question sent to several tools) skip inference
+        key = self._query_key(query)
+        with tracing.span("embedding.encode_query", query_chars=len(query)) as span:
+            query_embedding = get_query_cache().get(key)
+            span.set_attribute("cache_hit", query_embedding is not None)
+            if query_embedding is None:
+                query_embedding = self.encode(query)
+                query_embedding.flags.writeable = False
+                get_query_cache().put(key, query_embedding)
+        return query_embedding
+
+
+    def encode_queries(
+        self, queries: list[str], batch_size: int = 32
+    ) -> None:
+        # One batched inference for many queries up front, their later `encode_query` calls are cache hits
+        missing = {}
+        for query in queries:
+            key = self._query_key(query)
+            if key not in get_query_cache():
+                missing.setdefault(key, query)
+
+        with tracing.span("embedding.encode_queries", queries=len(queries), encoded=len(missing)):
+            if missing:
+                query_embeddings = self.encode(list(missing.values()), batch_size=batch_size)
+                for key, query_embedding in zip(missing, query_embeddings):
+                    query_embedding.flags.writeable = False
+                    get_query_cache().put(key, query_embedding)
+
+
+    def _query_key(
+        self, query: str
+    ) -> tuple:
+        return (self.model_name, self.backend, self.quantize, normalize_query(query))
+
+
+    def warm_up(
+        self, background: bool = False
+    ) -> None:
+        # Load the model and run a first inference so the first user query doesn't pay for it
+        if background:
+            threading.Thread(target=self.warm_up, name="embedding-warm-up", daemon=True).start()
+        else:
+            self.encode(WARM_UP_TEXTS)
+
+
+    def _load_model(self) -> "sentence_transformers.SentenceTransformer":
+        import sentence_transformers
+
+        if self.backend == "onnx":
+            model_kwargs = {"provider": "CPUExecutionProvider" if self.device in (None, "cpu") else "CUDAExecutionProvider"}
+            if self.onnx_file_name:
+                model_kwargs["file_name"] = self.onnx_file_name
+            if self.num_threads:
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = self.num_threads
+                model_kwargs["session_options"] = session_options
+
+            return sentence_transformers.SentenceTransformer(
+                model_name_or_path=self.model_name,
+                device=self.device,
+                backend="onnx",
+                model_kwargs=model_kwargs
+            )
+
+        import torch
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        model = sentence_transformers.SentenceTransformer(
+            model_name_or_path=self.model_name, device=self.device
+        )
+
+        if self.quantize:
+            # Dynamic int8 quantization of the linear layers (the bulk of a transformer on CPU)
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        return model
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache(
+) -> cache.LRUCache:
+    # Query embeddings shared by every service and tool in the process, sized on first use
+    # so an EMBEDDING_CACHE_SIZE loaded from .env after this module is imported still applies
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = cache.LRUCache(maxsize=int(os.environ.get("EMBEDDING_CACHE_SIZE") or 1024))
+    return _query_cache
+
+
+_services: dict[tuple, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(
+    model_name: str,
+    device: str|None = None,
+    backend: str|None = None,
+    quantize: bool|None = None,
+    num_threads: int|None = None
+) -> EmbeddingService:
+    # Unset options fall back to the environment configuration
+    backend = backend or os.environ.get("EMBEDDING_BACKEND") or "torch"
+    if quantize is None:
+        quantize = os.environ.get("EMBEDDING_QUANTIZE", "").lower() in ("1", "true", "yes")
+    if num_threads is None and os.environ.get("EMBEDDING_THREADS"):
+        num_threads = int(os.environ["EMBEDDING_THREADS"])
+
+    # One service (and therefore one loaded model) per configuration and process
+    key = (model_name, device, backend, quantize, num_threads)
+    with _services_lock:
+        if key not in _services:
+            _services[key] = EmbeddingService(
+                model_name=model_name,
+                device=device,
+                backend=backend,
+                quantize=quantize,
+                num_threads=num_threads,
+                onnx_file_name=os.environ.get("EMBEDDING_ONNX_FILE")
+            )
+        return _services[key]
+
+
+def resolve_embedding_service(
+    embedding_model: "str|EmbeddingService", device: str|None = None
+) -> EmbeddingService:
+    # Accept a model name or an already instantiated service (e.g. a test double)
+    if isinstance(embedding_model, str):
+        return get_embedding_service(model_name=embedding_model, device=device)
+    return embedding_model
+
+
+def normalize_query(
+    query: str
+) -> str:
+    return " ".join(query.split()).lower()
@@ -1 +1,22 @@
-from src.graph_rag.agent import create_ask_agent
\ No newline at end of file
+import importlib
+
+
+# Public names are resolved on first access, so importing a submodule does not pull in LangGraph and LangChain
+_LAZY_ATTRIBUTES = {
+    "create_ask_agent": ("src.graph_rag.agent", "create_ask_agent"),
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module 'src.graph_rag' has no attribute '{name}'")
+
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = getattr(importlib.import_module(module_name), attribute)
+
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -1,46 +1,85 @@
+import os
+import time
+import queue
 import typing
-import gradio as gr
-import nx_arangodb as nxadb
-import sentence_transformers
+import threading
 
-from src import helper
+from src import schema
+from src import tracing
+from src import profiling
+from src import embedding
 from src.graph_rag import prompt
+from src.graph_rag import analytics
+from src.graph_rag import answer_cache
+from src.graph_rag import callbacks
+from src.graph_rag import retriever
+from src.graph_rag import visualization
+from src.graph_rag import router as query_router
 from src.graph_rag import tools as custom_tools
 from langgraph import prebuilt
 from langgraph.checkpoint import memory
 from langchain_core import messages
-from langchain_community import graphs
-from langchain_core.language_models import chat_models
 
+# Shown when a turn produces no visualization
+DEFAULT_IMAGE = "assets/ITS-logo.png"
 
-def create_ask_agent(
-    llm: chat_models.BaseChatModel,
-    nxadb_graph: nxadb.MultiDiGraph,
-    arango_graph: graphs.ArangoGraph,
-    embedding_model: str,
-    device: str,
-) -> typing.Callable[[str], str]:
+if typing.TYPE_CHECKING:
+    import nx_arangodb as nxadb
+    from langchain_community import graphs
+    from langchain_core.tools import BaseTool
+    from langchain_core.language_models import chat_models
+
+
+def create_agent_runner(
+    llm: "chat_models.BaseChatModel",
+    nxadb_graph: "nxadb.MultiDiGraph",
+    arango_graph: "graphs.ArangoGraph",
+    embedding_model: "str|embedding.EmbeddingService",
+    device: str|None,
+    use_router: bool = True,
+    index_dir: str|None = None,
+    answer_cache_size: int|None = None
+) -> tuple[typing.Callable, dict[str, "BaseTool"]]:
     
-    # Instantiate embedding model
-    embedding_model = sentence_transformers.SentenceTransformer(
-        model_name_or_path=embedding_model, device=device
-    )
+    # Get the process-wide embedding model (shared with dataset preparation)
+    embedding_service = embedding.resolve_embedding_service(embedding_model=embedding_model, device=device)
     
     # Instantiate all tools for retrieving information
     aql_search = custom_tools.create_aql_search(
         llm=llm, arango_graph=arango_graph, verbose=False
     )
+    # Local snapshot of the legal graph structure behind the analytics primitives of the generated code
+    # and the graph-aware re-ranking of the article hits
+    legal_graph = analytics.LegalGraph(nxadb_graph=nxadb_graph)
+
+    # Instantiate the hybrid (embedding + BM25) retrievers, indexed on first use
+    article_retriever = retriever.HybridRetriever(
+        nxadb_graph=nxadb_graph, collection="article", embedding_service=embedding_service, index_dir=index_dir
+    )
+    definition_retriever = retriever.HybridRetriever(
+        nxadb_graph=nxadb_graph, collection="definition", embedding_service=embedding_service, index_dir=index_dir
+    )
+    # Articles are found by their passages and returned with the matched passages only
+    article_passages = retriever.PassageRetriever(
+        passage_retriever=retriever.HybridRetriever(
+            nxadb_graph=nxadb_graph, collection="passage", embedding_service=embedding_service, index_dir=index_dir
+        ),
+        article_retriever=article_retriever
+    )
+
+    article_reranker = retriever.GraphReranker(retriever=article_passages, legal_graph=legal_graph)
+
     semantic_search  = custom_tools.create_semantic_search(
-        nxadb_graph=nxadb_graph, embedding_model=embedding_model
+        article_retriever=article_reranker
     )
     definition_search = custom_tools.create_definition_search(
-        nxadb_graph=nxadb_graph, embedding_model=embedding_model
+        definition_retriever=definition_retriever
     )
     text_to_nx_algorithm_search = custom_tools.create_text_to_nx_algorithm_search(
-        llm=llm, nxadb_graph=nxadb_graph, arango_graph=arango_graph, verbose=False
+        llm=llm, nxadb_graph=nxadb_graph, arango_graph=arango_graph, legal_graph=legal_graph, verbose=False
     )
     visualize_query_answer = custom_tools.create_visualize_query_answer(
-        llm=llm, nxadb_graph=nxadb_graph, arango_graph=arango_graph, verbose=False
+        llm=llm, nxadb_graph=nxadb_graph, arango_graph=arango_graph, legal_graph=legal_graph, verbose=False
     )
     
     tools = [
@@ -53,18 +92,215 @@ def create_ask_agent(
     
     # Instantiate the ReAct agent with the LLM, tools, and memory
     state_memory = memory.MemorySaver()
-    config = {"configurable": {"thread_id": "hackathon"}}
     agent = prebuilt.create_react_agent(
         llm, tools, prompt=messages.SystemMessage(content=prompt.SYSTEM_PROMPT), checkpointer=state_memory
     )
-        
-    def ask_agent(query: str, history: list):
-        # Process the query with the agent
-        response = agent.invoke({"messages": [messages.HumanMessage(query)]}, config)
-        response = response["messages"][-1].content
-        if "output.png" in response:
-            return response, gr.Image(helper.load_image("assets/output.png"), label="Visualization Output")
-        else:
-            return response, gr.Image(helper.load_image("assets/ITS-logo.png"), label="Visualization Output")
-
-    return ask_agent
+
+    # `aql_search` is only called directly when there is an ArangoDB connection to run it against
+    available_tools = {tool.name: tool for tool in tools}
+    if arango_graph is None:
+        available_tools.pop(aql_search.name)
+
+    # Obvious questions skip the planning LLM call and go straight to one tool
+    routed_tools = {
+        tool.name: tool for tool in [semantic_search, definition_search, aql_search] if tool.name in available_tools
+    }
+    router = query_router.QueryRouter(embedding_service=embedding_service, tools=routed_tools) if use_router else None
+
+    # Paraphrases of earlier standalone questions get the stored answer (and visualization) back,
+    # only for the graph version they were answered on
+    answer_cache_size = int(os.environ.get("ANSWER_CACHE_SIZE") or 256) if answer_cache_size is None else answer_cache_size
+    question_cache = answer_cache.AnswerCache(
+        maxsize=answer_cache_size,
+        threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD") or 0.92),
+        ttl=float(os.environ.get("ANSWER_CACHE_TTL") or 24 * 3600),
+        get_version=(lambda: schema.get_graph_version(arango_graph.db)) if arango_graph is not None else None
+    ) if answer_cache_size > 0 else None
+
+    def emit(on_event: typing.Callable|None, kind: str, **payload: typing.Any) -> None:
+        if on_event is not None:
+            on_event(kind, payload)
+
+    def answer_routed(query: str, route: query_router.Route, config: dict, on_event: typing.Callable|None) -> str:
+        emit(on_event, "tool_start", name=route.tool)
+        result = routed_tools[route.tool].invoke({"query": query, "lang": route.lang})
+        emit(on_event, "tool_end", name=route.tool, chars=len(result))
+
+        # `aql_search` already answers in natural language, retrieved text still needs one LLM call
+        if route.tool == "aql_search":
+            emit(on_event, "token", text=result)
+            return result
+
+        routed_prompt = prompt.ROUTED_ANSWER_PROMPT.format(query=query, context=result)
+        if on_event is None:
+            return llm.invoke(routed_prompt, config).content
+
+        response = ""
+        for chunk in llm.stream(routed_prompt, config):
+            if isinstance(chunk.content, str) and chunk.content:
+                response += chunk.content
+                emit(on_event, "token", text=chunk.content)
+        return response
+
+    def invoke_agent(query: str, config: dict, on_event: typing.Callable|None) -> str:
+        inputs = {"messages": [messages.HumanMessage(query)]}
+        if on_event is None:
+            return agent.invoke(inputs, config)["messages"][-1].content
+
+        # Node updates mark tool calls starting and finishing, message chunks of the agent node are answer tokens
+        response = ""
+        for mode, chunk in agent.stream(inputs, config, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                message_chunk, metadata = chunk
+                if metadata.get("langgraph_node") == "agent" and isinstance(message_chunk.content, str) \
+                        and message_chunk.content and not getattr(message_chunk, "tool_call_chunks", None):
+                    emit(on_event, "token", text=message_chunk.content)
+            elif "agent" in chunk:
+                message = chunk["agent"]["messages"][-1]
+                for tool_call in message.tool_calls:
+                    emit(on_event, "tool_start", name=tool_call["name"])
+                if not message.tool_calls:
+                    response = message.content
+            elif "tools" in chunk:
+                for message in chunk["tools"]["messages"]:
+                    emit(on_event, "tool_end", name=message.name, chars=len(str(message.content)))
+        return response
+
+    def is_cacheable(query: str, history: list, config: dict) -> bool:
+        # Follow-ups depend on the conversation so far (from the UI or from the agent memory)
+        history = history or agent.get_state(config).values.get("messages")
+        return question_cache is not None and not query_router.is_follow_up(query, history)
+
+    def run_turn(
+        query: str,
+        history: list,
+        profile: bool,
+        thread_id: str,
+        on_event: typing.Callable|None = None,
+        use_cache: bool = True
+    ) -> tuple[str, list[bytes]]:
+        # Each thread id keeps its own conversation memory, LLM calls are recorded as spans
+        config = {
+            "configurable": {"thread_id": thread_id},
+            "callbacks": [callbacks.TracingCallbackHandler(tracing.tracer)]
+        }
+
+        # Process the query with the agent (profiled on demand, see PROFILE_TARGETS),
+        # figures rendered by the tools are collected in memory for this request only
+        with profiling.profile_run("ask_agent", enabled=profile), visualization.capture() as figures, \
+                tracing.span("ask_agent", thread_id=thread_id, query_chars=len(query), stream=on_event is not None) as span:
+            cacheable = use_cache and is_cacheable(query, history, config)
+            cached = question_cache.get(query, embedding_service.encode_query(query)) if cacheable else None
+            route = router.route(query, history) if router and cached is None else None
+            if cached is not None:
+                (response, cached_figures), similarity = cached
+                span.set_attribute("answer_cache_similarity", round(similarity, 4))
+                figures.extend(cached_figures)
+                emit(on_event, "token", text=response)
+                agent.update_state(
+                    config,
+                    {"messages": [messages.HumanMessage(query), messages.AIMessage(response)]},
+                    as_node="agent"
+                )
+            elif route is not None:
+                span.set_attribute("route", route.tool)
+                span.set_attribute("route_source", route.source)
+                response = answer_routed(query, route, config, on_event)
+
+                # Keep the agent memory complete so follow-up questions still have the context
+                agent.update_state(
+                    config,
+                    {"messages": [messages.HumanMessage(query), messages.AIMessage(response)]},
+                    as_node="agent"
+                )
+            else:
+                response = invoke_agent(query, config, on_event)
+            span.set_attribute("response_chars", len(response))
+            span.set_attribute("answer_cache_hit", cached is not None)
+
+            if cacheable and cached is None:
+                question_cache.put(query, embedding_service.encode_query(query), (response, list(figures)))
+
+        return response, figures
+
+    return run_turn, available_tools
+
+
+def create_ask_agent(
+    llm: "chat_models.BaseChatModel",
+    nxadb_graph: "nxadb.MultiDiGraph",
+    arango_graph: "graphs.ArangoGraph",
+    embedding_model: "str|embedding.EmbeddingService",
+    device: str|None,
+    use_router: bool = True,
+    stream: bool = False,
+    index_dir: str|None = None,
+    answer_cache_size: int|None = None
+) -> typing.Callable[[str], str]:
+
+    run_turn, _ = create_agent_runner(
+        llm=llm,
+        nxadb_graph=nxadb_graph,
+        arango_graph=arango_graph,
+        embedding_model=embedding_model,
+        device=device,
+        use_router=use_router,
+        index_dir=index_dir,
+        answer_cache_size=answer_cache_size
+    )
+
+    def output_image(figures: list[bytes]) -> typing.Any:
+        import gradio as gr
+
+        # Stored in the Gradio cache as PNG, the lossless figure is not re-encoded to WebP
+        image = visualization.to_image(figures[-1]) if figures else DEFAULT_IMAGE
+        return gr.Image(image, label="Visualization Output", format="png")
+
+    def ask_agent(query: str, history: list, profile: bool = False, thread_id: str = "hackathon"):
+        response, figures = run_turn(query, history, profile, thread_id)
+        return response, output_image(figures)
+
+    def stream_agent(query: str, history: list, profile: bool = False, thread_id: str = "hackathon"):
+        import gradio as gr
+
+        # The turn runs in its own thread so its spans and profiles stay in one context,
+        # the generator only turns its events into chat messages as they arrive
+        events = queue.Queue()
+
+        def worker() -> None:
+            try:
+                events.put(("done", run_turn(query, history, profile, thread_id, on_event=lambda *event: events.put(event))))
+            except Exception as error:
+                events.put(("error", error))
+
+        threading.Thread(target=worker, name="stream-agent", daemon=True).start()
+
+        steps, started, answer = {}, {}, gr.ChatMessage(role="assistant", content="")
+        while True:
+            kind, payload = events.get()
+            if kind == "tool_start":
+                started[payload["name"]] = time.perf_counter()
+                steps[payload["name"]] = gr.ChatMessage(
+                    role="assistant",
+                    content="",
+                    metadata={"title": f"🛠️ Running `{payload['name']}`", "status": "pending"}
+                )
+            elif kind == "tool_end" and payload["name"] in steps:
+                steps[payload["name"]].metadata.update({
+                    "title": f"🛠️ Used `{payload['name']}`",
+                    "log": f"{payload['chars']} characters retrieved",
+                    "duration": round(time.perf_counter() - started[payload["name"]], 2),
+                    "status": "done"
+                })
+            elif kind == "token":
+                answer.content += payload["text"]
+            elif kind == "error":
+                raise payload
+            elif kind == "done":
+                response, figures = payload
+                answer.content = response
+                yield [*steps.values(), answer], output_image(figures)
+                return
+            yield [*steps.values(), answer], gr.skip()
+
+    return stream_agent if stream else ask_agent
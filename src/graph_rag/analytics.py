@@ -0,0 +1,294 @@
+import re
+import typing
+import inspect
+import threading
+import collections
+import numpy as np
+import networkx as nx
+
+from src import tracing
+
+if typing.TYPE_CHECKING:
+    import nx_arangodb as nxadb
+
+
+NODE_ATTRIBUTES = {
+    "regulation": ("type", "number", "year", "title"),
+    "article": ("number", "chapter", "effective"),
+}
+EDGE_COLLECTIONS = ("has_article", "next_article", "refer_to", "amended_by")
+
+# How strongly relevance flows along each edge type in `personalized_pagerank`, a citation is the
+# strongest signal, a shared regulation the weakest (a regulation links to all of its articles)
+DIFFUSION_WEIGHTS = {"refer_to": 1.0, "next_article": 0.5, "has_article": 0.2, "amended_by": 0.5}
+
+
+class LegalGraph:
+    """Legal-graph operations over a local snapshot of the regulation and article structure.
+
+    The snapshot holds regulations, articles and the edges between them without texts or
+    embeddings, loaded with one AQL query per collection. Generated code calls these
+    primitives (as `legal`) instead of iterating over the ArangoDB-backed `G_adb`.
+    """
+
+    def __init__(
+        self, nxadb_graph: "nxadb.MultiDiGraph"
+    ) -> None:
+        self.nxadb_graph = nxadb_graph
+        self._graph = None
+        self._cache = {}
+        self._lock = threading.RLock()
+
+
+    @property
+    def graph(self) -> nx.MultiDiGraph:
+        if self._graph is None:
+            with self._lock:
+                if self._graph is None:
+                    self._graph = self._load()
+        return self._graph
+
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._graph = None
+            self._cache = {}
+
+
+    def _load(self) -> nx.MultiDiGraph:
+        with tracing.span("analytics.load") as span:
+            G = nx.MultiDiGraph()
+            for collection, attributes in NODE_ATTRIBUTES.items():
+                projection = ", ".join(f"{attribute}: node.{attribute}" for attribute in attributes)
+                for row in self.nxadb_graph.query(f"FOR node IN {collection} RETURN {{id: node._id, {projection}}}"):
+                    G.add_node(row.pop("id"), label=collection, **row)
+
+            for collection in EDGE_COLLECTIONS:
+                for row in self.nxadb_graph.query(
+                    f"FOR edge IN {collection} RETURN {{source: edge._from, target: edge._to, effective: edge.effective}}"
+                ):
+                    G.add_edge(row["source"], row["target"], label=collection, effective=row["effective"])
+
+            span.set_attribute("nodes", G.number_of_nodes())
+            span.set_attribute("edges", G.number_of_edges())
+        return G
+
+
+    def _cached(
+        self, key: typing.Hashable, compute: typing.Callable[[], typing.Any]
+    ) -> typing.Any:
+        # Derived structures are computed once per snapshot
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+
+    def edge_view(
+        self, edge_types: typing.Iterable[str]
+    ) -> nx.DiGraph:
+        """Directed graph of the given edge types only, e.g. ("next_article", "refer_to")."""
+        edge_types = tuple(sorted(edge_types))
+
+        def compute() -> nx.DiGraph:
+            view = nx.DiGraph()
+            view.add_nodes_from(self.graph.nodes(data=True))
+            view.add_edges_from(
+                (source, target) for source, target, label in self.graph.edges(data="label") if label in edge_types
+            )
+            return view
+
+        return self._cached(("edge_view", edge_types), compute)
+
+
+    def find_regulation(
+        self, regulation_type: str, number: int, year: int
+    ) -> str|None:
+        """Node id of a regulation, e.g. find_regulation("UU", 11, 2008) -> "regulation/..."."""
+        index = self._cached("regulation_index", lambda: {
+            (attributes["type"], attributes["number"], attributes["year"]): node_id
+            for node_id, attributes in self.graph.nodes(data=True) if attributes["label"] == "regulation"
+        })
+        return index.get((regulation_type.upper(), int(number), int(year)))
+
+
+    def articles_of(
+        self, regulation_id: str
+    ) -> list[str]:
+        """Article ids of a regulation, ordered by article number."""
+        def compute() -> dict[str, list[str]]:
+            articles = collections.defaultdict(list)
+            for article, regulation in self._article_to_regulation().items():
+                articles[regulation].append(article)
+            return {regulation: sorted(ids, key=self._article_order) for regulation, ids in articles.items()}
+
+        return list(self._cached("regulation_articles", compute).get(regulation_id, []))
+
+
+    def find_article(
+        self, regulation_id: str, number: str
+    ) -> str|None:
+        """Node id of an article by its number within a regulation, e.g. find_article(regulation_id, "27")."""
+        for article in self.articles_of(regulation_id):
+            if str(self.graph.nodes[article].get("number")) == str(number):
+                return article
+        return None
+
+
+    def most_cited_articles(
+        self, k: int = 10, regulation_id: str|None = None
+    ) -> list[tuple[str, int]]:
+        """Articles with the most incoming `refer_to` edges as (article_id, citations), optionally within one regulation."""
+        citations = self._cached("citations", lambda: collections.Counter(
+            target for _, target, label in self.graph.edges(data="label") if label == "refer_to"
+        ))
+        if regulation_id is not None:
+            article_to_regulation = self._article_to_regulation()
+            return collections.Counter({
+                article: count for article, count in citations.items()
+                if article_to_regulation.get(article) == regulation_id
+            }).most_common(k)
+        return citations.most_common(k)
+
+
+    def amendment_chain(
+        self, node_id: str
+    ) -> list[str]:
+        """Regulations or articles that amend `node_id`, direct amendments first, then amendments of those."""
+        amended_by = self.edge_view(["amended_by"])
+        return [node for node in nx.bfs_tree(amended_by, node_id) if node != node_id]
+
+
+    def regulation_citation_graph(
+        self
+    ) -> nx.DiGraph:
+        """Regulation-level graph, an edge A -> B weighted by how many articles of A refer to articles of B."""
+
+        def compute() -> nx.DiGraph:
+            article_to_regulation = self._article_to_regulation()
+            weights = collections.Counter(
+                (article_to_regulation[source], article_to_regulation[target])
+                for source, target, label in self.graph.edges(data="label")
+                if label == "refer_to" and source in article_to_regulation and target in article_to_regulation
+                and article_to_regulation[source] != article_to_regulation[target]
+            )
+            citation_graph = nx.DiGraph()
+            citation_graph.add_nodes_from(
+                (node_id, attributes) for node_id, attributes in self.graph.nodes(data=True)
+                if attributes["label"] == "regulation"
+            )
+            citation_graph.add_weighted_edges_from((source, target, weight) for (source, target), weight in weights.items())
+            return citation_graph
+
+        return self._cached("regulation_citation_graph", compute)
+
+
+    def shortest_path(
+        self, source: str, target: str, edge_types: typing.Iterable[str] = ("next_article", "refer_to")
+    ) -> list[str]:
+        """Shortest path between two nodes over the given edge types, ignoring edge direction if no directed path exists."""
+        view = self.edge_view(edge_types)
+        try:
+            return nx.shortest_path(view, source, target)
+        except nx.NetworkXNoPath:
+            return nx.shortest_path(view.to_undirected(as_view=True), source, target)
+
+
+    def regulation_community(
+        self, regulation_id: str
+    ) -> set[str]:
+        """Regulations in the same citation community (Louvain over the regulation citation graph)."""
+        communities = self._cached("regulation_communities", lambda: nx.community.louvain_communities(
+            self.regulation_citation_graph().to_undirected(), weight="weight", seed=42
+        ))
+        return next((set(community) for community in communities if regulation_id in community), {regulation_id})
+
+
+    def personalized_pagerank(
+        self,
+        seeds: dict[str, float],
+        k: int = 10,
+        label: str|None = "article",
+        edge_types: typing.Iterable[str] = ("refer_to", "has_article", "next_article"),
+        alpha: float = 0.85,
+        iterations: int = 30
+    ) -> list[tuple[str, float]]:
+        """Top-k nodes (of `label`) by PageRank restarted at the weighted `seeds`, edges followed in both directions."""
+        nodes, index, sources, targets, weights = self._adjacency(edge_types)
+        restart = np.zeros(len(nodes), dtype=np.float64)
+        for node_id, weight in seeds.items():
+            if node_id in index:
+                restart[index[node_id]] += weight
+        if not restart.sum():
+            return []
+        restart /= restart.sum()
+
+        # Power iteration over the edge arrays, mass of nodes without edges goes back to the seeds
+        dangling = np.bincount(sources, minlength=len(nodes)) == 0
+        scores = restart.copy()
+        for _ in range(iterations):
+            spread = np.bincount(targets, weights=scores[sources] * weights, minlength=len(nodes))
+            updated = alpha * spread + (1 - alpha + alpha * scores[dangling].sum()) * restart
+            converged = np.abs(updated - scores).sum() < 1e-6
+            scores = updated
+            if converged:
+                break
+
+        ranked = []
+        for position in np.argsort(-scores):
+            if scores[position] <= 0 or len(ranked) == k:
+                break
+            if label is None or self.graph.nodes[nodes[position]]["label"] == label:
+                ranked.append((nodes[position], float(scores[position])))
+        return ranked
+
+
+    def _adjacency(
+        self, edge_types: typing.Iterable[str]
+    ) -> tuple[list[str], dict[str, int], np.ndarray, np.ndarray, np.ndarray]:
+        # Compact edge arrays (both directions, weights normalized per source node) for fast diffusion
+        edge_types = tuple(sorted(edge_types))
+
+        def compute() -> tuple:
+            nodes = list(self.graph.nodes)
+            index = {node_id: position for position, node_id in enumerate(nodes)}
+            sources, targets, weights = [], [], []
+            for source, target, label in self.graph.edges(data="label"):
+                if label in edge_types:
+                    sources += [index[source], index[target]]
+                    targets += [index[target], index[source]]
+                    weights += [DIFFUSION_WEIGHTS.get(label, 1.0)] * 2
+            sources, targets = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+            weights = np.array(weights, dtype=np.float64)
+            out_weights = np.bincount(sources, weights=weights, minlength=len(nodes))
+            return nodes, index, sources, targets, weights / np.maximum(out_weights[sources], 1e-12)
+
+        return self._cached(("adjacency", edge_types), compute)
+
+
+    def _article_to_regulation(
+        self
+    ) -> dict[str, str]:
+        return self._cached("article_to_regulation", lambda: {
+            target: source for source, target, label in self.graph.edges(data="label") if label == "has_article"
+        })
+
+
+    def _article_order(
+        self, article_id: str
+    ) -> tuple[int, str]:
+        number = str(self.graph.nodes[article_id].get("number") or "")
+        digits = "".join(character for character in number if character.isdigit())
+        return int(digits or 0), number
+
+
+def describe(
+) -> str:
+    # One line per public method, rendered into the code-generation prompts
+    lines = []
+    for name, method in inspect.getmembers(LegalGraph, inspect.isfunction):
+        if not name.startswith("_") and method.__doc__:
+            signature = re.sub(r"networkx\.classes\.\w+\.", "nx.", str(inspect.signature(method)))
+            signature = signature.replace("(self, ", "(").replace("(self)", "()")
+            lines.append(f"- `legal.{name}{signature}`: {method.__doc__.strip()}")
+    return "\n".join(lines)
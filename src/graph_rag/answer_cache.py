@@ -0,0 +1,153 @@
+import re
+import time
+import typing
+import threading
+import collections
+import numpy as np
+
+from src import tracing
+from src.graph_rag import aql_templates
+
+
+# Article, regulation, chapter and paragraph numbers and years, e.g. "33", "13", "2003" or "10a"
+NUMBER_PATTERN = re.compile(r"\d+[a-z]?", re.IGNORECASE)
+
+
+class AnswerCache:
+    """Answers of earlier questions, found again by the similarity of the question embeddings.
+
+    Entries expire after `ttl` seconds, the least recently used ones are evicted beyond `maxsize`
+    and an entry only matches while the graph is at the version it was answered on. Questions
+    that differ only in an article, a regulation number or a year embed almost identically, so a
+    similar entry is only served when the numbers and references in both questions are equal.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        threshold: float = 0.92,
+        ttl: float = 24 * 3600,
+        get_version: typing.Callable[[], str]|None = None,
+        version_interval: float = 60.0
+    ) -> None:
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.get_version = get_version
+        self.version_interval = version_interval
+        self.hits = 0
+        self.misses = 0
+        # question -> (embedding, answer, expires at, graph version, identifiers)
+        self._entries = collections.OrderedDict()
+        self._questions = []
+        self._matrix = None
+        self._version = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+
+
+    def version(self) -> str|None:
+        # Checking the graph version takes a request per collection, so it is refreshed periodically
+        if self.get_version is None:
+            return None
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > self.version_interval:
+            self._version = self.get_version()
+            self._version_checked = now
+        return self._version
+
+
+    def get(
+        self, question: str, query_embedding: np.ndarray
+    ) -> tuple[typing.Any, float]|None:
+        # Refreshing the version may query the database, so it happens before taking the lock
+        version = self.version()
+        with tracing.span("answer_cache.get") as span, self._lock:
+            self._expire(version)
+            best_question, similarity = None, 0.0
+            if self._entries:
+                # Rows of the stacked embeddings follow `_questions`, rebuilt only when entries change
+                if self._matrix is None:
+                    self._questions = list(self._entries)
+                    self._matrix = np.stack([self._entries[entry][0] for entry in self._questions])
+                similarities = self._matrix @ query_embedding
+                # Only entries asking about the same articles, regulations and years can answer this question
+                identifiers = question_identifiers(question)
+                similar = np.flatnonzero(similarities >= self.threshold)
+                matching = [row for row in similar if self._entries[self._questions[row]][4] == identifiers]
+                span.set_attribute("identifier_mismatches", len(similar) - len(matching))
+                similarity = float(similarities.max())
+                if matching:
+                    best = max(matching, key=lambda row: similarities[row])
+                    best_question, similarity = self._questions[best], float(similarities[best])
+
+            span.set_attribute("similarity", round(similarity, 4))
+            if best_question is None:
+                self.misses += 1
+                span.set_attribute("hit", False)
+                return None
+
+            self.hits += 1
+            span.set_attribute("hit", True)
+            self._entries.move_to_end(best_question)
+            return self._entries[best_question][1], similarity
+
+
+    def put(
+        self, question: str, query_embedding: np.ndarray, answer: typing.Any
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+        version = self.version()
+        with self._lock:
+            self._entries[question] = (
+                query_embedding, answer, time.monotonic() + self.ttl, version, question_identifiers(question)
+            )
+            self._entries.move_to_end(question)
+            # Evict the least recently used entries
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.hits = 0
+            self.misses = 0
+
+
+    def stats(self) -> dict[str, int|float]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0
+            }
+
+
+    def _expire(
+        self, version: str|None
+    ) -> None:
+        # Drop entries past their TTL or answered on another graph version
+        now = time.monotonic()
+        stale = [
+            question for question, (_, _, expires_at, entry_version, _) in self._entries.items()
+            if expires_at < now or entry_version != version
+        ]
+        for question in stale:
+            del self._entries[question]
+        if stale:
+            self._matrix = None
+
+
+def question_identifiers(
+    question: str
+) -> tuple:
+    # Every number in the question and the regulation, article and chapter references parsed from it
+    numbers = tuple(sorted(number.upper() for number in NUMBER_PATTERN.findall(question)))
+    return numbers, tuple(sorted(aql_templates.extract_parameters(question).items()))
@@ -0,0 +1,171 @@
+import os
+import re
+import typing
+import itertools
+
+from src import helper
+from src import tracing
+from arango import exceptions
+from langchain_community.graphs import arangodb_graph
+
+
+# Plan nodes that write to the database, generated AQL must only read
+MODIFICATION_NODES = {"InsertNode", "UpdateNode", "ReplaceNode", "RemoveNode", "UpsertNode"}
+
+# Large attributes that never belong in an answer prompt
+EXCLUDED_ATTRIBUTES = ("embedding",)
+
+TOKEN_PATTERN = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`[^`]*`|//[^\n]*|/\*.*?\*/|[()\[\]{}]|\w+", re.DOTALL)
+
+
+class AQLGuardError(exceptions.AQLQueryExecuteError):
+    """Raised when generated AQL is rejected before it reaches the cursor."""
+
+    def __init__(
+        self, message: str
+    ) -> None:
+        # Same attributes as a server error, so ArangoGraphQAChain feeds the message to its AQL fix chain
+        Exception.__init__(self, message)
+        self.error_message = message
+        self.error_code = None
+        self.http_code = None
+        self.response = None
+        self.request = None
+
+
+def _top_level_keywords(
+    query: str
+) -> list[tuple[str, int]]:
+    # Keywords outside of brackets, strings and comments, with their offsets
+    keywords, depth = [], 0
+    for match in TOKEN_PATTERN.finditer(query):
+        token = match.group()
+        if token in "([{":
+            depth += 1
+        elif token in ")]}":
+            depth -= 1
+        elif depth == 0 and token.upper() in ("FOR", "LIMIT", "RETURN"):
+            keywords.append((token.upper(), match.start()))
+    return keywords
+
+
+def _strip_comments(
+    query: str
+) -> str:
+    # Strings are matched first, so comment markers inside them are kept
+    return TOKEN_PATTERN.sub(lambda match: " " if match.group().startswith(("//", "/*")) else match.group(), query)
+
+
+def rewrite_query(
+    query: str
+) -> str:
+    # Bound the final RETURN with a LIMIT and drop excluded attributes from what it returns.
+    # Comments go first, a trailing `//` comment would otherwise swallow the brackets added around the expression
+    query = _strip_comments(query).strip().rstrip(";").rstrip()
+    keywords = _top_level_keywords(query)
+    returns = [offset for keyword, offset in keywords if keyword == "RETURN"]
+    if not returns:
+        return query
+
+    head, expression = query[:returns[-1]], query[returns[-1] + len("RETURN"):].strip()
+    excluded = ", ".join(f'"{attribute}"' for attribute in EXCLUDED_ATTRIBUTES)
+    projection = f"IS_OBJECT(guarded_result) ? UNSET_RECURSIVE(guarded_result, {excluded}) : guarded_result"
+
+    # DISTINCT applies after a LIMIT in the same loop, so the distinct rows are limited in an outer loop instead
+    if re.match(r"DISTINCT\b", expression, re.IGNORECASE):
+        return f"FOR guarded_result IN (\n{query}\n)\nLIMIT @guard_limit\nRETURN {projection}"
+
+    has_loop = any(keyword == "FOR" for keyword, _ in keywords)
+    has_limit = any(keyword == "LIMIT" and offset < returns[-1] for keyword, offset in keywords)
+    return (
+        f"{head.rstrip()}\n"
+        + ("LIMIT @guard_limit\n" if has_loop and not has_limit else "")
+        + f"LET guarded_result = (\n{expression}\n)\n"
+        + f"RETURN {projection}"
+    )
+
+
+class GuardedArangoGraph(arangodb_graph.ArangoGraph):
+    """ArangoGraph whose `query` explains generated AQL before running it under resource limits."""
+
+    def __init__(
+        self,
+        graph: arangodb_graph.ArangoGraph,
+        max_cost: float|None = None,
+        max_rows: int|None = None,
+        max_items: int|None = None,
+        memory_limit: int|None = None,
+        max_runtime: float|None = None
+    ) -> None:
+        # Wrap the existing graph instead of calling the parent constructor, which regenerates the schema
+        self._graph = graph
+        self.max_cost = max_cost or float(os.environ.get("AQL_MAX_COST") or 1e6)
+        self.max_rows = max_rows or int(os.environ.get("AQL_MAX_ROWS") or 50)
+        self.max_items = max_items or int(os.environ.get("AQL_MAX_ITEMS") or 10000)
+        self.memory_limit = memory_limit or int(os.environ.get("AQL_MEMORY_LIMIT") or 256 * 1024 * 1024)
+        self.max_runtime = max_runtime or float(os.environ.get("AQL_MAX_RUNTIME") or 10.0)
+
+
+    @property
+    def db(self) -> typing.Any:
+        return self._graph.db
+
+
+    @property
+    def schema(self) -> dict[str, typing.Any]:
+        return self._graph.schema
+
+
+    def set_schema(
+        self, schema: dict[str, typing.Any]|None = None
+    ) -> None:
+        self._graph.set_schema(schema)
+
+
+    @tracing.traced("aql.guarded_query")
+    def query(
+        self, query: str, top_k: int|None = None, **kwargs: typing.Any
+    ) -> list[dict[str, typing.Any]]:
+        top_k = min(top_k or self.max_rows, self.max_rows)
+        guarded_query = rewrite_query(query)
+        bind_vars = {**kwargs.pop("bind_vars", {})}
+        if "@guard_limit" in guarded_query:
+            bind_vars["guard_limit"] = top_k
+
+        # Reject plans that write or that the optimizer expects to be too expensive
+        try:
+            plan = self.db.aql.explain(guarded_query, bind_vars=bind_vars)
+        except exceptions.AQLQueryExplainError as error:
+            raise AQLGuardError(error.error_message) from error
+
+        writes = sorted({node["type"] for node in plan["nodes"]} & MODIFICATION_NODES)
+        if writes:
+            raise AQLGuardError(f"The query must only read data, but its plan contains {', '.join(writes)}.")
+
+        estimated_cost = plan.get("estimatedCost", 0.0)
+        if estimated_cost > self.max_cost:
+            full_scans = sorted({node["collection"] for node in plan["nodes"] if node["type"] == "EnumerateCollectionNode"})
+            raise AQLGuardError(
+                f"The query is too expensive (estimated cost {estimated_cost:.0f}, limit {self.max_cost:.0f}). "
+                f"Filter on indexed attributes (regulation type/number/year, article number) instead of scanning "
+                f"{', '.join(full_scans) or 'whole collections'}."
+            )
+
+        # An explicit LIMIT of the generated query replaces the guard's, it may still ask for far too many rows
+        estimated_items = plan.get("estimatedNrItems", 0)
+        if estimated_items > self.max_items:
+            raise AQLGuardError(
+                f"The query would return too many rows (estimated {estimated_items}, limit {self.max_items}). "
+                f"Filter the rows or lower the LIMIT, only the first {top_k} rows are used."
+            )
+
+        cursor = self.db.aql.execute(
+            guarded_query,
+            bind_vars=bind_vars,
+            batch_size=top_k,
+            memory_limit=self.memory_limit,
+            max_runtime=self.max_runtime,
+            **kwargs
+        )
+        # Nested arrays of documents are not covered by the AQL rewrite
+        return helper.exclude_keys_from_data([doc for doc in itertools.islice(cursor, top_k)], list(EXCLUDED_ATTRIBUTES))
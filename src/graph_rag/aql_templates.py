@@ -0,0 +1,210 @@
+import re
+import typing
+import dataclasses
+
+from src import tracing
+from src.graph_rag import prompt
+
+if typing.TYPE_CHECKING:
+    from langchain_community import graphs
+
+
+# Regulation types as written in English and Indonesian questions, mapped to `regulation.type`
+REGULATION_TYPES = {
+    "UU": r"uu|undang-undang|undang undang|law",
+    "PP": r"pp|peraturan pemerintah|government regulation",
+    "PERPRES": r"perpres|peraturan presiden|presidential regulation",
+    "PERMENKOMINFO": r"permenkominfo|permen kominfo|perkominfo|peraturan menteri komunikasi dan informatika|ministerial regulation",
+}
+
+# Regulation reference, e.g. "UU Number 11 of 2008", "PP No. 71 Tahun 2019", "Law 11/2008"
+REGULATION_PATTERN = re.compile(
+    r"\b(?P<type>" + "|".join(REGULATION_TYPES.values()) + r")\b\s*"
+    r"(?:no\.?|nomor|number|num\.?)?\s*(?P<number>\d+)"
+    r"\s*(?:/|,?\s*(?:of|tahun|year|th\.?)\s*)(?P<year>(?:19|20)\d{2})\b",
+    re.IGNORECASE
+)
+ARTICLE_PATTERN = re.compile(r"\b(?:article|pasal)\s+(?P<article>\d+[a-z]?)\b", re.IGNORECASE)
+CHAPTER_PATTERN = re.compile(r"\b(?:chapter|bab)\s+(?P<chapter>\d+)\b", re.IGNORECASE)
+
+# Sample parameters used to explain the templates without a user question
+EXAMPLE_BIND_VARS = {"type": "UU", "number": 11, "year": 2008, "article": "1", "chapter": "1"}
+
+# A template answers exactly one question, compound questions are left to the LLM
+COMPOUND_PATTERN = re.compile(r"\?.*\?|\b(then|and also|lalu|kemudian|dan juga)\b", re.IGNORECASE | re.DOTALL)
+
+
+@dataclasses.dataclass(frozen=True)
+class AQLTemplate:
+    name: str
+    pattern: re.Pattern
+    query: str
+    parameters: tuple[str, ...]
+
+
+@dataclasses.dataclass
+class CompiledQuery:
+    template: AQLTemplate
+    bind_vars: dict
+
+
+# Ordered from the most to the least specific shape, the first template whose pattern and parameters match wins
+TEMPLATES = [
+    AQLTemplate(
+        name="next_article",
+        pattern=re.compile(r"\b(next article|article after|following article|pasal (?:berikut|setelah|selanjutnya))\b", re.IGNORECASE),
+        query="""WITH regulation, article, has_article, next_article
+FOR r IN regulation
+  FILTER r.type == @type AND r.number == @number AND r.year == @year
+  FOR v IN OUTBOUND r has_article
+    FILTER v.number == @article
+    FOR n IN OUTBOUND v next_article
+      RETURN { number: n.number, text: n.text }""",
+        parameters=("type", "number", "year", "article")
+    ),
+    AQLTemplate(
+        name="article_content",
+        pattern=re.compile(r"\b(article|pasal)\s+\d+", re.IGNORECASE),
+        query="""WITH regulation, article, has_article
+FOR r IN regulation
+  FILTER r.type == @type AND r.number == @number AND r.year == @year
+  FOR v IN OUTBOUND r has_article
+    FILTER v.number == @article
+    RETURN { number: v.number, chapter: v.chapter, text: v.text }""",
+        parameters=("type", "number", "year", "article")
+    ),
+    AQLTemplate(
+        name="chapter_articles",
+        pattern=re.compile(r"\b(chapter|bab)\s+\d+", re.IGNORECASE),
+        query="""WITH regulation, article, has_article
+FOR r IN regulation
+  FILTER r.type == @type AND r.number == @number AND r.year == @year
+  FOR v IN OUTBOUND r has_article
+    FILTER v.chapter == @chapter
+    SORT v._key ASC
+    RETURN { number: v.number, text: v.text }""",
+        parameters=("type", "number", "year", "chapter")
+    ),
+    AQLTemplate(
+        name="amended_articles",
+        pattern=re.compile(r"\b(articles? (?:are |is )?no longer valid|amended articles?|pasal yang (?:sudah |telah )?(?:diubah|tidak berlaku))\b", re.IGNORECASE),
+        query="""WITH regulation, article, has_article, amended_by
+FOR r IN regulation
+  FILTER r.type == @type AND r.number == @number AND r.year == @year
+  FOR v IN OUTBOUND r has_article
+    LET amendments = (FOR a IN OUTBOUND v amended_by RETURN a.number)
+    FILTER LENGTH(amendments) > 0
+    RETURN { number: v.number, amended_by_articles: amendments }""",
+        parameters=("type", "number", "year")
+    ),
+    AQLTemplate(
+        name="regulation_amendments",
+        pattern=re.compile(r"\b(amend\w*|relationship|relation|diubah|mengubah|perubahan|hubungan)\b", re.IGNORECASE),
+        query="""WITH regulation, amended_by
+FOR r IN regulation
+  FILTER r.type == @type AND r.number == @number AND r.year == @year
+  FOR v, e IN ANY r amended_by
+    RETURN {
+      regulation: KEEP(v, "type", "number", "year", "title"),
+      relationship: e._from == r._id ? "amended by" : "amends"
+    }""",
+        parameters=("type", "number", "year")
+    ),
+    AQLTemplate(
+        name="article_count",
+        pattern=re.compile(r"\b(how many articles|number of articles|berapa (?:banyak |jumlah )?pasal|jumlah pasal)\b", re.IGNORECASE),
+        query="""WITH regulation, article, has_article
+FOR r IN regulation
+  FILTER r.type == @type AND r.number == @number AND r.year == @year
+  RETURN { title: r.title, article_count: LENGTH(FOR v IN OUTBOUND r has_article RETURN 1) }""",
+        parameters=("type", "number", "year")
+    ),
+    AQLTemplate(
+        name="regulation_title",
+        pattern=re.compile(r"\b(title|discuss\w*|judul|tentang apa|membahas|mengatur apa)\b", re.IGNORECASE),
+        query="""WITH regulation
+FOR r IN regulation
+  FILTER r.type == @type AND r.number == @number AND r.year == @year
+  RETURN KEEP(r, "type", "number", "year", "title", "issue_date", "effective_date", "subjects")""",
+        parameters=("type", "number", "year")
+    ),
+]
+
+
+def extract_parameters(
+    query: str
+) -> dict:
+    parameters = {}
+
+    regulation = REGULATION_PATTERN.search(query)
+    if regulation:
+        matched_type = regulation.group("type").lower()
+        parameters["type"] = next(
+            name for name, alternatives in REGULATION_TYPES.items()
+            if re.fullmatch(alternatives, matched_type, re.IGNORECASE)
+        )
+        parameters["number"] = int(regulation.group("number"))
+        parameters["year"] = int(regulation.group("year"))
+
+    # Article and chapter numbers are stored as strings, e.g. "28" or "10A"
+    article = ARTICLE_PATTERN.search(query)
+    if article:
+        parameters["article"] = article.group("article").upper()
+
+    chapter = CHAPTER_PATTERN.search(query)
+    if chapter:
+        parameters["chapter"] = chapter.group("chapter")
+
+    return parameters
+
+
+def match(
+    query: str
+) -> CompiledQuery|None:
+    if COMPOUND_PATTERN.search(query):
+        return None
+
+    parameters = extract_parameters(query)
+    if "type" not in parameters:
+        return None
+
+    for template in TEMPLATES:
+        if template.pattern.search(query) and all(name in parameters for name in template.parameters):
+            return CompiledQuery(
+                template=template,
+                bind_vars={name: parameters[name] for name in template.parameters}
+            )
+    return None
+
+
+def execute(
+    arango_graph: "graphs.ArangoGraph", compiled: CompiledQuery, top_k: int = 10
+) -> list:
+    # Fixed query strings with bind vars, so ArangoDB can reuse the cached plan of each template
+    with tracing.span("aql.template", template=compiled.template.name) as span:
+        cursor = arango_graph.db.aql.execute(
+            compiled.template.query,
+            bind_vars=compiled.bind_vars,
+            batch_size=top_k,
+            use_plan_cache=True
+        )
+        rows = [row for _, row in zip(range(top_k), cursor)]
+        span.set_attribute("rows", len(rows))
+    return rows
+
+
+def example_queries(
+) -> list[tuple[str, str, dict]]:
+    # The few-shot AQL examples given to the LLM, followed by the templates with sample parameters
+    queries = []
+    for number, example in enumerate(prompt.AQL_EXAMPLES.split("User Input:")[1:]):
+        _, _, query = example.partition("AQL Query:")
+        queries.append((f"example_{number + 1}", query.strip(), {}))
+
+    for template in TEMPLATES:
+        queries.append((
+            f"template_{template.name}",
+            template.query,
+            {name: EXAMPLE_BIND_VARS[name] for name in template.parameters}
+        ))
+    return queries
@@ -0,0 +1,56 @@
+import typing
+
+from src import tracing
+from langchain_core.callbacks import base as callbacks_base
+
+
+class TracingCallbackHandler(callbacks_base.BaseCallbackHandler):
+    """Records every LangChain LLM call (agent, chains and tools) as a span."""
+
+    def __init__(
+        self, tracer: tracing.Tracer
+    ) -> None:
+        self.tracer = tracer
+        self._spans = {}
+
+
+    def on_chat_model_start(
+        self, serialized: dict, messages: list[list], *, run_id, **kwargs: typing.Any
+    ) -> None:
+        prompt_chars = sum(len(str(message.content)) for batch in messages for message in batch)
+        self._spans[run_id] = self.tracer.start_span(
+            "llm.call", model=(serialized or {}).get("name", ""), prompt_chars=prompt_chars
+        )
+
+
+    def on_llm_start(
+        self, serialized: dict, prompts: list[str], *, run_id, **kwargs: typing.Any
+    ) -> None:
+        self._spans[run_id] = self.tracer.start_span(
+            "llm.call", model=(serialized or {}).get("name", ""), prompt_chars=sum(len(prompt) for prompt in prompts)
+        )
+
+
+    def on_llm_end(
+        self, response, *, run_id, **kwargs: typing.Any
+    ) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                for key in ("input_tokens", "output_tokens", "total_tokens"):
+                    if key in usage:
+                        span.set_attribute(key, span.attributes.get(key, 0) + usage[key])
+                span.set_attribute("completion_chars", span.attributes.get("completion_chars", 0) + len(generation.text))
+        self.tracer.end_span(span)
+
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id, **kwargs: typing.Any
+    ) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            self.tracer.end_span(span, error=error)
@@ -0,0 +1,309 @@
+import ast
+import sys
+import types
+import typing
+import difflib
+import builtins
+import dataclasses
+
+from src import tracing
+
+
+# Graph methods that would modify the ArangoDB-backed `G_adb`
+MUTATING_METHODS = {
+    "add_node", "add_nodes_from", "add_edge", "add_edges_from", "add_weighted_edges_from",
+    "remove_node", "remove_nodes_from", "remove_edge", "remove_edges_from",
+    "clear", "clear_edges", "update",
+}
+
+# NetworkX functions that modify the graph passed as their first argument
+MUTATING_FUNCTIONS = {"set_node_attributes", "set_edge_attributes", "relabel_nodes", "add_path", "add_cycle", "add_star"}
+
+# `nxadb` graphs do not implement these views. They run on the local `legal.graph` snapshot instead,
+# which only holds the regulation and article structure, so not for code that reads node or edge attributes
+UNSUPPORTED_METHODS = {"subgraph", "edge_subgraph"}
+
+# Views whose items are attribute dicts, e.g. `H.nodes[node]["text"]`
+ATTRIBUTE_VIEWS = {"nodes", "edges", "adj", "succ", "pred"}
+ATTRIBUTE_FUNCTIONS = {"get_node_attributes", "get_edge_attributes"}
+
+# Submodules of these are allowed as well, e.g. `networkx.algorithms.community`
+ALLOWED_MODULES = {
+    "networkx", "matplotlib", "matplotlib.pyplot", "numpy", "pandas", "collections", "itertools", "functools",
+    "operator", "heapq", "math", "statistics", "re", "json",
+}
+
+FORBIDDEN_BUILTINS = {"open", "exec", "eval", "compile", "__import__", "input", "breakpoint", "exit", "quit"}
+
+GRAPH_NAME = "G_adb"
+SNAPSHOT_NAME = "legal"
+PLOT_NAME = "plt"
+
+
+class CodeValidationError(Exception):
+    """Raised when generated code fails static validation, the message lists every problem found."""
+
+
+@dataclasses.dataclass
+class ValidationResult:
+    code: str
+    errors: list[str]
+    fixes: list[str]
+
+
+class _LocalFixes(ast.NodeTransformer):
+    """Rewrites trivial mistakes instead of spending an LLM retry on them."""
+
+    def __init__(
+        self, has_snapshot: bool = True, has_plot: bool = False
+    ) -> None:
+        self.has_snapshot = has_snapshot
+        self.has_plot = has_plot
+        self.fixes = []
+
+
+    def visit_Import(
+        self, node: ast.Import
+    ) -> ast.AST|None:
+        # `plt` is already bound to the request's own figure, importing pyplot would replace it
+        if self.has_plot:
+            kept = [alias for alias in node.names if not (alias.name == "matplotlib.pyplot" and alias.asname == PLOT_NAME)]
+            if len(kept) < len(node.names):
+                self.fixes.append(f"line {node.lineno}: removed the pyplot import, `{PLOT_NAME}` is provided")
+                if not kept:
+                    return None
+                node.names = kept
+        return node
+
+
+    def visit_ImportFrom(
+        self, node: ast.ImportFrom
+    ) -> ast.AST|None:
+        if self.has_plot and node.module == "matplotlib":
+            kept = [alias for alias in node.names if not (alias.name == "pyplot" and alias.asname == PLOT_NAME)]
+            if len(kept) < len(node.names):
+                self.fixes.append(f"line {node.lineno}: removed the pyplot import, `{PLOT_NAME}` is provided")
+                if not kept:
+                    return None
+                node.names = kept
+        return node
+
+
+    def visit_Expr(
+        self, node: ast.Expr
+    ) -> ast.AST|None:
+        # Figures are captured in memory per request, showing, saving or closing them is not needed
+        for attribute in ("show", "savefig", "close"):
+            if _is_call(node.value, "plt", attribute):
+                self.fixes.append(f"line {node.lineno}: removed plt.{attribute}()")
+                return None
+        return self.generic_visit(node)
+
+
+    def visit_Call(
+        self, node: ast.Call
+    ) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Attribute) and _is_name(node.func.value, GRAPH_NAME) \
+                and node.func.attr in UNSUPPORTED_METHODS and self.has_snapshot:
+            # The snapshot holds the same structure without texts, copying `G_adb` would load the whole graph
+            self.fixes.append(f"line {node.lineno}: {GRAPH_NAME}.{node.func.attr}() runs on {SNAPSHOT_NAME}.graph")
+            node.func.value = ast.Attribute(value=ast.Name(id=SNAPSHOT_NAME, ctx=ast.Load()), attr="graph", ctx=ast.Load())
+        if isinstance(node.func, ast.Attribute) and _is_name(node.func.value, "nx") and node.func.attr.startswith("draw") \
+                and self.has_plot and not any(keyword.arg == "ax" for keyword in node.keywords):
+            # Without `ax` networkx draws on the pyplot global figure instead of the request's one
+            self.fixes.append(f"line {node.lineno}: nx.{node.func.attr}() draws on {PLOT_NAME}.gca()")
+            node.keywords.append(ast.keyword(arg="ax", value=ast.parse(f"{PLOT_NAME}.gca()", mode="eval").body))
+        return node
+
+
+def _is_name(
+    node: ast.AST, name: str
+) -> bool:
+    return isinstance(node, ast.Name) and node.id == name
+
+
+def _is_call(
+    node: ast.AST, owner: str, attribute: str
+) -> bool:
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+        and _is_name(node.func.value, owner) and node.func.attr == attribute
+
+
+def _reads_attributes(
+    tree: ast.AST
+) -> bool:
+    # Conservative: any attribute read anywhere in the code, e.g. `data=True`, `H.nodes[n]`, `H[u][v]` or `weight="w"`
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, "id", None)
+            if name in ATTRIBUTE_FUNCTIONS or name == "data":
+                return True
+            for keyword in node.keywords:
+                if keyword.arg == "data" and not (isinstance(keyword.value, ast.Constant) and not keyword.value.value):
+                    return True
+                if keyword.arg == "weight" and isinstance(keyword.value, ast.Constant) and isinstance(keyword.value.value, str):
+                    return True
+        elif isinstance(node, ast.Subscript):
+            if isinstance(node.value, ast.Attribute) and node.value.attr in ATTRIBUTE_VIEWS:
+                return True
+            if isinstance(node.value, ast.Subscript) and isinstance(node.value.value, ast.Name):
+                return True
+    return False
+
+
+def _root_name(
+    node: ast.AST
+) -> str|None:
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _bound_names(
+    tree: ast.AST
+) -> set[str]:
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+    return names
+
+
+def _ensure_final_result(
+    tree: ast.Module, fixes: list[str]
+) -> None:
+    if "FINAL_RESULT" in _bound_names(tree) or not tree.body:
+        return
+
+    # A trailing expression or assignment is almost always the intended answer
+    last = tree.body[-1]
+    if isinstance(last, ast.Expr) and not isinstance(last.value, ast.Call):
+        tree.body[-1] = ast.Assign(targets=[ast.Name(id="FINAL_RESULT", ctx=ast.Store())], value=last.value)
+        fixes.append(f"line {last.lineno}: assigned the trailing expression to FINAL_RESULT")
+    elif isinstance(last, ast.Assign) and len(last.targets) == 1 and isinstance(last.targets[0], ast.Name):
+        tree.body.append(ast.Assign(
+            targets=[ast.Name(id="FINAL_RESULT", ctx=ast.Store())],
+            value=ast.Name(id=last.targets[0].id, ctx=ast.Load())
+        ))
+        fixes.append(f"line {last.lineno}: set FINAL_RESULT to `{last.targets[0].id}`")
+
+
+def _is_allowed_module(
+    module: str
+) -> bool:
+    return any(module == allowed or module.startswith(f"{allowed}.") for allowed in ALLOWED_MODULES)
+
+
+def _module_for(
+    name: str, namespace: dict, imports: dict[str, str]
+) -> types.ModuleType|None:
+    if isinstance(namespace.get(name), types.ModuleType):
+        return namespace[name]
+    # Only modules that are already loaded, validation never imports anything itself
+    return sys.modules.get(imports.get(name, ""))
+
+
+def validate(
+    code: str, namespace: dict[str, typing.Any], require_final_result: bool = True
+) -> ValidationResult:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as error:
+        return ValidationResult(code=code, errors=[f"SyntaxError at line {error.lineno}: {error.msg}"], fixes=[])
+
+    fixer = _LocalFixes(
+        has_snapshot=SNAPSHOT_NAME in namespace and not _reads_attributes(tree), has_plot=PLOT_NAME in namespace
+    )
+    tree = ast.fix_missing_locations(fixer.visit(tree))
+    fixes = fixer.fixes
+    if require_final_result:
+        _ensure_final_result(tree, fixes)
+        tree = ast.fix_missing_locations(tree)
+
+    errors = []
+    imports = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            for module in modules:
+                if not _is_allowed_module(module):
+                    errors.append(f"line {node.lineno}: importing `{module}` is not allowed, only {', '.join(sorted(ALLOWED_MODULES))}")
+            if isinstance(node, ast.Import):
+                # `import a.b` binds `a`, `import a.b as c` binds `a.b`
+                imports.update({
+                    alias.asname or alias.name.split(".")[0]: alias.name if alias.asname else alias.name.split(".")[0]
+                    for alias in node.names
+                })
+
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and _root_name(node.func.value) == GRAPH_NAME and node.func.attr in MUTATING_METHODS:
+            errors.append(f"line {node.lineno}: `{node.func.attr}` would modify {GRAPH_NAME}, which is read-only")
+
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and _is_name(node.func.value, GRAPH_NAME) and node.func.attr in UNSUPPORTED_METHODS:
+            # Left in place by the local fixes, the snapshot lacks the attributes the code reads
+            errors.append(
+                f"line {node.lineno}: `{GRAPH_NAME}.{node.func.attr}()` is not supported by nx_arangodb graphs"
+                + (
+                    f", and `{SNAPSHOT_NAME}.graph` only holds the regulation and article structure, not the attributes this "
+                    f"code reads. Read them from `{GRAPH_NAME}.nodes[node]` for the nodes you need instead"
+                    if SNAPSHOT_NAME in namespace else ""
+                )
+            )
+
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and node.func.attr in MUTATING_FUNCTIONS and node.args and _is_name(node.args[0], GRAPH_NAME):
+            errors.append(f"line {node.lineno}: `{ast.unparse(node.func)}` would modify {GRAPH_NAME}, which is read-only")
+
+        elif isinstance(node, (ast.Assign, ast.AugAssign, ast.Delete)):
+            targets = node.targets if isinstance(node, (ast.Assign, ast.Delete)) else [node.target]
+            for target in targets:
+                if isinstance(target, (ast.Attribute, ast.Subscript)) and _root_name(target) == GRAPH_NAME:
+                    errors.append(f"line {node.lineno}: assigning to `{ast.unparse(target)}` would modify {GRAPH_NAME}")
+
+    # Every name must be bound somewhere in the code, in the exec namespace or among the builtins
+    known_names = _bound_names(tree) | set(namespace) | (set(dir(builtins)) - FORBIDDEN_BUILTINS)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known_names:
+            hint = difflib.get_close_matches(node.id, known_names, n=1)
+            errors.append(
+                f"line {node.lineno}: name `{node.id}` is not defined" + (f", did you mean `{hint[0]}`?" if hint else "")
+            )
+
+        # Attributes of known modules, e.g. a misspelled or non-existent NetworkX algorithm
+        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and isinstance(node.ctx, ast.Load):
+            module = _module_for(node.value.id, namespace, imports)
+            if module is not None and not hasattr(module, node.attr):
+                hint = difflib.get_close_matches(node.attr, dir(module), n=1)
+                errors.append(
+                    f"line {node.lineno}: `{node.value.id}.{node.attr}` does not exist"
+                    + (f", did you mean `{node.value.id}.{hint[0]}`?" if hint else "")
+                )
+
+    if require_final_result and "FINAL_RESULT" not in _bound_names(tree):
+        errors.append("`FINAL_RESULT` is never assigned, set it to the answer of the query")
+
+    return ValidationResult(code=ast.unparse(tree) if fixes else code, errors=list(dict.fromkeys(errors)), fixes=fixes)
+
+
+def validate_or_raise(
+    code: str, namespace: dict[str, typing.Any], require_final_result: bool = True
+) -> str:
+    with tracing.span("validate.generated_code", code_chars=len(code)) as span:
+        result = validate(code, namespace=namespace, require_final_result=require_final_result)
+        span.set_attribute("fixes", len(result.fixes))
+        span.set_attribute("errors", len(result.errors))
+    if result.errors:
+        raise CodeValidationError("\n".join(result.errors))
+    return result.code
@@ -24,7 +24,26 @@ SYSTEM_PROMPT = """You are an intelligent assistant that can query a legal graph
 
 6. **Some Notes**
    - Tool`visualize_query_answer` should only be used AFTER executing another tool (e.g., `aql_search` or `text_to_nx_algorithm_search`) and retrieving their `answer`. The `answer` from the previous tool must be passed as the `answer` argument to this tool.
-   - If there is an image, show it using markdown format `![Visualization](assets/output.png)`
+   - Visualizations are displayed next to your `Answer` automatically, do not add image markdown or file paths.
+"""
+
+
+ROUTED_ANSWER_PROMPT = """You are an intelligent assistant that answers questions about Indonesian regulations using text retrieved from a legal graph database.
+
+User Query:
+{query}
+
+Retrieved Data:
+{context}
+
+Your task:
+- `Answer` the user query using only the retrieved data, do not make assumptions.
+- `Answer` in the same language as the user query.
+- Provide a precise and concise `Answer`. If the retrieved data contains legal articles with subsections, structure them in a markdown list format.
+- If the retrieved data is not relevant to the query, inform the user that no relevant information was found in database.
+- Ensure that your `Answer` is well-formatted in Markdown.
+
+Your answer:
 """
 
 
@@ -134,6 +153,9 @@ NX_ALGORITHM_GENERATION_PROMPT = """I have a NetworkX Graph called `G_adb`.
                                 
 It has the following schema: {schema}
 
+A `legal` object is also available with fast, precomputed legal-graph operations. Prefer them over writing loops over `G_adb`:
+{library}
+
 I have the following graph analysis query: {query}.
 
 Your task:
@@ -165,6 +187,9 @@ The networkx Python code will be used to answer the following graph analysis que
 
 The networkx graph has the following schema: {schema}
 
+A `legal` object is also available with fast, precomputed legal-graph operations. Prefer them over writing loops over `G_adb`:
+{library}
+
 Your task:
 - Identify the issue and fix the code.
 - Only assume that networkx is installed, and other base python dependencies.
@@ -200,6 +225,9 @@ VISUALIZATION_GENERATION_PROMPT = """I have a **NetworkX graph** object called `
 
 The networkx graph follows this schema: `{schema}`.  
 
+A `legal` object is also available with fast, precomputed legal-graph operations. Prefer them over writing loops over `G_adb`:
+{library}
+
 I need to **visualize** the answer to the following graph analysis query:  
 
 - **Query:** `{query}`  
@@ -207,22 +235,17 @@ I need to **visualize** the answer to the following graph analysis query:
 
 ### **Important Constraints & Instructions:**  
 1. **Graph Extraction:**  
-    - `G_adb` is an instance of `nx_arangodb.Graph`, which does **not** support `.subgraph()`.  
-- Convert it to a standard **NetworkX graph** (`nx.Graph`) using:  
-        ```python
-        G_nx = nx.Graph(G_adb)
-        ```  
-    - Then, create a **subgraph** from `G_nx` using only the relevant nodes.  
+    - Find the ids of the **relevant nodes** only, using the `legal` operations or by reading `G_adb`.  
+    - `G_adb` is an instance of `nx_arangodb.Graph`, which does **not** support `.subgraph()`, `draw_graph` builds the subgraph for you.  
 
 2. **Your Task:**  
-    - Generate **Python code** that visualizes the answer using the `G_adb` graph.  
-    - The **visualization must be clear and readable** (avoid large node sizes).  
-    - *Show, save, and close the visualization as** `"assets/output.png"` using:  
+    - Generate **Python code** that visualizes the answer by calling:  
         ```python
-        plt.savefig("assets/output.png")
-        plt.show()
-        plt.close()
+        draw_graph(nodes, highlight=[...], title="...")
         ```  
+      where `nodes` is a list of node ids (or a small NetworkX graph) and `highlight` marks the nodes of the answer.  
+      It draws the nodes with the edges between them, keeps the figure readable and reuses cached layouts.  
+    - `plt` (a matplotlib.pyplot stand-in drawing on this request's figure, do not import pyplot yourself) is available for extra styling, but **do NOT call** `plt.savefig`, `plt.show` or `plt.close`, the figure is captured automatically.  
     - **Do NOT modify `G_adb`** (e.g., do not add/remove nodes or edges).  
 
 3. **Output Format:**  
@@ -250,24 +273,16 @@ This **visualization code** is intended to answer the following **graph analysis
 
 The **NetworkX Graph** follows this schema: `{schema}`  
 
+A `legal` object is also available with fast, precomputed legal-graph operations. Prefer them over writing loops over `G_adb`:
+{library}
+
 ### **Your Task:**  
 1. **Identify and fix the issue** in the provided code.  
-2. **Generate the corrected Python code** to visualize the answer using the `G_adb` object.
-    - `G_adb` is an instance of `nx_arangodb.Graph`, which does **not** support `.subgraph()`.  
-    - Convert it to a standard **NetworkX graph** (`nx.Graph`) using:  
-        ```python
-        G_nx = nx.Graph(G_adb)
-        ```  
-    - Then, create a **subgraph** from `G_nx` using only the relevant nodes.  
-3. The **visualization must be clear and readable** (avoid large node sizes).  
+2. **Generate the corrected Python code** to visualize the answer.
+    - Draw the relevant node ids with `draw_graph(nodes, highlight=[...], title="...")`.  
+    - `G_adb` is an instance of `nx_arangodb.Graph`, which does **not** support `.subgraph()`, `draw_graph` builds the subgraph for you.  
+3. **Do NOT call** `plt.savefig`, `plt.show` or `plt.close`, the figure is captured automatically.  
 4. **Do NOT modify `G_adb`** (e.g., do not add/remove nodes or edges).  
-5. *Show, save, and close the visualization as** `"assets/output.png"` using:  
-    ```python
-    plt.savefig("assets/output.png")
-    plt.show()
-    plt.close()
-```  
-6. **Do NOT modify `G_adb`** (e.g., do not add/remove nodes or edges).  
 
 ### **Output Format:**  
 1. Only provide **Python code** (no explanations or additional text).  
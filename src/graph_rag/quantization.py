@@ -0,0 +1,132 @@
+import os
+import numpy as np
+
+
+PRECISIONS = ("float32", "int8")
+
+# Rows converted to float32 at a time by the int8 scoring kernel
+BLOCK_ROWS = 4096
+
+
+class QuantizedEmbeddings:
+    """Row embeddings stored as float32 or scalar-quantized int8, optionally reduced by PCA.
+
+    Int8 codes map every dimension linearly from its own minimum and maximum onto -128..127.
+    They make the index 4x smaller, not faster: NumPy has no integer BLAS, so blocks of codes
+    are converted to float32 for scoring, which is about twice as slow as float32 rows.
+    With PCA the rows keep their coordinates along the top principal components only, so a
+    query is projected into that space before scoring. Scores approximate the dot product of
+    the query with the original embeddings.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        precision: str = "float32",
+        scale: np.ndarray|None = None,
+        offset: np.ndarray|None = None,
+        mean: np.ndarray|None = None,
+        components: np.ndarray|None = None
+    ) -> None:
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported embedding precision: {precision}")
+        self.codes = codes
+        self.precision = precision
+        self.scale = scale
+        self.offset = offset
+        self.mean = mean
+        self.components = components
+
+
+    @classmethod
+    def fit(
+        cls, embeddings: np.ndarray, precision: str = "float32", dimensions: int|None = None
+    ) -> "QuantizedEmbeddings":
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported embedding precision: {precision}")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        mean, components = None, None
+        if dimensions and len(embeddings) and dimensions < embeddings.shape[1]:
+            # Principal axes of the centered rows, the first `dimensions` of them are kept
+            mean = embeddings.mean(axis=0)
+            _, _, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+            components = np.ascontiguousarray(vt[:dimensions].T)
+            embeddings = (embeddings - mean) @ components
+
+        scale, offset = None, None
+        if precision == "int8" and len(embeddings):
+            offset = embeddings.min(axis=0)
+            scale = np.maximum(embeddings.max(axis=0) - offset, 1e-12) / 255
+            codes = (np.round((embeddings - offset) / scale) - 128).astype(np.int8)
+        else:
+            codes = embeddings.astype(precision)
+        return cls(codes, precision=precision, scale=scale, offset=offset, mean=mean, components=components)
+
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.codes, self.scale, self.offset, self.mean, self.components) if array is not None)
+
+
+    def scores(
+        self, query_embedding: np.ndarray
+    ) -> np.ndarray:
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        constant = 0.0
+        if self.components is not None:
+            constant += float(query_embedding @ self.mean)
+            query_embedding = query_embedding @ self.components
+        if self.scale is not None:
+            # Codes are dequantized through the query instead of row by row
+            constant += float(query_embedding @ (self.offset + 128 * self.scale))
+            query_embedding = query_embedding * self.scale
+
+        codes = self.codes
+        if self.precision == "float32":
+            return codes @ query_embedding + constant
+        # Integer matmuls in NumPy are slower still (no BLAS), so blocks are converted to float32 for the product
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            scores[start:start + BLOCK_ROWS] = codes[start:start + BLOCK_ROWS].astype(np.float32) @ query_embedding
+        return scores + constant
+
+
+    def save(
+        self, path: str
+    ) -> None:
+        # Codes as a plain .npy file, so they can be memory-mapped, the small parameters beside them
+        np.save(f"{path}.npy", self.codes)
+        parameters = {
+            name: value for name, value in
+            (("scale", self.scale), ("offset", self.offset), ("mean", self.mean), ("components", self.components))
+            if value is not None
+        }
+        np.savez(f"{path}.params.npz", precision=self.precision, **parameters)
+
+
+    @classmethod
+    def load(
+        cls, path: str, mmap: bool = True
+    ) -> "QuantizedEmbeddings":
+        codes = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        with np.load(f"{path}.params.npz") as parameters:
+            return cls(
+                codes,
+                precision=str(parameters["precision"]),
+                **{name: parameters[name] for name in ("scale", "offset", "mean", "components") if name in parameters}
+            )
+
+
+def get_storage_config(
+    precision: str|None = None, dimensions: int|None = None
+) -> tuple[str, int|None]:
+    # Unset options fall back to the environment configuration
+    precision = precision or os.environ.get("EMBEDDING_STORAGE") or "float32"
+    if dimensions is None:
+        dimensions = int(os.environ.get("EMBEDDING_DIMENSIONS") or 0) or None
+    return precision, dimensions
@@ -0,0 +1,392 @@
+import os
+import re
+import json
+import math
+import typing
+import hashlib
+import threading
+import collections
+import numpy as np
+
+from arango import exceptions
+from src import tracing
+from src.graph_rag import quantization
+
+if typing.TYPE_CHECKING:
+    import nx_arangodb as nxadb
+    from src import embedding
+    from src.graph_rag import analytics
+
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+# ArangoDB error of a query on a collection that does not exist
+COLLECTION_NOT_FOUND = 1203
+
+# Regulation type abbreviations used in questions but spelled out in the article text
+QUERY_EXPANSIONS = {
+    "uu": ["undang"],
+    "pp": ["peraturan", "pemerintah"],
+    "perpres": ["peraturan", "presiden"],
+    "permen": ["peraturan", "menteri"],
+    "permenkominfo": ["peraturan", "menteri", "komunikasi", "informatika"],
+    "law": ["undang"],
+}
+
+
+def tokenize(
+    text: str
+) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def top_k_indices(
+    scores: np.ndarray, k: int
+) -> np.ndarray:
+    # Partial sort is enough to get the k highest scores, ordered descending
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    indices = np.argpartition(-scores, k - 1)[:k]
+    return indices[np.argsort(-scores[indices])]
+
+
+class BM25Index:
+
+    def __init__(
+        self, documents: list[str], k1: float = 1.5, b: float = 0.75
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.num_documents = len(documents)
+
+        postings = collections.defaultdict(list)
+        doc_lengths = np.zeros(self.num_documents, dtype=np.float32)
+
+        for doc_index, document in enumerate(documents):
+            term_freqs = collections.Counter(tokenize(document))
+            doc_lengths[doc_index] = sum(term_freqs.values())
+            for term, freq in term_freqs.items():
+                postings[term].append((doc_index, freq))
+
+        average_length = float(doc_lengths.mean()) if self.num_documents else 0.0
+        # Precompute the per-document length normalization of the BM25 denominator
+        self._length_norm = k1 * (1 - b + b * doc_lengths / (average_length or 1.0))
+
+        self._postings = {}
+        for term, items in postings.items():
+            doc_indices = np.array([item[0] for item in items], dtype=np.int64)
+            freqs = np.array([item[1] for item in items], dtype=np.float32)
+            idf = math.log(1 + (self.num_documents - len(items) + 0.5) / (len(items) + 0.5))
+            self._postings[term] = (doc_indices, freqs, idf)
+
+
+    def score(
+        self, query: str
+    ) -> np.ndarray:
+        terms = set()
+        for term in tokenize(query):
+            terms.update(QUERY_EXPANSIONS.get(term, [term]))
+
+        scores = np.zeros(self.num_documents, dtype=np.float32)
+        for term in terms:
+            if term not in self._postings:
+                continue
+            doc_indices, freqs, idf = self._postings[term]
+            scores[doc_indices] += idf * freqs * (self.k1 + 1) / (freqs + self._length_norm[doc_indices])
+        return scores
+
+
+class HybridRetriever:
+
+    def __init__(
+        self,
+        nxadb_graph: "nxadb.MultiDiGraph",
+        collection: str,
+        embedding_service: "embedding.EmbeddingService",
+        dense_weight: float = 1.0,
+        keyword_weight: float = 1.0,
+        num_candidates: int = 100,
+        rrf_k: int = 60,
+        index_dir: str|None = None,
+        precision: str|None = None,
+        dimensions: int|None = None
+    ) -> None:
+        self.nxadb_graph = nxadb_graph
+        self.collection = collection
+        self.embedding_service = embedding_service
+        self.dense_weight = dense_weight
+        self.keyword_weight = keyword_weight
+        self.num_candidates = num_candidates
+        self.rrf_k = rrf_k
+        self.index_dir = index_dir
+        self.precision, self.dimensions = quantization.get_storage_config(precision=precision, dimensions=dimensions)
+        self.ids = None
+        self.texts = None
+        self.embeddings = None
+        self.bm25 = None
+        self.positions = None
+        self._lock = threading.Lock()
+
+
+    def build(self) -> None:
+        with tracing.span("retriever.build", collection=self.collection) as span:
+            index_path = self._index_path() if self.index_dir else None
+            if index_path and all(
+                os.path.exists(f"{index_path}{suffix}") for suffix in (".npy", ".params.npz", ".json")
+            ):
+                # Memory-mapped, so every process serving this collection shares one copy in the page cache
+                with open(f"{index_path}.json", "r", encoding="utf-8") as file:
+                    ids, texts = json.load(file)
+                self.embeddings = quantization.QuantizedEmbeddings.load(index_path)
+                span.set_attribute("mmap", True)
+            else:
+                # Fetch the whole collection once instead of on every query
+                nodes = self.nxadb_graph.query(f"""
+                    FOR node IN {self.collection}
+                        RETURN {{ id: node._id, text: node.text, embedding: node.embedding }}
+                """)
+
+                ids, texts, embeddings = [], [], []
+                for item in nodes:
+                    ids.append(item["id"])
+                    texts.append(item["text"])
+                    embeddings.append(item["embedding"])
+
+                self.embeddings = quantization.QuantizedEmbeddings.fit(
+                    np.array(embeddings, dtype=np.float32), precision=self.precision, dimensions=self.dimensions
+                )
+                if index_path:
+                    self.embeddings = self._save_index(index_path, ids=ids, texts=texts)
+
+            self.bm25 = BM25Index(texts)
+            self.positions = {node_id: position for position, node_id in enumerate(ids)}
+            self.texts = texts
+            self.ids = ids
+            span.set_attribute("rows", len(ids))
+            span.set_attribute("index_bytes", self.embeddings.nbytes)
+
+
+    def _index_path(self) -> str:
+        # Versioned by the ids and revisions of the collection, so any write to it invalidates the files
+        revisions = sorted(
+            f"{item['id']}:{item['rev']}"
+            for item in self.nxadb_graph.query(f"FOR node IN {self.collection} RETURN {{id: node._id, rev: node._rev}}")
+        )
+        version = hashlib.sha1(";".join(revisions).encode("utf-8")).hexdigest()[:16]
+        storage = self.precision + (f"_pca{self.dimensions}" if self.dimensions else "")
+        return os.path.join(self.index_dir, f"{self.collection}_{version}_{storage}")
+
+
+    def _save_index(
+        self, index_path: str, ids: list[str], texts: list[str]
+    ) -> quantization.QuantizedEmbeddings:
+        # Written under temporary names and renamed, so concurrent builders never read a partial file
+        os.makedirs(self.index_dir, exist_ok=True)
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(f"{temp_path}.json", "w", encoding="utf-8") as file:
+            json.dump([ids, texts], file)
+        self.embeddings.save(temp_path)
+        # The texts go last, their presence marks a complete index
+        for suffix in (".npy", ".params.npz", ".json"):
+            os.replace(f"{temp_path}{suffix}", f"{index_path}{suffix}")
+        return quantization.QuantizedEmbeddings.load(index_path)
+
+
+    def refresh(self) -> None:
+        with self._lock:
+            self.build()
+
+
+    def ensure_built(self) -> None:
+        if self.ids is None:
+            with self._lock:
+                if self.ids is None:
+                    self.build()
+
+
+    def get_text(
+        self, node_id: str
+    ) -> str|None:
+        self.ensure_built()
+        position = self.positions.get(node_id)
+        return self.texts[position] if position is not None else None
+
+
+    @tracing.traced("retriever.search")
+    def search(
+        self, query: str, k: int = 5
+    ) -> list[dict]:
+        self.ensure_built()
+
+        if not self.ids:
+            return []
+
+        # Dense scores, dot product since the embedding model normalizes its output
+        query_embedding = self.embedding_service.encode_query(query)
+        dense_ranking = top_k_indices(scores=self.embeddings.scores(query_embedding), k=self.num_candidates)
+
+        # Keyword scores, only documents that share at least one term are ranked
+        keyword_scores = self.bm25.score(query)
+        keyword_ranking = top_k_indices(scores=keyword_scores, k=self.num_candidates)
+        keyword_ranking = keyword_ranking[keyword_scores[keyword_ranking] > 0]
+
+        # Reciprocal rank fusion of both rankings
+        fused_scores = collections.defaultdict(float)
+        for weight, ranking in ((self.dense_weight, dense_ranking), (self.keyword_weight, keyword_ranking)):
+            for rank, index in enumerate(ranking.tolist()):
+                fused_scores[index] += weight / (self.rrf_k + rank + 1)
+
+        best = sorted(fused_scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            {"id": self.ids[index], "text": self.texts[index], "score": score}
+            for index, score in best
+        ]
+
+
+class PassageRetriever:
+    """Scores the passages of articles and returns every matched article once, with its best passages as context.
+
+    Passages hang off their article by `has_passage`. Without any passages (a dataset prepared
+    before chunking) the search falls back to the article retriever.
+    """
+
+    def __init__(
+        self,
+        passage_retriever: HybridRetriever,
+        article_retriever: HybridRetriever,
+        num_candidates: int = 50,
+        max_passages: int = 2
+    ) -> None:
+        self.passage_retriever = passage_retriever
+        self.article_retriever = article_retriever
+        self.collection = article_retriever.collection
+        self.num_candidates = num_candidates
+        self.max_passages = max_passages
+        self.parents = None
+        self.children = None
+        self.positions = None
+        self._lock = threading.Lock()
+
+
+    def build(self) -> None:
+        with tracing.span("retriever.build", collection="has_passage") as span:
+            try:
+                edges = self.passage_retriever.nxadb_graph.query(
+                    "FOR edge IN has_passage RETURN {source: edge._from, target: edge._to}"
+                )
+            except exceptions.AQLQueryExecuteError as error:
+                # Datasets prepared before chunking have no `has_passage` collection, any other failure is real
+                if error.error_code != COLLECTION_NOT_FOUND:
+                    raise
+                edges = []
+
+            children = collections.defaultdict(list)
+            for edge in edges:
+                children[edge["source"]].append(edge["target"])
+            # Passage ids end in their position within the article
+            children = {article: sorted(passages) for article, passages in children.items()}
+            if children:
+                self.passage_retriever.build()
+
+            self.positions = {passage: position for passages in children.values() for position, passage in enumerate(passages)}
+            self.parents = {passage: article for article, passages in children.items() for passage in passages}
+            self.children = children
+            span.set_attribute("rows", len(self.parents))
+
+
+    def ensure_built(self) -> None:
+        if self.parents is None:
+            with self._lock:
+                if self.parents is None:
+                    self.build()
+
+
+    def get_text(
+        self, node_id: str
+    ) -> str|None:
+        # Articles found through the graph instead of a passage start with their leading passages
+        self.ensure_built()
+        if node_id not in self.children:
+            return self.article_retriever.get_text(node_id)
+        return self._context(self.children[node_id][:self.max_passages])
+
+
+    @tracing.traced("retriever.passages")
+    def search(
+        self, query: str, k: int = 5
+    ) -> list[dict]:
+        self.ensure_built()
+        if not self.parents:
+            return self.article_retriever.search(query, k=k)
+
+        # Articles ranked by their best passage, keeping up to `max_passages` passages each
+        matched = {}
+        for hit in self.passage_retriever.search(query, k=self.num_candidates):
+            passages = matched.setdefault(self.parents[hit["id"]], [])
+            if len(passages) < self.max_passages:
+                passages.append(hit)
+
+        return [
+            {
+                "id": article_id,
+                "text": self._context([passage["id"] for passage in passages]),
+                "score": passages[0]["score"],
+                "passages": [passage["id"] for passage in passages]
+            }
+            for article_id, passages in list(matched.items())[:k]
+        ]
+
+
+    def _context(
+        self, passage_ids: list[str]
+    ) -> str:
+        # The article header once, then the passages in document order
+        texts = [self.passage_retriever.get_text(passage_id) for passage_id in sorted(passage_ids, key=self.positions.get)]
+        header = texts[0].partition("\n")[0]
+        return header + "\n" + "\n...\n".join(text.partition("\n")[2] for text in texts)
+
+
+class GraphReranker:
+    """Re-ranks hybrid retrieval hits by personalized PageRank over the legal graph structure.
+
+    The top `num_seeds` hits seed the diffusion, so articles cited by (or next to) several
+    relevant hits can outrank an isolated lexical match. Texts come from the retriever, so no
+    database query is made per hit.
+    """
+
+    def __init__(
+        self,
+        retriever: HybridRetriever|PassageRetriever,
+        legal_graph: "analytics.LegalGraph",
+        num_seeds: int = 20,
+        alpha: float = 0.5
+    ) -> None:
+        self.retriever = retriever
+        self.legal_graph = legal_graph
+        self.num_seeds = num_seeds
+        self.alpha = alpha
+
+
+    @tracing.traced("retriever.rerank")
+    def search(
+        self, query: str, k: int = 5
+    ) -> list[dict]:
+        hits = self.retriever.search(query, k=self.num_seeds)
+        if not hits:
+            return []
+
+        # Reciprocal rank seeds, fused scores are too flat to tell the best hits apart
+        ranked = self.legal_graph.personalized_pagerank(
+            seeds={hit["id"]: 1 / (rank + 1) for rank, hit in enumerate(hits)},
+            k=k,
+            label=self.retriever.collection,
+            alpha=self.alpha
+        )
+        # Hits keep the text they were found with (e.g. their matched passages)
+        texts = {hit["id"]: hit["text"] for hit in hits}
+        results = [
+            {"id": node_id, "text": texts.get(node_id) or self.retriever.get_text(node_id), "score": score}
+            for node_id, score in ranked
+        ]
+        return [result for result in results if result["text"] is not None]
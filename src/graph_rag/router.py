@@ -0,0 +1,159 @@
+import re
+import typing
+import threading
+import dataclasses
+import numpy as np
+
+from src import tracing
+from src.graph_rag import aql_templates
+
+if typing.TYPE_CHECKING:
+    from src import embedding
+
+
+# Requests that need multi-step planning (analytics, visualization, chained questions) always use the agent
+AGENT_ONLY_PATTERN = re.compile(
+    r"\b(visuali[sz]\w*|plot|draw|gambar\w*|shortest path|jalur terpendek|centrality|sentralitas|"
+    r"communit\w*|komunitas|influen\w*|berpengaruh|pagerank|most cited|paling banyak|then|lalu|kemudian|"
+    r"and also|dan juga)\b",
+    re.IGNORECASE
+)
+
+# Conversational follow-ups depend on the previous turns, which only the agent memory knows about
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|that|this|those|them|they|above|previous|tersebut|itu|ini|tadi|sebelumnya|di atas)\b",
+    re.IGNORECASE
+)
+
+ROUTE_PATTERNS = [
+    ("definition_search", re.compile(
+        r"\b(definition|definisi|pengertian|meaning of|what is meant by|yang dimaksud dengan|arti dari)\b",
+        re.IGNORECASE
+    )),
+]
+
+
+# Labelled example queries for the nearest-neighbour intent classifier, "agent" means no fast route
+INTENT_EXAMPLES = {
+    "definition_search": [
+        "What is the definition of private data?",
+        "What is meant by electronic system organizer?",
+        "Apa yang dimaksud dengan tanda tangan elektronik?",
+        "Apa pengertian dokumen elektronik?",
+    ],
+    "semantic_search": [
+        "Explain, what are the obligations of electronic system organizers?",
+        "What are the sanctions for spreading illegal content?",
+        "How is consumer protection regulated in electronic transactions?",
+        "Apa saja kewajiban penyelenggara sistem elektronik?",
+        "Bagaimana aturan perlindungan data pribadi?",
+        "Apa sanksi bagi penyebar berita bohong?",
+    ],
+    "aql_search": [
+        "What is the content of article 33 of UU Number 11 of 2008?",
+        "Has Law no. 11 of 2008 been amended by other regulations?",
+        "How many articles are there in Law No. 1 of 2024?",
+        "Apa isi pasal 5 PP Nomor 71 Tahun 2019?",
+    ],
+    "agent": [
+        "Which regulation article has the most influence?",
+        "What is the shortest path between two articles? Visualize it",
+        "Which regulation is the center of a legal community based on its references?",
+        "Compare the obligations in two regulations and then visualize the relationship",
+    ],
+}
+
+
+@dataclasses.dataclass
+class Route:
+    tool: str
+    lang: str
+    confidence: float
+    source: str
+
+
+INDONESIAN_WORDS = {
+    "apa", "apakah", "yang", "dan", "dengan", "adalah", "pasal", "tentang", "bagaimana", "siapa",
+    "dimaksud", "saja", "bagi", "dalam", "nomor", "tahun", "isi", "pengertian", "definisi", "kewajiban",
+}
+
+
+def detect_language(
+    query: str
+) -> str:
+    words = re.findall(r"[a-z]+", query.lower())
+    indonesian = sum(word in INDONESIAN_WORDS for word in words)
+    return "id" if words and indonesian / len(words) >= 0.15 else "en"
+
+
+def is_follow_up(
+    query: str, history: list|None
+) -> bool:
+    return bool(history) and FOLLOW_UP_PATTERN.search(query) is not None
+
+
+class QueryRouter:
+
+    def __init__(
+        self,
+        embedding_service: "embedding.EmbeddingService",
+        tools: typing.Iterable[str]|None = None,
+        threshold: float = 0.6,
+        margin: float = 0.05
+    ) -> None:
+        self.embedding_service = embedding_service
+        self.tools = set(tools) if tools is not None else {label for label in INTENT_EXAMPLES if label != "agent"}
+        self.threshold = threshold
+        self.margin = margin
+        self._labels = None
+        self._example_embeddings = None
+        self._lock = threading.Lock()
+
+
+    @tracing.traced("router.route")
+    def route(
+        self, query: str, history: list|None = None
+    ) -> Route|None:
+        if AGENT_ONLY_PATTERN.search(query) or is_follow_up(query, history):
+            return None
+
+        lang = detect_language(query)
+
+        # Regex templates are exact, so they are fully confident (a match for a disabled tool goes to the agent)
+        for tool, pattern in ROUTE_PATTERNS:
+            if pattern.search(query):
+                if tool not in self.tools:
+                    return None
+                return Route(tool=tool, lang=lang, confidence=1.0, source="pattern")
+
+        # Structured questions that an AQL template answers need no planning either
+        if "aql_search" in self.tools and aql_templates.match(query) is not None:
+            return Route(tool="aql_search", lang=lang, confidence=1.0, source="template")
+
+        # Nearest labelled example, accepted only with a clear margin over the other intents
+        scores = self._intent_scores(query)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_tool, best_score), (_, second_score) = ranked[0], ranked[1]
+        if best_tool in self.tools and best_score >= self.threshold and best_score - second_score >= self.margin:
+            return Route(tool=best_tool, lang=lang, confidence=best_score, source="intent")
+
+        return None
+
+
+    def _intent_scores(
+        self, query: str
+    ) -> dict[str, float]:
+        if self._example_embeddings is None:
+            with self._lock:
+                if self._example_embeddings is None:
+                    labels, texts = [], []
+                    for label, examples in INTENT_EXAMPLES.items():
+                        labels.extend([label] * len(examples))
+                        texts.extend(examples)
+                    self._example_embeddings = np.asarray(self.embedding_service.encode(texts), dtype=np.float32)
+                    self._labels = np.array(labels)
+
+        similarities = self._example_embeddings @ self.embedding_service.encode_query(query)
+        return {
+            label: float(similarities[self._labels == label].max()) for label in INTENT_EXAMPLES
+        }
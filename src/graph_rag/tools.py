@@ -1,33 +1,35 @@
-import os
 import re
-import torch
 import typing
-import numpy as np
 import networkx as nx
-import deep_translator
-import nx_arangodb as nxadb
-import sentence_transformers
 
+from src import tracing
+from src import resilience
+from src import schema as graph_schema
 from src.graph_rag import prompt
 from src.graph_rag import models
-from sentence_transformers import util
+from src.graph_rag import analytics
+from src.graph_rag import aql_templates
+from src.graph_rag import code_validator
+from src.graph_rag import visualization
 from langchain import prompts
 from langchain_core import tools
-from langchain_core.language_models import chat_models
-from langchain_community import graphs
-from langchain_community.chains.graph_qa import arangodb
 
+if typing.TYPE_CHECKING:
+    import nx_arangodb as nxadb
+    from src.graph_rag import retriever
+    from langchain_core.language_models import chat_models
+    from langchain_community import graphs
 
 
 def create_semantic_search(
-    nxadb_graph: nxadb.MultiDiGraph,
-    embedding_model: sentence_transformers.SentenceTransformer
+    article_retriever: "retriever.HybridRetriever|retriever.PassageRetriever|retriever.GraphReranker"
 ) -> typing.Callable[[str, str], str]:
     
     @tools.tool(args_schema=models.UserQuery)
+    @tracing.traced("tool.semantic_search")
     def semantic_search(query: str, lang: str = "id"):
         """This tool is used to retrieve relevant articles based on semantic similarity 
-        using text embeddings stored in the database. 
+        using text embeddings stored in the database, combined with keyword matching. 
     
         Use this tool when the user query:
         - Asks about general topics that cannot be structured into an AQL query.
@@ -35,41 +37,10 @@ def create_semantic_search(
         """
 
         if lang != "id":
-            query = deep_translator.GoogleTranslator(source=lang, target="id").translate(query)
+            query = resilience.translate(query, source=lang, target="id")
 
-        # Embed the query
-        query_embedding = embedding_model.encode(query)
-        
-        # Retrieve all embeddings data from nodes article
-        nodes = nxadb_graph.query("""
-            FOR node IN article
-                RETURN { id: node._id, embedding: node.embedding }
-        """)
-        
-        nodes_id = []
-        nodes_text_embedding = []
-
-        for item in nodes:
-            nodes_id.append(item["id"])
-            nodes_text_embedding.append(np.array(item["embedding"], dtype=np.float32))
-
-        nodes_id = np.array(nodes_id)
-        nodes_text_embedding = np.array(nodes_text_embedding)
-
-        # Compute dot product scores on embeddings
-        # Not cosine similarity since all-MiniLM-L6-v2 normalizes the data
-        dot_scores = util.dot_score(query_embedding, nodes_text_embedding)[0]
-
-        # Get the top-k most similar article to the user query
-        scores, indices = torch.topk(input=dot_scores, k=5)
-        initial_nodes_id = nodes_id[indices].tolist()
-        initial_nodes = nxadb_graph.query("""
-            FOR node IN article
-                FILTER node._id IN @initial_nodes_id
-                RETURN {id: node._id, text: node.text}
-            """,
-            bind_vars={"initial_nodes_id": initial_nodes_id}
-        )
+        # Get the top-k articles by relevance, re-ranked over the articles they refer to and follow
+        initial_nodes = article_retriever.search(query, k=8)
 
         text_result = ""
 
@@ -79,24 +50,7 @@ def create_semantic_search(
                 text_result = text_result + f"RELEVANT TEXT FROM DATABASE ({number + 1})"
             else:
                 text_result = text_result + "\n" + f"RELEVANT TEXT FROM DATABASE ({number + 1})"
-            text_result = text_result + "\n" * 2 + initial_node["text"]
-            
-            # Retrieve other articles connected via the 'refer_to' edge
-            refer_to_other_nodes = nxadb_graph.query("""
-                FOR edge IN refer_to
-                FILTER edge._from == @initial_node_id OR edge._to == @initial_node_id
-                FOR target IN article
-                    FILTER ( target._id == edge._from OR target._id == edge._to ) AND target._id != @initial_node_id
-                    SORT target._id ASC
-                    RETURN { id: target._id, text: target.text }
-                """,
-                bind_vars={"initial_node_id": initial_node["id"]}
-            )
-
-            for other_node in refer_to_other_nodes:
-                text_result = text_result + "\n" * 2 + other_node["text"]
-            
-            text_result = text_result + "\n" * 2 + "-" * 50
+            text_result = text_result + "\n" * 2 + initial_node["text"] + "\n" * 2 + "-" * 50
 
         return text_result
     
@@ -104,55 +58,24 @@ def create_semantic_search(
 
 
 def create_definition_search(
-    nxadb_graph: nxadb.MultiDiGraph,
-    embedding_model: sentence_transformers.SentenceTransformer
+    definition_retriever: "retriever.HybridRetriever"
 ) -> typing.Callable[[str, str], str]:
 
     @tools.tool(args_schema=models.UserQuery)
+    @tracing.traced("tool.definition_search")
     def definition_search(query: str, lang: str = "id"):
         """This tool is used to retrieve relevant definition statement based on semantic
-        similarity  using text embeddings stored in the database. 
+        similarity  using text embeddings stored in the database, combined with keyword matching. 
     
         Use this tool only when the user query:
         - Asks about definition of something.
         """
 
         if lang != "id":
-            query = deep_translator.GoogleTranslator(source=lang, target="id").translate(query)
+            query = resilience.translate(query, source=lang, target="id")
 
-        # Embed the query
-        query_embedding = embedding_model.encode(query)
-        
-        # Retrieve all embeddings data from nodes definition
-        nodes = nxadb_graph.query("""
-            FOR node IN definition
-                RETURN { id: node._id, embedding: node.embedding }
-        """)
-        
-        nodes_id = []
-        nodes_text_embedding = []
-
-        for item in nodes:
-            nodes_id.append(item["id"])
-            nodes_text_embedding.append(np.array(item["embedding"], dtype=np.float32))
-
-        nodes_id = np.array(nodes_id)
-        nodes_text_embedding = np.array(nodes_text_embedding)
-
-        # Compute dot product scores on embeddings
-        # Not cosine similarity since all-MiniLM-L6-v2 normalizes the data
-        dot_scores = util.dot_score(query_embedding, nodes_text_embedding)[0]
-
-        # Get the top-k most similar definition to the user query
-        scores, indices = torch.topk(input=dot_scores, k=10)
-        initial_nodes_id = nodes_id[indices].tolist()
-        initial_nodes = nxadb_graph.query("""
-            FOR node IN definition
-                FILTER node._id IN @initial_nodes_id
-                RETURN {id: node._id, text: node.text}
-            """,
-            bind_vars={"initial_nodes_id": initial_nodes_id}
-        )
+        # Get the top-k definitions by fused embedding and keyword (BM25) relevance
+        initial_nodes = definition_retriever.search(query, k=10)
 
         text_result = ""
 
@@ -170,12 +93,13 @@ def create_definition_search(
 
 
 def create_aql_search(
-    llm: chat_models.BaseChatModel,
-    arango_graph: graphs.ArangoGraph,
+    llm: "chat_models.BaseChatModel",
+    arango_graph: "graphs.ArangoGraph",
     verbose: bool = False
 ) -> typing.Callable[[str, str], str]:
     
     @tools.tool(args_schema=models.UserQuery)
+    @tracing.traced("tool.aql_search")
     def aql_search(query: str, lang: str = "en") -> str:
         """This tool is used to translate a Natural Language Query into an AQL query
         (Arango Query Language), execute the query, and return the results in Natural Language. 
@@ -187,9 +111,29 @@ def create_aql_search(
         DO NOT use this tool to answer definition-based questions, use `definition_search` instead.
         DO NOT use this tool if the query cannot be structured into AQL, use `semantic_search` instead. 
         """
-        
-        if lang != "en":
-            query = deep_translator.GoogleTranslator(source=lang, target="en").translate(query)
+
+        # Common question shapes run a pre-validated AQL template, without the AQL generation LLM call
+        compiled = aql_templates.match(query)
+        if compiled is None and lang != "en":
+            query = resilience.translate(query, source=lang, target="en")
+            lang = "en"
+            compiled = aql_templates.match(query)
+
+        if compiled is not None:
+            aql_result = aql_templates.execute(arango_graph, compiled)
+            if aql_result:
+                return llm.invoke(
+                    prompt.AQL_QA_TEMPLATE.format(
+                        adb_schema=graph_schema.render_schema(arango_graph.schema),
+                        user_input=query,
+                        aql_query=compiled.template.query,
+                        aql_result=aql_result
+                    )
+                ).content
+
+            # No rows usually means the template misread the question, let the LLM write the AQL instead
+            if lang != "en":
+                query = resilience.translate(query, source=lang, target="en")
 
         # Create the prompt template
         AQL_QA_PROMPT = prompts.PromptTemplate(
@@ -197,17 +141,22 @@ def create_aql_search(
             template=prompt.AQL_QA_TEMPLATE
         )
         
-        # Initialize the ArangoDB Graph QA Chain
+        from langchain_community.chains.graph_qa import arangodb
+        from src.graph_rag import aql_guard
+
+        # Initialize the ArangoDB Graph QA Chain, generated AQL is explained, bounded and
+        # stripped of embeddings before it runs (a rejection is sent back to the AQL fix chain)
         qa_chain = arangodb.ArangoGraphQAChain.from_llm(
             llm=llm,
             qa_prompt=AQL_QA_PROMPT,
-            graph=arango_graph,
+            graph=aql_guard.GuardedArangoGraph(arango_graph),
             aql_examples=prompt.AQL_EXAMPLES,
             allow_dangerous_requests=True,
             verbose=verbose
         )
 
-        result = qa_chain.invoke(query)
+        with tracing.span("aql.qa_chain"):
+            result = qa_chain.invoke(query)
 
         return str(result["result"])
     
@@ -215,13 +164,15 @@ def create_aql_search(
 
 
 def create_text_to_nx_algorithm_search(
-    llm: chat_models.BaseChatModel,
-    nxadb_graph: nxadb.MultiDiGraph,
-    arango_graph: graphs.ArangoGraph,
+    llm: "chat_models.BaseChatModel",
+    nxadb_graph: "nxadb.MultiDiGraph",
+    arango_graph: "graphs.ArangoGraph",
+    legal_graph: "analytics.LegalGraph",
     verbose: bool = False
 ) -> typing.Callable[[str, str], str]:
     
     @tools.tool(args_schema=models.UserQuery)
+    @tracing.traced("tool.text_to_nx_algorithm_search")
     def text_to_nx_algorithm_search(query: str, lang: str = "en") -> str:
         """This tool is used to analyze and retrieve insights from a NetworkX graph representation 
         of the ArangoDB dataset by generating and executing Python code.
@@ -237,13 +188,14 @@ def create_text_to_nx_algorithm_search(
         """
 
         if lang != "en":
-            query = deep_translator.GoogleTranslator(source=lang, target="en").translate(query)
+            query = resilience.translate(query, source=lang, target="en")
 
         if verbose: print("\n### 1. Generating NetworkX code")
 
         text_to_nx = llm.invoke(
             prompt.NX_ALGORITHM_GENERATION_PROMPT.format(
-                schema=arango_graph.schema,
+                schema=graph_schema.render_schema(arango_graph.schema),
+                library=analytics.describe(),
                 query=query
             )
         ).content
@@ -258,14 +210,17 @@ def create_text_to_nx_algorithm_search(
         ######################
 
         if verbose: print("\n### 2. Executing NetworkX code")
-        global_vars = {"G_adb": nxadb_graph, "nx": nx}
+        global_vars = {"G_adb": nxadb_graph, "nx": nx, "legal": legal_graph}
         local_vars = {}
 
         MAX_ATTEMPTS = 3
 
         for attempt in range(MAX_ATTEMPTS + 1):
             try:
-                exec(text_to_nx_cleaned, global_vars, global_vars)
+                # Catch errors statically first, trivial ones are fixed without another LLM call
+                text_to_nx_cleaned = code_validator.validate_or_raise(text_to_nx_cleaned, namespace=global_vars)
+                with tracing.span("exec.generated_code", attempt=attempt, code_chars=len(text_to_nx_cleaned)):
+                    exec(text_to_nx_cleaned, global_vars, global_vars)
                 FINAL_RESULT = global_vars["FINAL_RESULT"]
                 break
             except Exception as e:
@@ -285,7 +240,8 @@ def create_text_to_nx_algorithm_search(
                         code=text_to_nx_cleaned,
                         error=e,
                         query=query,
-                        schema=arango_graph.schema
+                        schema=graph_schema.render_schema(arango_graph.schema),
+                        library=analytics.describe()
                     )
                 ).content
 
@@ -306,7 +262,7 @@ def create_text_to_nx_algorithm_search(
 
         nx_to_text = llm.invoke(
             prompt.NX_ALGORITHM_QA_PROMPT.format(
-                schema=arango_graph.schema,
+                schema=graph_schema.render_schema(arango_graph.schema),
                 query=query,
                 code=text_to_nx_cleaned,
                 result=FINAL_RESULT
@@ -319,13 +275,17 @@ def create_text_to_nx_algorithm_search(
 
 
 def create_visualize_query_answer(
-    llm: chat_models.BaseChatModel,
-    nxadb_graph: nxadb.MultiDiGraph,
-    arango_graph: graphs.ArangoGraph,
+    llm: "chat_models.BaseChatModel",
+    nxadb_graph: "nxadb.MultiDiGraph",
+    arango_graph: "graphs.ArangoGraph",
+    legal_graph: "analytics.LegalGraph",
     verbose: bool = False
 ) -> typing.Callable[[str, str, str], str]:
 
+    draw_graph = visualization.create_draw_graph(legal_graph=legal_graph)
+
     @tools.tool(args_schema=models.VisualizeQuery)
+    @tracing.traced("tool.visualize_query_answer")
     def visualize_query_answer(query: str, answer: str, lang: str):
         """This tool is used to generate and execute Python code for visualizing the result  
         of a graph analysis query on a NetworkX representation of the ArangoDB dataset.  
@@ -345,15 +305,15 @@ def create_visualize_query_answer(
         """
 
         if lang != "en":
-            translator = deep_translator.GoogleTranslator(source=lang, target="en")
-            query = translator.translate(query)
-            answer = translator.translate(answer)
+            query = resilience.translate(query, source=lang, target="en")
+            answer = resilience.translate(answer, source=lang, target="en")
 
         if verbose: print("\n### 1. Generating visualization code")
 
         text_to_visual = llm.invoke(
             prompt.VISUALIZATION_GENERATION_PROMPT.format(
-                schema=arango_graph.schema,
+                schema=graph_schema.render_schema(arango_graph.schema),
+                library=analytics.describe(),
                 query=query,
                 answer=answer
             )
@@ -369,14 +329,30 @@ def create_visualize_query_answer(
         ######################
 
         if verbose: print("\n### 2. Executing the visualization code")
-        global_vars = {"G_adb": nxadb_graph, "nx": nx}
-        local_vars = {}
+        global_vars = {
+            "G_adb": nxadb_graph,
+            "nx": nx,
+            "legal": legal_graph,
+            # Bound to the attempt's own figure while its code runs
+            "plt": visualization.FigurePlot(),
+            "draw_graph": draw_graph
+        }
+        rendered = None
 
         MAX_ATTEMPTS = 3
 
         for attempt in range(MAX_ATTEMPTS + 1):
             try:
-                exec(text_to_visual_cleaned, global_vars, global_vars)
+                # Catch errors statically first, trivial ones are fixed without another LLM call
+                text_to_visual_cleaned = code_validator.validate_or_raise(
+                    text_to_visual_cleaned, namespace=global_vars, require_final_result=False
+                )
+                # Rendered in memory for this request only, nothing is written to disk
+                with visualization.render() as plot, \
+                        tracing.span("exec.generated_code", attempt=attempt, code_chars=len(text_to_visual_cleaned)):
+                    global_vars["plt"] = plot
+                    exec(text_to_visual_cleaned, global_vars, global_vars)
+                rendered = plot.png
                 break
             except Exception as e:
                 if verbose:
@@ -396,9 +372,10 @@ def create_visualize_query_answer(
                         error=e,
                         query=query,
                         answer=answer,
-                        schema=arango_graph.schema
+                        schema=graph_schema.render_schema(arango_graph.schema),
+                        library=analytics.describe()
                     )
-                )
+                ).content
 
                 text_to_visual_cleaned = re.sub(r"^```python\n|```$", "", text_to_visual, flags=re.MULTILINE).strip()
 
@@ -406,8 +383,8 @@ def create_visualize_query_answer(
                     print("-" * 50)
                     print(text_to_visual_cleaned)
         
-        if os.path.exists("assets/output.png"):
-            return "Visualization has been saved to 'assets/output.png', print it using markdown!"
+        if rendered:
+            return "The visualization has been rendered and is displayed next to the answer."
         else:
             return "Unable to generate the visualization"
     
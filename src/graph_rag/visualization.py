@@ -0,0 +1,246 @@
+import io
+import os
+import typing
+import hashlib
+import contextlib
+import contextvars
+import networkx as nx
+
+from src import cache
+from src import tracing
+
+if typing.TYPE_CHECKING:
+    from src.graph_rag import analytics
+
+
+# Drawn subgraphs are capped so a broad answer cannot produce an unreadable (and slow) figure
+MAX_DRAWN_NODES = int(os.environ.get("VISUALIZATION_MAX_NODES") or 150)
+
+# Spring layouts of recently drawn neighbourhoods, keyed by their nodes and edges
+layout_cache = cache.LRUCache(maxsize=int(os.environ.get("VISUALIZATION_LAYOUT_CACHE_SIZE") or 256))
+
+# pyplot functions that are named differently on `Axes`
+AXES_ALIASES = {"title": "set_title", "xlabel": "set_xlabel", "ylabel": "set_ylabel", "xlim": "set_xlim", "ylim": "set_ylim"}
+
+# Stateless matplotlib modules generated code may reach through `plt`, e.g. plt.cm.Blues
+MODULE_ALIASES = ("cm", "colors", "colormaps")
+
+_figures = contextvars.ContextVar("figures", default=None)
+_plot = contextvars.ContextVar("plot", default=None)
+
+
+class FigurePlot:
+    """Per-request stand-in for `matplotlib.pyplot` that draws on one explicit figure.
+
+    Generated code keeps calling `plt.title(...)`, `plt.bar(...)` and the like, which go to the
+    current axes or to the figure. No pyplot global state is involved, so requests render
+    concurrently without a lock.
+    """
+
+    def __init__(
+        self, figsize: tuple[float, float] = (10, 8), dpi: int = 100
+    ) -> None:
+        from matplotlib.figure import Figure
+
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        self.axes = None
+        self.png = None
+
+
+    def figure(
+        self, *args: typing.Any, figsize: tuple[float, float]|None = None, **kwargs: typing.Any
+    ) -> typing.Any:
+        # A request draws one figure, opening "another" one only resizes it
+        if figsize:
+            self.fig.set_size_inches(figsize)
+        return self.fig
+
+
+    def gcf(self) -> typing.Any:
+        return self.fig
+
+
+    def gca(self) -> typing.Any:
+        if self.axes is None:
+            self.axes = self.fig.axes[0] if self.fig.axes else self.fig.add_subplot()
+        return self.axes
+
+
+    def sca(
+        self, axes: typing.Any
+    ) -> None:
+        self.axes = axes
+
+
+    def subplots(
+        self, nrows: int = 1, ncols: int = 1, figsize: tuple[float, float]|None = None, **kwargs: typing.Any
+    ) -> tuple:
+        self.fig.clear()
+        self.figure(figsize=figsize)
+        axes = self.fig.subplots(nrows, ncols, **kwargs)
+        self.axes = axes.flat[0] if hasattr(axes, "flat") else axes
+        return self.fig, axes
+
+
+    def subplot(
+        self, *args: typing.Any, **kwargs: typing.Any
+    ) -> typing.Any:
+        self.axes = self.fig.add_subplot(*args, **kwargs)
+        return self.axes
+
+
+    def xticks(
+        self, ticks: typing.Any = None, labels: typing.Any = None, **kwargs: typing.Any
+    ) -> tuple:
+        return self._ticks(self.gca().xaxis, ticks, labels, **kwargs)
+
+
+    def yticks(
+        self, ticks: typing.Any = None, labels: typing.Any = None, **kwargs: typing.Any
+    ) -> tuple:
+        return self._ticks(self.gca().yaxis, ticks, labels, **kwargs)
+
+
+    def _ticks(
+        self, axis: typing.Any, ticks: typing.Any, labels: typing.Any, **kwargs: typing.Any
+    ) -> tuple:
+        import matplotlib.artist
+
+        if ticks is not None:
+            axis.set_ticks(ticks, labels)
+        # e.g. plt.xticks(rotation=45) only restyles the existing labels
+        if kwargs:
+            matplotlib.artist.setp(axis.get_ticklabels(), **kwargs)
+        return axis.get_ticklocs(), axis.get_ticklabels()
+
+
+    def show(
+        self, *args: typing.Any, **kwargs: typing.Any
+    ) -> None:
+        # Saving and closing are left to `render`
+        return None
+
+
+    savefig = close = ion = ioff = show
+
+
+    def __getattr__(
+        self, name: str
+    ) -> typing.Any:
+        import matplotlib
+        from matplotlib.axes import Axes
+        from matplotlib.figure import Figure
+
+        if name in AXES_ALIASES or hasattr(Axes, name):
+            return getattr(self.gca(), AXES_ALIASES.get(name, name))
+        if hasattr(Figure, name):
+            return getattr(self.fig, name)
+        if name in MODULE_ALIASES:
+            return getattr(matplotlib, name)
+        raise AttributeError(f"plt.{name} is not available, draw on plt.gca() or plt.gcf() instead")
+
+
+def current_plot() -> FigurePlot:
+    # The figure of the request being rendered, or a throwaway one outside `render`
+    return _plot.get() or FigurePlot()
+
+
+@contextlib.contextmanager
+def capture() -> typing.Iterator[list[bytes]]:
+    # Collects the PNG figures rendered while handling one request
+    figures = []
+    token = _figures.set(figures)
+    try:
+        yield figures
+    finally:
+        _figures.reset(token)
+
+
+def to_image(
+    png: bytes
+) -> typing.Any:
+    # Decoded from memory for the UI, which keeps it as PNG (`gr.Image(format="png")`) instead of re-encoding to WebP
+    import PIL.Image
+
+    image = PIL.Image.open(io.BytesIO(png))
+    image.load()
+    return image
+
+
+def cached_layout(
+    graph: nx.Graph
+) -> dict:
+    key = hashlib.sha1(repr((sorted(map(str, graph.nodes)), sorted(map(str, graph.edges())))).encode("utf-8")).hexdigest()
+    layout = layout_cache.get(key)
+    if layout is None:
+        with tracing.span("visualization.layout", nodes=graph.number_of_nodes()):
+            layout = nx.spring_layout(graph, seed=42)
+        layout_cache.put(key, layout)
+    return layout
+
+
+def create_draw_graph(
+    legal_graph: "analytics.LegalGraph"
+) -> typing.Callable:
+
+    def draw_graph(
+        nodes: typing.Iterable[str]|nx.Graph,
+        highlight: typing.Iterable[str] = (),
+        title: str|None = None
+    ) -> nx.Graph:
+        """Draw the given node ids (or graph) with their connecting edges, capped and with a cached layout."""
+        ax = current_plot().gca()
+        if isinstance(nodes, nx.Graph):
+            graph = nx.DiGraph(nodes)
+        else:
+            graph = nx.DiGraph(legal_graph.graph.subgraph(list(nodes)))
+
+        # Keep the best connected nodes when the answer is too broad to draw
+        truncated = graph.number_of_nodes() > MAX_DRAWN_NODES
+        if truncated:
+            kept = sorted(graph.degree, key=lambda item: item[1], reverse=True)[:MAX_DRAWN_NODES]
+            graph = nx.DiGraph(graph.subgraph(node for node, _ in kept))
+
+        highlight = set(highlight)
+        labels = {
+            node: f"{attributes.get('type', '')} {attributes.get('number', '')}/{attributes.get('year', '')}".strip(" /")
+            if attributes.get("label") == "regulation" else f"Pasal {attributes.get('number', node)}"
+            for node, attributes in graph.nodes(data=True)
+        }
+        nx.draw_networkx(
+            graph,
+            pos=cached_layout(graph),
+            labels={node: label or node for node, label in labels.items()},
+            node_size=300,
+            font_size=7,
+            node_color=["tab:orange" if node in highlight else "tab:blue" for node in graph.nodes],
+            edge_color="tab:gray",
+            arrows=True,
+            ax=ax
+        )
+        ax.set_title((title or "") + (f" (top {MAX_DRAWN_NODES} nodes)" if truncated else ""))
+        ax.axis("off")
+        return graph
+
+    return draw_graph
+
+
+@contextlib.contextmanager
+def render(
+    figsize: tuple[float, float] = (10, 8), dpi: int = 100
+) -> typing.Iterator[FigurePlot]:
+    # Runs drawing code on a fresh figure and keeps it as PNG bytes for the current request
+    plot = FigurePlot(figsize=figsize, dpi=dpi)
+    token = _plot.set(plot)
+    try:
+        yield plot
+    finally:
+        _plot.reset(token)
+
+    if plot.fig.get_axes():
+        buffer = io.BytesIO()
+        plot.fig.savefig(buffer, format="png", bbox_inches="tight")
+        plot.png = buffer.getvalue()
+        figures = _figures.get()
+        if figures is not None:
+            figures.append(plot.png)
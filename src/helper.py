@@ -1,12 +1,19 @@
 import os
-import PIL
 import json
 import typing 
-import gradio as gr
+import PIL.Image
 
 from src import dataset
 from src import database
-from langchain_community import graphs
+from src import schema
+from src import tracing
+from src import profiling
+from src import embedding
+from src import resilience
+
+if typing.TYPE_CHECKING:
+    from langchain_community import graphs
+    from langchain_core.language_models import chat_models
 
 
 def exclude_keys_from_data(
@@ -29,7 +36,7 @@ def exclude_keys_from_data(
 
 def load_image(
     filepath: str
-) -> PIL.ImageFile.ImageFile|None:
+) -> PIL.Image.Image|None:
     try:
         image = PIL.Image.open(filepath)
         return image
@@ -38,6 +45,68 @@ def load_image(
         return None
 
 
+def create_llm(
+) -> "chat_models.BaseChatModel":
+    # Timeouts, retries and circuit breaking are handled by the `llm` client, not by the provider SDK
+    timeout = resilience.get_client("llm").timeout
+
+    # Only import the provider package that is actually configured
+    if os.environ.get("OPENAI_API_KEY"):
+        from langchain_openai import chat_models as openai_chat_models
+        llm = openai_chat_models.ChatOpenAI(
+            model="gpt-4o",
+            temperature=0.0,
+            api_key=os.environ["OPENAI_API_KEY"],
+            timeout=timeout,
+            max_retries=0
+        )
+    elif os.environ.get("GOOGLE_API_KEY"):
+        from langchain_google_genai import chat_models as google_chat_models
+        llm = google_chat_models.ChatGoogleGenerativeAI(
+            model="gemini-2.0-flash",
+            temperature=0.0,
+            api_key=os.environ["GOOGLE_API_KEY"],
+            timeout=timeout,
+            max_retries=0
+        )
+    else:
+        raise ValueError("Either OPENAI_API_KEY or GOOGLE_API_KEY must be set")
+
+    return resilience.ResilientChatModel(model=llm)
+
+
+def get_index_dir(
+) -> str:
+    return os.path.join(os.environ.get("CACHE_DIR") or ".cache", "indexes")
+
+
+def create_agent_components(
+) -> dict[str, typing.Any]:
+    # Same setup as the Gradio app in `main.py`, for the entry points without a UI
+    from langchain_community import graphs
+
+    database_obj = database.Database(
+        host=os.environ["DATABASE_HOST"],
+        db_name=os.environ["DATABASE_NAME"],
+        graph_name=os.environ["GRAPH_NAME"],
+        username=os.environ["DATABASE_USERNAME"],
+        password=os.environ["DATABASE_PASSWORD"]
+    )
+    # Getting the nxadb graph opens the connection, the LangChain wrapper is built on that live handle
+    nxadb_graph = database_obj.get_nxadb_graph()
+    arango_graph = graphs.ArangoGraph(database_obj.db_obj)
+    refresh_database_schema(
+        arango_graph=arango_graph, schema_cache=schema.SchemaCache(os.environ.get("CACHE_DIR", ".cache"))
+    )
+    return {
+        "llm": create_llm(),
+        "nxadb_graph": nxadb_graph,
+        "arango_graph": arango_graph,
+        "embedding_model": os.environ["EMBEDDING_MODEL"],
+        "device": os.environ.get("DEVICE") or None
+    }
+
+
 def check_database_status(
     dataset_obj: dataset.Dataset,
     database_obj: database.Database
@@ -55,6 +124,8 @@ def refresh_status(
     dataset_obj: dataset.Dataset,
     database_obj: database.Database
 ) -> tuple[dict[str, bool], dict[str, bool]]:
+    import gradio as gr
+
     is_dataset_empty, is_graph_empty = check_database_status(
         dataset_obj=dataset_obj, database_obj=database_obj
     )
@@ -65,40 +136,73 @@ def refresh_status(
     )
 
 
+def get_trace_summary(
+) -> str:
+    summary = tracing.format_summary(tracing.tracer.summary())
+    cache_stats = embedding.get_query_cache().stats()
+    return (
+        f"{summary}\n\n"
+        f"Query embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['size']}/{cache_stats['maxsize']} entries)\n\n"
+        f"{resilience.format_stats(resilience.stats())}"
+    )
+
+
+def get_index_report(
+    database_obj: database.Database
+) -> str:
+    from src.graph_rag import aql_templates
+
+    lines = [
+        "| Query | Estimated cost | Estimated items | Indexes used | Full collection scans |",
+        "|---|---:|---:|---|---|"
+    ]
+    for row in database_obj.explain_index_usage(aql_templates.example_queries()):
+        lines.append(
+            f"| {row['name']} | {row['estimated_cost']:.1f} | {row['estimated_items']} "
+            f"| {', '.join(row['indexes']) or '-'} | {', '.join(row['full_scans']) or '-'} |"
+        )
+    return "\n".join(lines)
+
+
 def refresh_database_schema(
-    arango_graph: graphs.ArangoGraph
+    arango_graph: "graphs.ArangoGraph",
+    schema_cache: schema.SchemaCache
 ) -> None:
-    new_schema = arango_graph.generate_schema()
-    new_schema = exclude_keys_from_data(new_schema, excluded_keys=["embedding"])
-    arango_graph.set_schema(new_schema)
+    schema_cache.load_schema(arango_graph=arango_graph)
 
 
 def prepare_and_load_database_with_status(
     dataset_obj: dataset.Dataset,
     database_obj: database.Database,
-    arango_graph: graphs.ArangoGraph,
-    device: str
+    arango_graph: "graphs.ArangoGraph",
+    schema_cache: schema.SchemaCache,
+    device: str|None,
+    profile: bool = False
 ) -> typing.Generator:
+    import gradio as gr
+
     yield "<center><h3>⏳ Preparing and loading database... Please wait</h3></center>", \
         gr.update(), \
         gr.update()    
 
-    json_raw_input = os.path.join("data", "raw", "raw.json")
-    with open(json_raw_input) as file:
-        json_data = json.load(file)
+    with profiling.profile_run("prepare_and_load", enabled=profile):
+        json_raw_input = os.path.join("data", "raw", "raw.json")
+        with open(json_raw_input) as file:
+            json_data = json.load(file)
 
-    dataset_obj.prepare_dataset(
-        data=json_data,
-        embedding_model=os.environ["EMBEDDING_MODEL"],
-        device=device,
-        verbose=True
-    )
+        dataset_obj.prepare_dataset(
+            data=json_data,
+            embedding_model=os.environ["EMBEDDING_MODEL"],
+            device=device,
+            verbose=True
+        )
 
-    dataset = dataset_obj.load_dataset()
+        dataset = dataset_obj.load_dataset()
 
-    database_obj.load_dataset_to_arangodb(dataset=dataset)
+        database_obj.load_dataset_to_arangodb(dataset=dataset)
 
-    refresh_database_schema(arango_graph=arango_graph)
+        refresh_database_schema(arango_graph=arango_graph, schema_cache=schema_cache)
 
     yield "<center><h3>✅ Database preparation complete! You can now use the chatbot</h3></center>", \
         gr.update(visible=False), \
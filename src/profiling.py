@@ -0,0 +1,309 @@
+import io
+import os
+import re
+import sys
+import time
+import pstats
+import marshal
+import secrets
+import typing
+import cProfile
+import argparse
+import threading
+import contextlib
+import contextvars
+import subprocess
+import tracemalloc
+import collections
+
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+_active_sampler = contextvars.ContextVar("active_sampler", default=None)
+
+
+class StackSampler:
+    """Samples the Python stacks of the threads working for one run, written as folded stacks or as pstats.
+
+    Threads are followed while they run code of the run (see `follow`), so concurrent requests
+    served by the same process do not show up in each other's profile.
+    """
+
+    def __init__(
+        self, interval: float = 0.005
+    ) -> None:
+        self.interval = interval
+        # (thread name, frames from the outermost call) -> samples, a frame is (file, line, function)
+        self.samples = collections.Counter()
+        # thread id -> nested blocks of the run it is executing
+        self._threads = collections.Counter()
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+
+    @contextlib.contextmanager
+    def follow(self) -> typing.Iterator[None]:
+        # Samples the current thread until the block ends
+        thread_id = threading.get_ident()
+        with self._threads_lock:
+            self._threads[thread_id] += 1
+        try:
+            yield
+        finally:
+            with self._threads_lock:
+                self._threads[thread_id] -= 1
+                if self._threads[thread_id] <= 0:
+                    del self._threads[thread_id]
+
+
+    def start(self) -> None:
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+    def write_folded(
+        self, path: str
+    ) -> None:
+        # One `frame;frame;frame count` line per unique stack (flamegraph.pl / speedscope input)
+        with open(path, "w", encoding="utf-8") as file:
+            for (thread_name, frames), count in self.samples.most_common():
+                stack = [thread_name] + [f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in frames]
+                file.write(f"{';'.join(stack)} {count}\n")
+
+
+    def write_pstats(
+        self, path: str
+    ) -> None:
+        # Same layout as `cProfile.Profile.dump_stats`, with sample counts as call counts and
+        # sampled time as own and cumulative time, so pstats, snakeviz etc. can read it
+        stats = {}
+        for (_, frames), count in self.samples.items():
+            seconds = count * self.interval
+            seen = set()
+            for depth, frame in enumerate(frames):
+                calls, _, own, cumulative, callers = stats.get(frame, (0, 0, 0.0, 0.0, {}))
+                if depth == len(frames) - 1:
+                    own += seconds
+                # Recursive frames count once per stack
+                if frame not in seen:
+                    seen.add(frame)
+                    calls += count
+                    cumulative += seconds
+                    if depth:
+                        caller = callers.get(frames[depth - 1], (0, 0, 0.0, 0.0))
+                        callers[frames[depth - 1]] = (caller[0] + count, caller[1] + count, caller[2], caller[3] + seconds)
+                stats[frame] = (calls, calls, own, cumulative, callers)
+
+        with open(path, "wb") as file:
+            marshal.dump(stats, file)
+
+
+    def _run(self) -> None:
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            with self._threads_lock:
+                followed = set(self._threads)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in followed:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                self.samples[(names.get(thread_id, str(thread_id)), tuple(reversed(frames)))] += 1
+
+
+# Profiled runs may overlap, tracemalloc is stopped only when the last one that started it ends
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def start_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            # Started outside (e.g. -X tracemalloc), never stopped here
+            _tracemalloc_users = -1
+        if _tracemalloc_users >= 0:
+            if _tracemalloc_users == 0:
+                tracemalloc.start(25)
+            _tracemalloc_users += 1
+
+
+def stop_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users > 0:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def follow_thread() -> typing.Iterator[None]:
+    # Executor threads running work of a profiled run carry the run in their copied context
+    sampler = _active_sampler.get()
+    if sampler is None:
+        yield
+        return
+    with sampler.follow():
+        yield
+
+
+def is_profiling_enabled(
+    name: str
+) -> bool:
+    # e.g. PROFILE_TARGETS=ask_agent,prepare_and_load
+    targets = [target.strip() for target in os.environ.get("PROFILE_TARGETS", "").split(",")]
+    return name in targets or "all" in targets
+
+
+@contextlib.contextmanager
+def profile_run(
+    name: str,
+    enabled: bool = False,
+    output_dir: str|None = None,
+    mode: str|None = None
+) -> typing.Iterator[str|None]:
+    if not (enabled or is_profiling_enabled(name)):
+        yield None
+        return
+
+    # Sampling covers the calling thread and the executor threads working for it (tools, LLM calls
+    # and retrievers), deterministic cProfile only the calling thread
+    mode = mode or os.environ.get("PROFILE_MODE") or "sampling"
+    output_dir = output_dir or os.environ.get("PROFILE_DIR", os.path.join(".cache", "profiles"))
+    os.makedirs(output_dir, exist_ok=True)
+    base_path = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}")
+
+    start_tracemalloc()
+    # The peak is process-wide, so overlapping runs still see each other's allocations
+    tracemalloc.reset_peak()
+
+    with contextlib.ExitStack() as stack:
+        if mode == "sampling":
+            profiler = StackSampler()
+            stack.enter_context(profiler.follow())
+            token = _active_sampler.set(profiler)
+            stack.callback(_active_sampler.reset, token)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        try:
+            yield base_path
+        finally:
+            if mode == "sampling":
+                profiler.stop()
+            else:
+                profiler.disable()
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            stop_tracemalloc()
+
+            # The result or exception of the profiled code matters more than its profile
+            try:
+                write_profile(name, mode, base_path, profiler, snapshot, peak_memory)
+            except Exception as error:
+                print(f"Error: the profile of `{name}` could not be written: {error}")
+
+
+def write_profile(
+    name: str,
+    mode: str,
+    base_path: str,
+    profiler: "StackSampler|cProfile.Profile",
+    snapshot: tracemalloc.Snapshot|None,
+    peak_memory: int
+) -> None:
+    if mode == "sampling":
+        profiler.write_folded(f"{base_path}.folded")
+        # A run shorter than the sampling interval has no samples, and pstats cannot read empty stats
+        has_stats = bool(profiler.samples)
+        if has_stats:
+            profiler.write_pstats(f"{base_path}.pstats")
+    else:
+        profiler.create_stats()
+        has_stats = bool(profiler.stats)
+        if has_stats:
+            profiler.dump_stats(f"{base_path}.pstats")
+    if snapshot is not None:
+        snapshot.dump(f"{base_path}.tracemalloc")
+
+    # Human readable summary next to the raw files
+    with open(f"{base_path}.txt", "w", encoding="utf-8") as file:
+        file.write(f"Profile of `{name}` ({mode})\n")
+        file.write(f"Peak traced memory: {peak_memory / 2**20:.1f} MiB\n\n")
+        if has_stats:
+            stream = io.StringIO()
+            pstats.Stats(f"{base_path}.pstats", stream=stream).sort_stats("cumulative").print_stats(30)
+            file.write(stream.getvalue())
+        else:
+            file.write("No samples were taken, the run was shorter than the sampling interval.\n")
+        if snapshot is not None:
+            file.write("\nTop memory allocations:\n")
+            for statistic in snapshot.statistics("lineno")[:20]:
+                file.write(f"{statistic}\n")
+
+
+def import_time_report(
+    module: str, top: int = 20
+) -> str:
+    # Run a fresh interpreter so already-imported modules don't hide the real cost
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+
+    rows = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            depth = (len(indent) - 1) // 2
+            rows.append((int(cumulative_us), int(self_us), depth, name))
+
+            # Everything up to `site` belongs to the interpreter startup
+            if depth == 0 and name == "site":
+                rows = []
+
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else ""
+        return f"Import of `{module}` failed: {error}"
+
+    # Top-level imports sum up to the total import time of the module
+    total_us = sum(row[0] for row in rows if row[2] == 0)
+
+    lines = [
+        f"Import time of `{module}`: {total_us / 1e6:.3f} s ({len(rows)} modules)",
+        f"{'cumulative (ms)':>16} {'self (ms)':>10}  module"
+    ]
+    for cumulative_us, self_us, depth, name in sorted(rows, reverse=True)[:top]:
+        lines.append(f"{cumulative_us / 1e3:>16.1f} {self_us / 1e3:>10.1f}  {'  ' * depth}{name}")
+
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report the import-time profile of the given modules.")
+    parser.add_argument("modules", nargs="*", default=["src", "src.graph_rag.agent", "main"])
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest modules to show")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        print(import_time_report(module=module, top=args.top))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+import os
+import re
+import json
+import time
+import random
+import typing
+import functools
+import itertools
+import threading
+import contextvars
+import concurrent.futures
+
+from src import tracing
+from langchain_core import outputs
+from langchain_core import runnables
+from langchain_core import messages as core_messages
+from langchain_core.language_models import chat_models
+
+
+# HTTP statuses and exception names of transient provider errors worth another attempt
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_PATTERN = re.compile(
+    r"Timeout|Connection|RateLimit|TooManyRequests|ResourceExhausted|Unavailable|InternalServer|ServerError"
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while its circuit is open after repeated failures."""
+
+
+class SaturatedError(Exception):
+    """Raised when no call slot of a provider becomes free in time."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a provider call does not finish within its deadline."""
+
+
+def is_retryable(
+    error: BaseException
+) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+    return any(RETRYABLE_ERROR_PATTERN.search(cls.__name__) for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one trial call through after `reset_timeout`."""
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class Client:
+    """Calls to one provider with a deadline per attempt, a cap on concurrent calls,
+    retries with jittered exponential backoff and a circuit breaker."""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 60.0,
+        max_concurrency: int = 8,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.metrics = dict.fromkeys(("calls", "successes", "failures", "retries", "timeouts", "rejected"), 0)
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Calls run on their own threads so the caller can give up at the deadline
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+
+    def call(
+        self, function: typing.Callable, *args: typing.Any, **kwargs: typing.Any
+    ) -> typing.Any:
+        for attempt in range(self.max_retries + 1):
+            self._admit()
+            try:
+                with tracing.span(f"client.{self.name}", attempt=attempt):
+                    result = self._run(functools.partial(function, *args, **kwargs))
+            except Exception as error:
+                failure = error
+            else:
+                self._count("successes")
+                self.breaker.record_success()
+                return result
+
+            # Errors of the request itself (e.g. an invalid prompt) mean the provider did answer
+            self._count("failures")
+            retryable = is_retryable(failure)
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if attempt == self.max_retries or not retryable:
+                raise failure
+
+            # Full jitter, so concurrent callers hit by the same outage do not retry in lockstep
+            self._count("retries")
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+
+    def stream(
+        self, function: typing.Callable[..., typing.Iterable], *args: typing.Any, **kwargs: typing.Any
+    ) -> typing.Iterator:
+        # Deadline, retries and admission cover the call up to the first chunk,
+        # a partially streamed answer cannot be replayed
+        def start() -> tuple[typing.Iterator, list]:
+            iterator = iter(function(*args, **kwargs))
+            return iterator, list(itertools.islice(iterator, 1))
+
+        iterator, first = self.call(start)
+        try:
+            yield from first
+            yield from iterator
+        except Exception as error:
+            self._count("failures")
+            if is_retryable(error):
+                self.breaker.record_failure()
+            raise
+
+
+    def stats(self) -> dict[str, typing.Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.breaker.state,
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                **self.metrics
+            }
+
+
+    def _run(
+        self, function: typing.Callable[[], typing.Any]
+    ) -> typing.Any:
+        # The span context of the caller carries over to the executor thread
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, function)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is freed when the call really ends, a call abandoned at its deadline still holds its thread,
+        # so hung calls exhaust the slots (and are rejected) instead of queueing behind each other in the executor
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            self._count("timeouts")
+            raise DeadlineExceededError(f"{self.name} call did not finish within {self.timeout:g}s")
+
+
+    def _admit(self) -> None:
+        # Fail fast instead of piling up threads behind a slow provider
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("rejected")
+            raise SaturatedError(f"all {self.max_concurrency} {self.name} call slots stayed busy for {self.timeout:g}s")
+        if not self.breaker.allow():
+            self._slots.release()
+            self._count("rejected")
+            raise CircuitOpenError(f"{self.name} is failing, calls are paused for up to {self.breaker.reset_timeout:g}s")
+        with self._lock:
+            self.metrics["calls"] += 1
+            self.in_flight += 1
+
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+
+    def _count(
+        self, metric: str
+    ) -> None:
+        with self._lock:
+            self.metrics[metric] += 1
+
+
+_clients: dict[str, Client] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(
+    name: str
+) -> Client:
+    # One client per provider and process, configured by e.g. LLM_TIMEOUT or TRANSLATOR_MAX_CONCURRENCY
+    with _clients_lock:
+        if name not in _clients:
+            prefix = name.upper()
+            defaults = {"llm": (60.0, 8), "translator": (10.0, 4)}.get(name, (30.0, 4))
+            _clients[name] = Client(
+                name=name,
+                timeout=float(os.environ.get(f"{prefix}_TIMEOUT") or defaults[0]),
+                max_concurrency=int(os.environ.get(f"{prefix}_MAX_CONCURRENCY") or defaults[1]),
+                max_retries=int(os.environ.get(f"{prefix}_MAX_RETRIES") or 2),
+                failure_threshold=int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD") or 5),
+                reset_timeout=float(os.environ.get("CIRCUIT_RESET_TIMEOUT") or 30.0)
+            )
+        return _clients[name]
+
+
+def stats(
+) -> list[dict[str, typing.Any]]:
+    with _clients_lock:
+        return [client.stats() for client in _clients.values()]
+
+
+def format_stats(
+    rows: list[dict[str, typing.Any]]
+) -> str:
+    lines = [
+        "| Provider | State | In flight | Calls | Successes | Failures | Retries | Timeouts | Rejected |",
+        "|---|---|---:|---:|---:|---:|---:|---:|---:|"
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['name']} | {row['state']} | {row['in_flight']}/{row['max_concurrency']} | {row['calls']} "
+            f"| {row['successes']} | {row['failures']} | {row['retries']} | {row['timeouts']} | {row['rejected']} |"
+        )
+    return "\n".join(lines)
+
+
+class TimeoutRequests:
+    """Stand-in for the `requests` module that gives every request a socket timeout unless it sets its own."""
+
+    def __init__(
+        self, timeout: float
+    ) -> None:
+        self.timeout = timeout
+
+
+    def get(
+        self, *args: typing.Any, **kwargs: typing.Any
+    ) -> typing.Any:
+        import requests
+
+        kwargs.setdefault("timeout", self.timeout)
+        return requests.get(*args, **kwargs)
+
+
+    def __getattr__(
+        self, name: str
+    ) -> typing.Any:
+        import requests
+
+        return getattr(requests, name)
+
+
+def translate(
+    text: str, source: str, target: str
+) -> str:
+    import deep_translator
+    from deep_translator import google
+
+    client = get_client("translator")
+    # deep_translator calls requests.get without a timeout, so a hung connection would hold its thread forever
+    if not isinstance(google.requests, TimeoutRequests):
+        google.requests = TimeoutRequests(timeout=client.timeout)
+
+    with tracing.span("translate", chars=len(text), source=source, target=target):
+        return client.call(
+            lambda: deep_translator.GoogleTranslator(source=source, target=target).translate(text)
+        )
+
+
+class ResilientChatModel(chat_models.BaseChatModel):
+    """Chat model that sends every generation of the wrapped model through the `llm` client."""
+
+    model: chat_models.BaseChatModel
+    client_name: str = "llm"
+
+    @property
+    def _llm_type(self) -> str:
+        return f"resilient-{self.model._llm_type}"
+
+
+    def _generate(
+        self,
+        messages: list[core_messages.BaseMessage],
+        stop: list[str]|None = None,
+        run_manager: typing.Any = None,
+        **kwargs: typing.Any
+    ) -> outputs.ChatResult:
+        return get_client(self.client_name).call(self.model._generate, messages, stop=stop, **kwargs)
+
+
+    def _stream(
+        self,
+        messages: list[core_messages.BaseMessage],
+        stop: list[str]|None = None,
+        run_manager: typing.Any = None,
+        **kwargs: typing.Any
+    ) -> typing.Iterator[outputs.ChatGenerationChunk]:
+        if type(self.model)._stream is not chat_models.BaseChatModel._stream:
+            chunks = get_client(self.client_name).stream(self.model._stream, messages, stop=stop, **kwargs)
+        else:
+            # Models without native streaming answer in a single chunk
+            chunks = [to_generation_chunk(self._generate(messages, stop=stop, **kwargs).generations[0].message)]
+
+        for chunk in chunks:
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+    def bind_tools(
+        self, tools: typing.Sequence, **kwargs: typing.Any
+    ) -> runnables.Runnable:
+        bound = self.model.bind_tools(tools, **kwargs)
+        # Keep the tool schemas formatted by the wrapped model, but call through this one
+        if isinstance(bound, runnables.RunnableBinding) and bound.bound is self.model:
+            return self.bind(**bound.kwargs)
+        # Models that return a configured copy of themselves instead of a binding
+        return self.model_copy(update={"model": bound})
+
+
+def to_generation_chunk(
+    message: core_messages.AIMessage
+) -> outputs.ChatGenerationChunk:
+    return outputs.ChatGenerationChunk(message=core_messages.AIMessageChunk(
+        content=message.content,
+        id=message.id,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+            for index, call in enumerate(message.tool_calls)
+        ]
+    ))
@@ -0,0 +1,140 @@
+import os
+import json
+import typing
+import hashlib
+
+if typing.TYPE_CHECKING:
+    from arango import database
+    from langchain_community import graphs
+
+
+# Keys that never need to be shown to the LLM
+EXCLUDED_KEYS = ("embedding", "_rev")
+
+
+class SchemaCache:
+
+    def __init__(
+        self, cache_dir: str, example_length: int = 48, sample_ratio: float = 0
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.example_length = example_length
+        self.sample_ratio = sample_ratio
+        self._version = None
+        self._schema = None
+
+
+    def get_graph_version(
+        self, db_obj: "database.StandardDatabase"
+    ) -> str:
+        return get_graph_version(db_obj=db_obj, salt=f"{self.example_length}:{self.sample_ratio}")
+
+
+    def load_schema(
+        self, arango_graph: "graphs.ArangoGraph", refresh: bool = False
+    ) -> dict[str, list[dict]]:
+        version = self.get_graph_version(db_obj=arango_graph.db)
+
+        # Build the schema only once per graph version
+        if refresh or version != self._version:
+            cache_path = os.path.join(self.cache_dir, f"schema_{version}.json")
+
+            if not refresh and os.path.exists(cache_path):
+                with open(cache_path, "r", encoding="utf-8") as file:
+                    self._schema = json.load(file)
+            else:
+                self._schema = compact_schema(
+                    arango_graph.generate_schema(sample_ratio=self.sample_ratio),
+                    example_length=self.example_length
+                )
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(cache_path, "w", encoding="utf-8") as file:
+                    json.dump(self._schema, file)
+
+            self._version = version
+
+        arango_graph.set_schema(self._schema)
+        return self._schema
+
+
+def get_graph_version(
+    db_obj: "database.StandardDatabase", salt: str = ""
+) -> str:
+    # The graph version changes whenever a collection is added, dropped or written to
+    version = hashlib.sha1()
+    for collection in sorted(db_obj.collections(), key=lambda item: item["name"]):
+        if collection["system"]:
+            continue
+        coll = db_obj.collection(collection["name"])
+        version.update(f"{collection['name']}:{coll.count()}:{coll.revision()};".encode("utf-8"))
+    version.update(salt.encode("utf-8"))
+    return version.hexdigest()[:16]
+
+
+def compact_schema(
+    schema: dict[str, list[dict]], example_length: int = 48
+) -> dict[str, list[dict]]:
+    collection_schema = []
+    for collection in schema["Collection Schema"]:
+        col_type = collection["collection_type"]
+        properties = collection[f"{col_type}_properties"]
+
+        # Accept both the ArangoGraph list of {name, type} and the compact mapping
+        if isinstance(properties, list):
+            properties = {prop["name"]: prop["type"] for prop in properties}
+
+        collection_schema.append({
+            "collection_name": collection["collection_name"],
+            "collection_type": col_type,
+            f"{col_type}_properties": {
+                name: type_name for name, type_name in properties.items() if name not in EXCLUDED_KEYS
+            },
+            f"example_{col_type}": _truncate_value(
+                collection[f"example_{col_type}"], example_length=example_length
+            )
+        })
+
+    return {"Graph Schema": schema["Graph Schema"], "Collection Schema": collection_schema}
+
+
+def render_schema(
+    schema: dict[str, list[dict]], example_length: int = 48
+) -> str:
+    schema = compact_schema(schema, example_length=example_length)
+    lines = []
+
+    for graph in schema["Graph Schema"]:
+        lines.append(f"Graph `{graph['graph_name']}` edges:")
+        for edge in graph["edge_definitions"]:
+            lines.append(
+                f"- {edge['edge_collection']}: "
+                f"{'|'.join(edge['from_vertex_collections'])} -> {'|'.join(edge['to_vertex_collections'])}"
+            )
+
+    lines.append("Collections:")
+    for collection in schema["Collection Schema"]:
+        col_type = collection["collection_type"]
+        properties = ", ".join(
+            f"{name}:{type_name}" for name, type_name in collection[f"{col_type}_properties"].items()
+        )
+        example = json.dumps(collection[f"example_{col_type}"], ensure_ascii=False)
+        lines.append(f"- {collection['collection_name']} ({col_type}) {{{properties}}}")
+        lines.append(f"  e.g. {example}")
+
+    return "\n".join(lines)
+
+
+def _truncate_value(
+    value: typing.Any, example_length: int
+) -> typing.Any:
+    if isinstance(value, dict):
+        return {
+            key: _truncate_value(item, example_length)
+            for key, item in value.items() if key not in EXCLUDED_KEYS
+        }
+    elif isinstance(value, list):
+        return [_truncate_value(item, example_length) for item in value[:3]]
+    elif isinstance(value, str) and len(value) > example_length:
+        return value[:example_length] + "..."
+    else:
+        return value
@@ -0,0 +1,225 @@
+import os
+import time
+import uuid
+import base64
+import typing
+import asyncio
+import argparse
+import functools
+import contextlib
+import concurrent.futures
+import dotenv
+import fastapi
+import pydantic
+
+from src import tracing
+from src.graph_rag import models
+
+
+class AskRequest(pydantic.BaseModel):
+    query: str = pydantic.Field(min_length=1)
+    # Conversation to continue, a new one is started when omitted
+    thread_id: str|None = None
+    include_image: bool = False
+    use_cache: bool = True
+
+
+class OverloadedError(Exception):
+    """Raised when a request is not admitted because the queue is full or it waited too long."""
+
+
+class AdmissionController:
+    """Bounds the requests running at once and the requests waiting for a slot in one worker process."""
+
+    def __init__(
+        self, max_concurrency: int, max_queue: int, queue_timeout: float
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+
+    @contextlib.asynccontextmanager
+    async def admit(self) -> typing.AsyncIterator[None]:
+        # Reject right away instead of letting the backlog grow past what can be served in time
+        if self.waiting >= self.max_queue and self._slots.locked():
+            self.rejected += 1
+            raise OverloadedError(f"{self.waiting} requests are already waiting")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise OverloadedError(f"no slot became free within {self.queue_timeout:.0f}s")
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pid": os.getpid(),
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue
+        }
+
+
+def create_app(
+    components: dict[str, typing.Any]|None = None,
+    max_concurrency: int|None = None,
+    max_queue: int|None = None,
+    queue_timeout: float|None = None
+) -> fastapi.FastAPI:
+    from src import helper
+    from src import embedding
+    from src.graph_rag import agent
+
+    components = components or helper.create_agent_components()
+    run_turn, tools = agent.create_agent_runner(**components, index_dir=helper.get_index_dir())
+
+    max_concurrency = max_concurrency or int(os.environ.get("API_MAX_CONCURRENCY") or 4)
+    admission = AdmissionController(
+        max_concurrency=max_concurrency,
+        max_queue=max_queue or int(os.environ.get("API_MAX_QUEUE") or 16),
+        queue_timeout=queue_timeout or float(os.environ.get("API_QUEUE_TIMEOUT") or 30.0)
+    )
+    # Agent turns block on the LLM and the database, they run on a pool sized like the admitted requests
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="api")
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: fastapi.FastAPI) -> typing.AsyncIterator[None]:
+        # Load the embedding model before the first request instead of during it
+        embedding.resolve_embedding_service(
+            embedding_model=components["embedding_model"], device=components["device"]
+        ).warm_up(background=True)
+        yield
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    app = fastapi.FastAPI(title="Indonesia IT Law Q&A", lifespan=lifespan)
+
+    async def run(
+        function: typing.Callable, *args: typing.Any, **kwargs: typing.Any
+    ) -> typing.Any:
+        try:
+            async with admission.admit():
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(executor, functools.partial(function, *args, **kwargs))
+        except OverloadedError as error:
+            raise fastapi.HTTPException(
+                status_code=503, detail=f"Server overloaded, {error}", headers={"Retry-After": "1"}
+            )
+
+    def run_tool(
+        name: str, request: models.UserQuery
+    ) -> dict[str, typing.Any]:
+        if name not in tools:
+            raise fastapi.HTTPException(status_code=404, detail=f"Tool `{name}` is not available")
+        start = time.perf_counter()
+        with tracing.span(f"api.{name}", query_chars=len(request.query)):
+            result = tools[name].invoke({"query": request.query, "lang": request.lang})
+        return {"result": result, "latency_ms": (time.perf_counter() - start) * 1000}
+
+    @app.post("/ask")
+    async def ask(request: AskRequest) -> dict[str, typing.Any]:
+        start = time.perf_counter()
+        thread_id = request.thread_id or uuid.uuid4().hex
+        response, figures = await run(run_turn, request.query, [], False, thread_id, use_cache=request.use_cache)
+        image = None
+        if request.include_image and figures:
+            image = base64.b64encode(figures[-1]).decode("ascii")
+        return {
+            "answer": response,
+            "thread_id": thread_id,
+            "image_png_base64": image,
+            "latency_ms": (time.perf_counter() - start) * 1000
+        }
+
+    @app.post("/semantic_search")
+    async def semantic_search(request: models.UserQuery) -> dict[str, typing.Any]:
+        return await run(run_tool, "semantic_search", request)
+
+    @app.post("/definition_search")
+    async def definition_search(request: models.UserQuery) -> dict[str, typing.Any]:
+        return await run(run_tool, "definition_search", request)
+
+    @app.post("/aql_search")
+    async def aql_search(request: models.UserQuery) -> dict[str, typing.Any]:
+        return await run(run_tool, "aql_search", request)
+
+    @app.get("/health")
+    async def health() -> dict[str, typing.Any]:
+        return {"status": "ok", "admission": admission.stats()}
+
+    @app.get("/trace_summary")
+    async def trace_summary() -> dict[str, typing.Any]:
+        return {"summary": helper.get_trace_summary()}
+
+    return app
+
+
+def build_indexes(
+) -> None:
+    # Written once by the parent process, the workers then memory-map the same files
+    from src import helper
+    from src import embedding
+    from src.graph_rag import retriever
+
+    components = helper.create_agent_components()
+    embedding_service = embedding.resolve_embedding_service(
+        embedding_model=components["embedding_model"], device=components["device"]
+    )
+    retrievers = {
+        collection: retriever.HybridRetriever(
+            nxadb_graph=components["nxadb_graph"],
+            collection=collection,
+            embedding_service=embedding_service,
+            index_dir=helper.get_index_dir()
+        )
+        for collection in ("article", "definition", "passage")
+    }
+    retrievers["article"].build()
+    retrievers["definition"].build()
+    # Passages are indexed only where the dataset has them
+    retriever.PassageRetriever(
+        passage_retriever=retrievers["passage"], article_retriever=retrievers["article"]
+    ).build()
+
+
+def main() -> None:
+    import uvicorn
+
+    dotenv.load_dotenv(".env")
+    parser = argparse.ArgumentParser(description="Headless HTTP API over the same agent and tools as the Gradio app.")
+    parser.add_argument("--host", default=os.environ.get("API_HOST") or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("API_PORT") or 8000))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("API_WORKERS") or 1), help="Worker processes")
+    args = parser.parse_args()
+
+    build_indexes()
+    uvicorn.run(
+        "src.server:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        # Connections beyond this (per worker) get a 503 before any request is parsed
+        limit_concurrency=int(os.environ.get("API_MAX_CONNECTIONS") or 64)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import typing
+import secrets
+import functools
+import threading
+import contextlib
+import contextvars
+import collections
+
+from src import profiling
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+
+    def __init__(
+        self, name: str, trace_id: str, parent_id: str|None, attributes: dict
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start_perf = time.perf_counter_ns()
+
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns else 0.0
+
+
+    def set_attribute(
+        self, key: str, value: typing.Any
+    ) -> None:
+        self.attributes[key] = value
+
+
+    def end(self) -> None:
+        # Monotonic clock for the duration, wall clock for the timestamps
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._start_perf)
+
+
+    def to_otel(self) -> dict:
+        # OTLP/JSON span layout so files can be replayed into an OpenTelemetry collector
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _to_otel_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": {"code": "STATUS_CODE_ERROR" if self.status == "ERROR" else "STATUS_CODE_OK"}
+        }
+
+
+class Tracer:
+
+    def __init__(
+        self, export_path: str|None = None, max_spans: int = 10000
+    ) -> None:
+        self.export_path = export_path
+        self._spans = collections.deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+
+    def start_span(
+        self, name: str, parent: Span|None = None, **attributes: typing.Any
+    ) -> Span:
+        parent = parent or _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        )
+
+
+    def end_span(
+        self, span: Span, error: BaseException|None = None
+    ) -> None:
+        if error is not None:
+            span.status = "ERROR"
+            span.set_attribute("exception.type", type(error).__name__)
+            span.set_attribute("exception.message", str(error)[:500])
+        span.end()
+
+        export_path = self.export_path or os.environ.get("TRACE_FILE")
+        with self._lock:
+            self._spans.append(span)
+            if export_path:
+                with open(export_path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(span.to_otel(), ensure_ascii=False) + "\n")
+
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, **attributes: typing.Any
+    ) -> typing.Iterator[Span]:
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            # Spans on executor threads are sampled with the profiled run they belong to, if any
+            with profiling.follow_thread():
+                yield span
+        except BaseException as error:
+            _current_span.reset(token)
+            self.end_span(span, error=error)
+            raise
+        _current_span.reset(token)
+        self.end_span(span)
+
+
+    def get_spans(
+        self, trace_id: str|None = None
+    ) -> list[Span]:
+        with self._lock:
+            return [span for span in self._spans if trace_id is None or span.trace_id == trace_id]
+
+
+    def summary(self) -> list[dict]:
+        durations = collections.defaultdict(list)
+        for span in self.get_spans():
+            durations[span.name].append(span.duration_ms)
+
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            rows.append({
+                "name": name,
+                "count": len(values),
+                "total_ms": sum(values),
+                "mean_ms": sum(values) / len(values),
+                "p95_ms": values[min(len(values) - 1, int(0.95 * len(values)))],
+                "max_ms": values[-1]
+            })
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+def _to_otel_value(
+    value: typing.Any
+) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    elif isinstance(value, int):
+        return {"intValue": str(value)}
+    elif isinstance(value, float):
+        return {"doubleValue": value}
+    else:
+        return {"stringValue": str(value)}
+
+
+# Process-wide tracer, spans are exported to TRACE_FILE (JSON lines) when set
+tracer = Tracer()
+span = tracer.span
+
+
+def traced(
+    name: str
+) -> typing.Callable:
+    def decorator(function: typing.Callable) -> typing.Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name) as current_span:
+                result = function(*args, **kwargs)
+                if isinstance(result, str):
+                    current_span.set_attribute("result_chars", len(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def format_summary(
+    rows: list[dict]
+) -> str:
+    lines = [
+        "| Stage | Count | Total (ms) | Mean (ms) | p95 (ms) | Max (ms) |",
+        "|---|---:|---:|---:|---:|---:|"
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['name']} | {row['count']} | {row['total_ms']:.1f} | {row['mean_ms']:.1f} "
+            f"| {row['p95_ms']:.1f} | {row['max_ms']:.1f} |"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,43 @@
+import pytest
+import networkx as nx
+from unittest import mock
+from arango import database as arango_database
+
+from src import helper
+from src import database
+from src import embedding
+from benchmarks import fakes
+from benchmarks import local_graph
+
+
+class StubDatabase:
+    """`database.Database` without a server: connecting hands out a mocked ArangoDB handle and an empty graph."""
+
+    def __init__(
+        self, **kwargs: str
+    ) -> None:
+        self.db_obj = None
+
+
+    def get_nxadb_graph(
+        self
+    ) -> local_graph.LocalGraph:
+        self.db_obj = mock.create_autospec(arango_database.StandardDatabase, instance=True)
+        self.db_obj.graphs.return_value = []
+        self.db_obj.collections.return_value = []
+        return local_graph.LocalGraph(nx.MultiDiGraph())
+
+
+@pytest.fixture
+def stub_database(
+    monkeypatch: pytest.MonkeyPatch, tmp_path
+) -> type[StubDatabase]:
+    # Everything `helper.create_agent_components` reaches for, without ArangoDB, an LLM provider or a model download
+    for name in ("DATABASE_HOST", "DATABASE_NAME", "GRAPH_NAME", "DATABASE_USERNAME", "DATABASE_PASSWORD"):
+        monkeypatch.setenv(name, "test")
+    monkeypatch.setenv("EMBEDDING_MODEL", "hash")
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(database, "Database", StubDatabase)
+    monkeypatch.setattr(helper, "create_llm", lambda: fakes.ScriptedChatModel())
+    monkeypatch.setattr(embedding, "get_embedding_service", lambda model_name, device=None: fakes.HashEmbeddingService())
+    return StubDatabase
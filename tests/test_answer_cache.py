@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from src.graph_rag import answer_cache
+
+
+def embedding(*values: float) -> np.ndarray:
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def cache() -> answer_cache.AnswerCache:
+    return answer_cache.AnswerCache(maxsize=8, threshold=0.92)
+
+
+def test_paraphrase_with_the_same_references_is_served(cache) -> None:
+    cache.put("What does article 33 of UU 13/2003 say?", embedding(1, 0, 0), "article 33")
+
+    hit = cache.get("What is stated in article 33 of UU 13/2003?", embedding(1, 0.05, 0))
+
+    assert hit is not None
+    assert hit[0] == "article 33"
+
+
+@pytest.mark.parametrize("question", [
+    "What does article 34 of UU 13/2003 say?",
+    "What does article 33 of UU 14/2003 say?",
+    "What does article 33 of UU 13/2004 say?",
+    "What does article 33 of PP 13/2003 say?",
+    "What does article 33A of UU 13/2003 say?",
+    "What does article 33 say?",
+])
+def test_similar_question_about_other_references_is_not_served(cache, question) -> None:
+    cache.put("What does article 33 of UU 13/2003 say?", embedding(1, 0, 0), "article 33")
+
+    # Identical embeddings, as close as such questions come in practice
+    assert cache.get(question, embedding(1, 0, 0)) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_matching_entry_is_found_behind_a_more_similar_mismatch(cache) -> None:
+    cache.put("Apa isi pasal 34 UU 11/2008?", embedding(1, 0, 0), "pasal 34")
+    cache.put("Apa isi pasal 33 UU 11/2008?", embedding(1, 0.2, 0), "pasal 33")
+
+    hit = cache.get("Apa bunyi pasal 33 UU 11/2008?", embedding(1, 0, 0))
+
+    assert hit is not None
+    assert hit[0] == "pasal 33"
+
+
+def test_dissimilar_question_is_not_served(cache) -> None:
+    cache.put("Apa definisi data pribadi?", embedding(1, 0, 0), "definisi")
+
+    assert cache.get("Apa definisi sistem elektronik?", embedding(0, 1, 0)) is None
+
+
+def test_entries_expire_with_the_graph_version() -> None:
+    versions = iter(["v1", "v2"])
+    cache = answer_cache.AnswerCache(get_version=lambda: next(versions), version_interval=0)
+    cache.put("Apa definisi data pribadi?", embedding(1, 0, 0), "definisi")
+
+    assert cache.get("Apa definisi data pribadi?", embedding(1, 0, 0)) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_question_identifiers_include_numbers_and_references() -> None:
+    numbers, references = answer_cache.question_identifiers("Pasal 10a UU No. 11 Tahun 2008")
+
+    assert numbers == ("10A", "11", "2008")
+    assert dict(references) == {"type": "UU", "number": 11, "year": 2008, "article": "10A"}
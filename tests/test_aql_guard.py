@@ -0,0 +1,96 @@
+import pytest
+from unittest import mock
+
+from src.graph_rag import aql_guard
+
+
+def plan(cost: float = 10.0, items: int = 1, node_types: tuple[str, ...] = ("SingletonNode", "ReturnNode")) -> dict:
+    return {"estimatedCost": cost, "estimatedNrItems": items, "nodes": [{"type": node_type} for node_type in node_types]}
+
+
+@pytest.fixture
+def db() -> mock.Mock:
+    db = mock.Mock()
+    db.aql.explain.return_value = plan()
+    db.aql.execute.return_value = iter([{"_id": "article/1", "text": "Pasal 1", "embedding": [0.1, 0.2]}])
+    return db
+
+
+@pytest.fixture
+def graph(db) -> aql_guard.GuardedArangoGraph:
+    return aql_guard.GuardedArangoGraph(mock.Mock(db=db), max_rows=10, max_items=1000)
+
+
+def test_limit_is_injected_before_the_final_return() -> None:
+    rewritten = aql_guard.rewrite_query("FOR a IN article FILTER a.number == '1' RETURN a;")
+
+    assert rewritten.index("LIMIT @guard_limit") < rewritten.index("LET guarded_result")
+    assert 'UNSET_RECURSIVE(guarded_result, "embedding")' in rewritten
+    assert not rewritten.rstrip().endswith(";")
+
+
+def test_existing_limit_is_kept() -> None:
+    rewritten = aql_guard.rewrite_query("FOR a IN article LIMIT 5 RETURN a")
+
+    assert "@guard_limit" not in rewritten
+    assert "LIMIT 5" in rewritten
+
+
+def test_limit_inside_a_subquery_does_not_count() -> None:
+    rewritten = aql_guard.rewrite_query(
+        "FOR r IN regulation LET articles = (FOR a IN article LIMIT 3 RETURN a) RETURN {r, articles}"
+    )
+
+    assert "LIMIT @guard_limit" in rewritten
+
+
+def test_distinct_is_limited_after_deduplication() -> None:
+    rewritten = aql_guard.rewrite_query("FOR a IN article RETURN DISTINCT a.chapter")
+
+    assert rewritten.startswith("FOR guarded_result IN (\nFOR a IN article RETURN DISTINCT a.chapter\n)")
+    assert rewritten.index("RETURN DISTINCT") < rewritten.index("LIMIT @guard_limit")
+
+
+def test_comments_are_stripped_before_brackets_are_added() -> None:
+    rewritten = aql_guard.rewrite_query("FOR a IN article // every article\nRETURN a.text // only the text")
+
+    assert "//" not in rewritten
+    assert "LET guarded_result = (\na.text\n)" in rewritten
+
+
+def test_comment_markers_inside_strings_are_kept() -> None:
+    rewritten = aql_guard.rewrite_query("FOR a IN article FILTER a.text LIKE '%http://%' /* links */ RETURN a")
+
+    assert "'%http://%'" in rewritten
+    assert "links" not in rewritten
+
+
+def test_query_without_return_is_left_alone() -> None:
+    assert aql_guard.rewrite_query("FOR a IN article REMOVE a IN article") == "FOR a IN article REMOVE a IN article"
+
+
+def test_query_binds_the_limit_and_strips_embeddings(graph, db) -> None:
+    rows = graph.query("FOR a IN article RETURN a", top_k=3)
+
+    assert rows == [{"_id": "article/1", "text": "Pasal 1"}]
+    assert db.aql.execute.call_args.kwargs["bind_vars"] == {"guard_limit": 3}
+    assert db.aql.execute.call_args.kwargs["batch_size"] == 3
+
+
+def test_top_k_is_capped_by_max_rows(graph, db) -> None:
+    graph.query("FOR a IN article RETURN a", top_k=500)
+
+    assert db.aql.execute.call_args.kwargs["bind_vars"] == {"guard_limit": 10}
+
+
+@pytest.mark.parametrize("explained, message", [
+    (plan(node_types=("SingletonNode", "RemoveNode")), "only read"),
+    (plan(cost=1e9), "too expensive"),
+    (plan(items=50000), "too many rows"),
+])
+def test_rejected_plans_never_execute(graph, db, explained, message) -> None:
+    db.aql.explain.return_value = explained
+
+    with pytest.raises(aql_guard.AQLGuardError, match=message):
+        graph.query("FOR a IN article LIMIT 50000 RETURN a")
+    db.aql.execute.assert_not_called()
@@ -0,0 +1,25 @@
+import sys
+import json
+
+from src import batch
+from src import helper
+
+
+def test_create_agent_components_connects_before_building_the_arango_graph(stub_database) -> None:
+    components = helper.create_agent_components()
+
+    assert components["arango_graph"].db is not None
+    assert components["nxadb_graph"] is not None
+
+
+def test_batch_main_starts_and_writes_a_summary(stub_database, tmp_path, monkeypatch, capsys) -> None:
+    questions = tmp_path / "questions.txt"
+    questions.write_text("")
+    output = tmp_path / "answers.jsonl"
+    monkeypatch.setattr(sys, "argv", ["batch", str(questions), "--output", str(output)])
+
+    batch.main()
+
+    assert output.read_text() == ""
+    summary, _ = json.JSONDecoder().raw_decode(capsys.readouterr().out)
+    assert summary["questions"] == 0
@@ -0,0 +1,92 @@
+import types
+import pytest
+import networkx as nx
+
+from src.graph_rag import visualization
+from src.graph_rag import code_validator
+
+
+@pytest.fixture
+def namespace() -> dict:
+    graph = nx.MultiDiGraph([("regulation/1", "article/1")])
+    return {"G_adb": graph, "nx": nx, "legal": types.SimpleNamespace(graph=graph)}
+
+
+@pytest.mark.parametrize("code", [
+    "FINAL_RESULT = nx.pagerank(G_adb)",
+    "import numpy as np\nFINAL_RESULT = float(np.mean([d for _, d in G_adb.degree()]))",
+    "import pandas as pd\nFINAL_RESULT = pd.Series(dict(G_adb.degree())).idxmax()",
+    "from networkx.algorithms import community\nFINAL_RESULT = list(community.label_propagation_communities(G_adb.to_undirected()))",
+    "import networkx.algorithms.community as community\nFINAL_RESULT = community",
+    "try:\n    FINAL_RESULT = nx.shortest_path(G_adb, 'a', 'b')\nexcept nx.NetworkXNoPath:\n    FINAL_RESULT = None",
+    "def degree(node):\n    return G_adb.degree(node)\nFINAL_RESULT = degree('article/1')",
+])
+def test_valid_code_is_accepted(namespace, code) -> None:
+    result = code_validator.validate(code, namespace=namespace)
+
+    assert result.errors == []
+
+
+@pytest.mark.parametrize("code, error", [
+    ("import os\nFINAL_RESULT = os.listdir()", "importing `os` is not allowed"),
+    ("import numpyx\nFINAL_RESULT = 1", "importing `numpyx` is not allowed"),
+    ("FINAL_RESULT = open('/etc/passwd').read()", "name `open` is not defined"),
+    ("G_adb.add_node('x')\nFINAL_RESULT = 1", "would modify G_adb"),
+    ("nx.set_node_attributes(G_adb, 1, 'x')\nFINAL_RESULT = 1", "would modify G_adb"),
+    ("G_adb.nodes['x']['text'] = ''\nFINAL_RESULT = 1", "assigning to"),
+    ("FINAL_RESULT = nx.pagerankk(G_adb)", "did you mean `nx.pagerank`"),
+    ("FINAL_RESULT = degre", "name `degre` is not defined"),
+    ("FINAL_RESULT = (", "SyntaxError"),
+    ("for node in G_adb:\n    print(node)", "`FINAL_RESULT` is never assigned"),
+])
+def test_invalid_code_is_rejected(namespace, code, error) -> None:
+    result = code_validator.validate(code, namespace=namespace)
+
+    assert any(error in message for message in result.errors), result.errors
+
+
+def test_last_expression_becomes_the_final_result(namespace) -> None:
+    result = code_validator.validate("ranks = nx.pagerank(G_adb)\nranks['article/1']", namespace=namespace)
+
+    assert result.errors == []
+    assert result.code.endswith("FINAL_RESULT = ranks['article/1']")
+
+
+def test_structural_subgraph_runs_on_the_snapshot(namespace) -> None:
+    result = code_validator.validate("H = G_adb.subgraph(['article/1'])\nFINAL_RESULT = H.number_of_nodes()", namespace=namespace)
+
+    assert result.errors == []
+    assert "legal.graph.subgraph" in result.code
+
+
+@pytest.mark.parametrize("reads", [
+    "[H.nodes[n]['text'] for n in H]",
+    "list(H.nodes(data=True))",
+    "list(H.edges.data('label'))",
+    "nx.get_node_attributes(H, 'name')",
+    "nx.shortest_path(H, 'a', 'b', weight='weight')",
+    "H['regulation/1']['article/1']",
+])
+def test_subgraph_of_code_reading_attributes_is_rejected(namespace, reads) -> None:
+    result = code_validator.validate(f"H = G_adb.subgraph(['article/1'])\nFINAL_RESULT = {reads}", namespace=namespace)
+
+    assert any("G_adb.subgraph()` is not supported" in message for message in result.errors), result.errors
+    assert "legal.graph" not in result.code
+
+
+def test_plot_code_is_fixed_to_draw_on_the_request_figure(namespace) -> None:
+    code = "import matplotlib.pyplot as plt\nnx.draw(G_adb)\nplt.title('graph')\nplt.show()"
+
+    result = code_validator.validate(code, namespace={**namespace, "plt": visualization.FigurePlot()}, require_final_result=False)
+
+    assert result.errors == []
+    assert "import matplotlib" not in result.code
+    assert "nx.draw(G_adb, ax=plt.gca())" in result.code
+    assert "plt.show" not in result.code
+
+
+def test_validate_or_raise_lists_every_error(namespace) -> None:
+    with pytest.raises(code_validator.CodeValidationError) as error:
+        code_validator.validate_or_raise("import os\nFINAL_RESULT = degre", namespace=namespace)
+
+    assert "os" in str(error.value) and "degre" in str(error.value)
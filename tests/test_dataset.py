@@ -0,0 +1,58 @@
+import pytest
+
+from src import dataset
+
+
+def words(start: int, stop: int) -> list[str]:
+    return [f"w{index}" for index in range(start, stop)]
+
+
+def test_short_text_is_one_passage() -> None:
+    text = "Pasal 1\n\n(1) Setiap orang berhak atas pekerjaan.\n(2) Ketentuan lebih lanjut diatur."
+
+    assert dataset.split_passages(text) == [
+        "Pasal 1\n(1) Setiap orang berhak atas pekerjaan.\n(2) Ketentuan lebih lanjut diatur."
+    ]
+
+
+def test_lines_are_packed_whole_up_to_the_limit() -> None:
+    lines = [" ".join(words(index * 4, index * 4 + 4)) for index in range(5)]
+
+    passages = dataset.split_passages("\n".join(lines), max_words=8, overlap=2)
+
+    # A line that would overflow the passage starts the next one
+    assert passages == ["\n".join(lines[0:2]), "\n".join(lines[2:4]), lines[4]]
+
+
+def test_line_of_exactly_the_limit_is_not_cut() -> None:
+    line = " ".join(words(0, 10))
+
+    assert dataset.split_passages(line, max_words=10, overlap=3) == [line]
+
+
+@pytest.mark.parametrize("num_words", [11, 17, 18, 24, 25, 100])
+def test_long_line_is_cut_into_overlapping_windows(num_words) -> None:
+    passages = dataset.split_passages(" ".join(words(0, num_words)), max_words=10, overlap=3)
+    windows = [passage.split() for passage in passages]
+
+    assert all(len(window) <= 10 for window in windows)
+    # Consecutive windows share `overlap` words and together cover the line to its last word
+    assert all(previous[-3:] == window[:3] for previous, window in zip(windows, windows[1:]))
+    assert windows[0][0] == "w0"
+    assert windows[-1][-1] == f"w{num_words - 1}"
+    # No window lies entirely inside the overlap of the one before it
+    assert all(len(window) > 3 for window in windows)
+
+
+def test_window_tail_is_packed_with_the_following_line() -> None:
+    text = " ".join(words(0, 12)) + "\n" + " ".join(words(12, 14))
+
+    passages = dataset.split_passages(text, max_words=10, overlap=3)
+
+    assert passages == [" ".join(words(0, 10)), " ".join(words(7, 12)) + "\n" + " ".join(words(12, 14))]
+
+
+@pytest.mark.parametrize("text", ["", "   \n\n  "])
+def test_empty_text_keeps_one_passage(text) -> None:
+    # Every article gets at least one passage, so it stays reachable through the passage index
+    assert dataset.split_passages(text) == [""]
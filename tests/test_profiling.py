@@ -0,0 +1,84 @@
+import time
+import threading
+import tracemalloc
+import contextvars
+import concurrent.futures
+import pytest
+
+from src import tracing
+from src import profiling
+
+
+def spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def busy_neighbour(seconds: float) -> None:
+    spin(seconds)
+
+
+def traced_tool(seconds: float) -> None:
+    with tracing.span("tool"):
+        spin(seconds)
+
+
+def sampled_functions(output_dir) -> set[str]:
+    (folded,) = output_dir.glob("*.folded")
+    return {frame.split(" ")[0] for line in folded.read_text().splitlines() for frame in line.rsplit(" ", 1)[0].split(";")}
+
+
+def test_run_without_samples_writes_a_report_instead_of_raising(tmp_path) -> None:
+    with profiling.profile_run("empty", enabled=True, output_dir=str(tmp_path)) as base_path:
+        pass
+
+    assert "No samples were taken" in open(f"{base_path}.txt").read()
+    assert not tracemalloc.is_tracing()
+
+
+def test_exception_of_the_profiled_code_is_kept(tmp_path) -> None:
+    with pytest.raises(ValueError, match="turn failed"):
+        with profiling.profile_run("failing", enabled=True, output_dir=str(tmp_path)):
+            raise ValueError("turn failed")
+
+
+def test_disabled_run_writes_nothing(tmp_path) -> None:
+    with profiling.profile_run("disabled", output_dir=str(tmp_path)) as base_path:
+        pass
+
+    assert base_path is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_only_threads_working_for_the_run_are_sampled(tmp_path) -> None:
+    neighbour = threading.Thread(target=busy_neighbour, args=(0.3,))
+    neighbour.start()
+    with profiling.profile_run("turn", enabled=True, output_dir=str(tmp_path)):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(contextvars.copy_context().run, traced_tool, 0.2).result()
+        spin(0.05)
+    neighbour.join()
+
+    functions = sampled_functions(tmp_path)
+    assert "traced_tool" in functions
+    assert "test_only_threads_working_for_the_run_are_sampled" in functions
+    assert "busy_neighbour" not in functions
+
+
+def test_peak_memory_is_reset_for_every_run(tmp_path) -> None:
+    with profiling.profile_run("large", enabled=True, output_dir=str(tmp_path / "large")) as base_path:
+        data = bytearray(64 * 2**20)
+        del data
+    with profiling.profile_run("small", enabled=True, output_dir=str(tmp_path / "small")) as small_path:
+        pass
+
+    assert "Peak traced memory: 6" in open(f"{base_path}.txt").read()
+    assert "Peak traced memory: 0." in open(f"{small_path}.txt").read()
+
+
+def test_cprofile_mode_writes_pstats(tmp_path) -> None:
+    with profiling.profile_run("deterministic", enabled=True, output_dir=str(tmp_path), mode="cprofile") as base_path:
+        spin(0.01)
+
+    assert "function calls" in open(f"{base_path}.txt").read()
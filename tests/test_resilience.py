@@ -0,0 +1,98 @@
+import time
+import threading
+import pytest
+from unittest import mock
+
+from src import resilience
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def client(**kwargs: float) -> resilience.Client:
+    options = {"timeout": 0.1, "max_concurrency": 1, "max_retries": 0, "backoff": 0.0, "failure_threshold": 2, "reset_timeout": 0.2}
+    return resilience.Client(name="test", **{**options, **kwargs})
+
+
+def wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_successful_call_frees_its_slot() -> None:
+    provider = client()
+
+    assert provider.call(lambda value: value * 2, 21) == 42
+    wait_for(lambda: provider.stats()["in_flight"] == 0)
+    assert provider.stats()["successes"] == 1
+
+
+def test_timed_out_call_holds_its_slot_until_it_really_ends() -> None:
+    provider = client()
+    hung = threading.Event()
+
+    with pytest.raises(resilience.DeadlineExceededError):
+        provider.call(hung.wait)
+    assert provider.stats()["in_flight"] == 1
+
+    # The hung call still occupies the only worker, a new call is rejected instead of queueing behind it
+    function = mock.Mock(return_value="ok")
+    with pytest.raises(resilience.SaturatedError):
+        provider.call(function)
+    function.assert_not_called()
+    assert provider.breaker.failures == 1
+
+    hung.set()
+    wait_for(lambda: provider.stats()["in_flight"] == 0)
+    assert provider.call(function) == "ok"
+
+
+def test_retryable_errors_are_retried() -> None:
+    provider = client(max_retries=2)
+    function = mock.Mock(side_effect=[ConnectionError("reset"), "ok"])
+
+    assert provider.call(function) == "ok"
+    assert function.call_count == 2
+    assert provider.stats()["retries"] == 1
+
+
+def test_request_errors_are_not_retried_and_keep_the_circuit_closed() -> None:
+    provider = client(max_retries=2, failure_threshold=1)
+    function = mock.Mock(side_effect=ValueError("invalid prompt"))
+
+    with pytest.raises(ValueError):
+        provider.call(function)
+    assert function.call_count == 1
+    assert provider.breaker.state == "closed"
+
+
+def test_circuit_opens_after_repeated_failures_and_lets_one_trial_through() -> None:
+    provider = client()
+    failing = mock.Mock(side_effect=RateLimitError("429"))
+    for _ in range(2):
+        with pytest.raises(RateLimitError):
+            provider.call(failing)
+
+    function = mock.Mock(return_value="ok")
+    with pytest.raises(resilience.CircuitOpenError):
+        provider.call(function)
+    function.assert_not_called()
+
+    wait_for(lambda: provider.breaker.state == "half_open")
+    assert provider.call(function) == "ok"
+    assert provider.breaker.state == "closed"
+
+
+def test_translator_requests_get_a_socket_timeout(monkeypatch) -> None:
+    import requests
+
+    get = mock.Mock(return_value="response")
+    monkeypatch.setattr(requests, "get", get)
+
+    assert resilience.TimeoutRequests(timeout=5.0).get("https://translate.google.com/m", params={}) == "response"
+    assert get.call_args.kwargs["timeout"] == 5.0
+    resilience.TimeoutRequests(timeout=5.0).get("https://translate.google.com/m", timeout=1.0)
+    assert get.call_args.kwargs["timeout"] == 1.0
@@ -0,0 +1,14 @@
+from fastapi import testclient
+
+from src import server
+
+
+def test_create_app_starts_against_a_stub_database(stub_database) -> None:
+    app = server.create_app()
+
+    with testclient.TestClient(app) as client:
+        response = client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    assert response.json()["admission"]["running"] == 0